@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+'''
+Compare per-link and bulk registration of page links.
+
+Requires Redis server on localhost:6379. Test keys are removed afterwards.
+
+    $ python bench/bench_add_tasks.py --pages=50 --links=500
+'''
+import time
+from tornado.ioloop import IOLoop
+from tornado.options import define, options, parse_command_line
+import redis as pyredis
+
+from torspider import tasks
+from torspider.worker import add_task, add_tasks
+
+PREFIX = 'torspider:bench:'
+KEYS = tasks.key_names(PREFIX)
+
+define("pages", type=int, default=50, help='Pages count')
+define("links", type=int, default=500, help='Links per page')
+define("known", type=float, default=0.5, help='Share of already known links')
+
+
+def iter_pages():
+    known = int(options.known * options.links)
+    for p in range(options.pages):
+        # navigation links, repeated on every page
+        links = ['http://host%d.onion/nav/%d' % (i % 50, i) for i in range(known)]
+        links.extend(
+            'http://host%d.onion/page/%d/%d' % (i % 50, p, i)
+            for i in range(known, options.links))
+        yield links
+
+
+async def per_link(redis):
+    for links in iter_pages():
+        for link in links:
+            await add_task(redis, link)
+
+
+async def bulk(redis):
+    for links in iter_pages():
+        await add_tasks(redis, links)
+
+
+def clear(sync_redis):
+    for key in sync_redis.scan_iter(PREFIX + '*'):
+        sync_redis.delete(key)
+
+
+def run(name, func):
+    sync_redis = pyredis.StrictRedis()
+    clear(sync_redis)
+    redis = tasks.RedisClient()
+    start = time.perf_counter()
+    IOLoop.current().run_sync(lambda: func(redis))
+    elapsed = time.perf_counter() - start
+    print('%-10s %8.3f sec, %8.1f pages/sec, %d tasks' % (
+        name, elapsed, options.pages / elapsed, sync_redis.scard(KEYS['pending_s'])))
+    clear(sync_redis)
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    tasks.RedisClient.setup(**KEYS)
+    run('per-link', per_link)
+    run('bulk', bulk)
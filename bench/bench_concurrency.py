@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+'''
+Simulation of the adaptive workers concurrency against fixed worker counts.
+
+A local HTTP server imitates a Tor circuit: it serves `capacity` requests
+at a time with `latency` seconds delay, extra concurrent requests make
+every response proportionally slower, up to the client timeouts.
+
+    $ python bench/bench_concurrency.py --duration=20 --capacity=8 --workers=40
+'''
+import time
+import random
+from tornado import gen, httpclient, web
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+from tornado.options import define, options, parse_command_line
+
+from torspider.concurrency import AdaptiveConcurrency, is_timeout
+
+define("duration", type=float, default=20.0, help='Duration of every run, seconds')
+define("capacity", type=int, default=8, help='Concurrent requests served without slowdown')
+define("latency", type=float, default=0.2, help='Response delay, seconds')
+define("timeout", type=float, default=1.0, help='Client request timeout, seconds')
+define("workers", type=int, default=40, help='Maximal workers count')
+define("min_workers", type=int, default=2, help='Minimal workers count (adaptive run)')
+define("adapt_interval", type=float, default=1.0, help='Adjustment interval, seconds')
+
+
+class SlowHandler(web.RequestHandler):
+    in_flight = 0
+
+    async def get(self):
+        cls = SlowHandler
+        cls.in_flight += 1
+        try:
+            load = max(1.0, cls.in_flight / options.capacity)
+            await gen.sleep(options.latency * load * random.uniform(0.8, 1.2))
+            self.write('<html><body>page</body></html>')
+        finally:
+            cls.in_flight -= 1
+
+
+class Run:
+    def __init__(self, url, workers, concurrency=None):
+        self.url = url
+        self.workers = workers
+        self.concurrency = concurrency
+        self.client = httpclient.AsyncHTTPClient(force_instance=True, max_clients=workers)
+        self.done = 0
+        self.timeouts = 0
+        self.latency = 0.0
+        self.deadline = None
+
+    async def worker(self):
+        c = self.concurrency
+        while time.monotonic() < self.deadline:
+            if c is not None:
+                await c.acquire()
+            started = time.monotonic()
+            try:
+                await self.client.fetch(self.url, request_timeout=options.timeout)
+            except httpclient.HTTPError as ex:
+                self.timeouts += is_timeout(ex)
+                if c is not None:
+                    c.record(time.monotonic() - started, timeout=is_timeout(ex))
+            else:
+                elapsed = time.monotonic() - started
+                self.done += 1
+                self.latency += elapsed
+                if c is not None:
+                    c.record(elapsed)
+            finally:
+                if c is not None:
+                    c.release()
+
+    async def __call__(self):
+        self.deadline = time.monotonic() + options.duration
+        if self.concurrency is not None:
+            self.concurrency.start()
+        await gen.multi([self.worker() for _ in range(self.workers)])
+        if self.concurrency is not None:
+            self.concurrency.stop()
+        self.client.close()
+
+
+def report(name, run):
+    print('%-20s %8.1f pages/sec, %5d timeouts, %6.3f sec mean latency' % (
+        name, run.done / options.duration, run.timeouts,
+        run.latency / run.done if run.done else 0))
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    sockets = bind_sockets(0, '127.0.0.1')
+    port = sockets[0].getsockname()[1]
+    server = HTTPServer(web.Application([(r'/.*', SlowHandler)],
+                                        log_function=lambda handler: None))
+    server.add_sockets(sockets)
+    url = 'http://127.0.0.1:%d/' % port
+    io_loop = IOLoop.current()
+
+    for workers in (options.min_workers, options.capacity, options.workers):
+        run = Run(url, workers)
+        io_loop.run_sync(run)
+        report('fixed %d' % workers, run)
+
+    concurrency = AdaptiveConcurrency(options.min_workers, options.workers,
+                                      options.adapt_interval)
+    run = Run(url, options.workers, concurrency)
+    io_loop.run_sync(run)
+    report('adaptive -> %d' % concurrency.limit, run)
+    server.stop()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+'''
+Compare FIFO and host-aware frontiers on a synthetic multi-host link graph.
+
+Every simulated host serves one request at a time, so concurrent requests
+to the same host wait in line. A part of the links (--skew) belongs to a
+single large host, the rest are spread over --hosts other hosts.
+
+Requires Redis server on localhost:6379. Test keys are removed afterwards.
+
+    $ python bench/bench_frontier.py --tasks=2000 --workers=20
+'''
+import random
+import time
+from collections import defaultdict
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.locks import Lock
+from tornado.options import define, options, parse_command_line
+import redis as pyredis
+
+from torspider import tasks
+from torspider.urlnorm import get_domain
+
+PREFIX = 'torspider:bench:'
+KEYS = tasks.key_names(PREFIX)
+
+define("tasks", type=int, default=2000, help='Tasks count')
+define("hosts", type=int, default=100, help='Hosts count')
+define("skew", type=float, default=0.5, help='Share of the largest host links')
+define("workers", type=int, default=20, help='Workers count')
+define("latency", type=float, default=0.02, help='Host response time, seconds')
+define("host_delay", type=float, default=0.0, help='Host frontier delay, seconds')
+define("host_concurrency", type=int, default=1, help='Host frontier concurrency')
+
+
+def make_links():
+    rnd = random.Random(1)
+    links = []
+    for i in range(options.tasks):
+        if rnd.random() < options.skew:
+            host = 'big.onion'
+        else:
+            host = 'host%d.onion' % rnd.randrange(options.hosts)
+        links.append('http://%s/page/%d' % (host, i))
+    return links
+
+
+class Hosts:
+    """Simulated hosts."""
+    def __init__(self):
+        self.locks = defaultdict(Lock)
+        self.active = defaultdict(int)
+        self.max_active = 0
+
+    async def fetch(self, url):
+        host = get_domain(url)
+        self.active[host] += 1
+        self.max_active = max(self.max_active, self.active[host])
+        async with self.locks[host]:
+            await gen.sleep(options.latency)
+        self.active[host] -= 1
+
+
+async def work(redis, hosts, state):
+    while state['left'] > 0:
+        state['left'] -= 1
+        task = await redis.get_task()
+        await hosts.fetch(task)
+        await redis.register_success(task)
+    await redis.close()
+
+
+async def crawl(frontier):
+    tasks.RedisClient.setup(frontier=frontier,
+                            host_delay=options.host_delay,
+                            host_concurrency=options.host_concurrency,
+                            poll_interval=0.005,
+                            **KEYS)
+    redis = tasks.RedisClient()
+    await redis.clear_all()
+    await redis.put_tasks(make_links())
+    await redis.close()
+    hosts = Hosts()
+    state = {'left': options.tasks}
+    start = time.perf_counter()
+    await gen.multi([work(tasks.RedisClient(), hosts, state)
+                     for _ in range(options.workers)])
+    return time.perf_counter() - start, hosts.max_active
+
+
+def clear(sync_redis):
+    for key in sync_redis.scan_iter(PREFIX + '*'):
+        sync_redis.delete(key)
+
+
+def run(frontier):
+    elapsed, max_active = IOLoop.current().run_sync(lambda: crawl(frontier))
+    print('%-6s %8.3f sec, %8.1f pages/sec, max %d concurrent requests per host' % (
+        frontier, elapsed, options.tasks / elapsed, max_active))
+    clear(pyredis.StrictRedis())
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    run(tasks.FIFO_FRONTIER)
+    run(tasks.HOST_FRONTIER)
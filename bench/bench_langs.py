@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+'''
+Pages per second of the language detection stage: langdetect over the whole
+page text (the old way) against the langs module (declared languages,
+text sampling, seeded profile, per-domain cache).
+
+Reads saved HTML pages (*.html) from the corpus directory, or uses generated
+pages if no corpus is given. Page texts are extracted before timing.
+
+    $ python bench/bench_langs.py --corpus=~/pages --domains=20
+'''
+import io
+import os
+import glob
+import time
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.options import define, options, parse_command_line
+from langdetect import detect
+from langdetect.lang_detect_exception import LangDetectException
+
+from torspider import langs
+from torspider.scraper import Page
+
+define("corpus", type=str, default=None, help='Directory with saved HTML pages')
+define("pages", type=int, default=200, help='Generated pages count')
+define("domains", type=int, default=20, help='Domains the pages are spread over')
+define("sample", type=int, default=langs.SAMPLE_SIZE, help='Text sample size')
+
+PARAGRAPH = ('<p>The quick brown fox jumps over the lazy dog, while the crawler '
+             'walks through the hidden services and collects page %d.</p>\n')
+
+
+def load_corpus():
+    if not options.corpus:
+        return [('<html><body>%s</body></html>' % ''.join(
+            PARAGRAPH % (i * 100 + j) for j in range(100))).encode('utf-8')
+            for i in range(options.pages)]
+    pattern = os.path.join(os.path.expanduser(options.corpus), '*.html')
+    pages = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def make_pages(bodies):
+    pages = []
+    for i, body in enumerate(bodies):
+        url = 'http://host%d.onion/page%d.html' % (i % options.domains, i)
+        res = HTTPResponse(HTTPRequest(url), 200, buffer=io.BytesIO(body), effective_url=url)
+        page = Page(url, res)
+        page.text
+        page.meta
+        page.html_lang
+        pages.append(page)
+    return pages
+
+
+def old_language(page):
+    try:
+        return detect(page.text)
+    except LangDetectException:
+        return langs.UNKNOWN
+
+
+def run(name, func, pages):
+    start = time.perf_counter()
+    results = [func(page) for page in pages]
+    elapsed = time.perf_counter() - start
+    print('%-8s %10.1f pages/sec' % (name, len(pages) / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    pages = make_pages(load_corpus())
+    print('%d pages, %d domains' % (len(pages), options.domains))
+    old = run('old', old_language, pages)
+    sampled = langs.LanguageDetector(sample_size=options.sample, agreement=len(pages) + 1)
+    run('sampled', sampled.detect, pages)
+    cached = langs.LanguageDetector(sample_size=options.sample)
+    new = run('cached', cached.detect, pages)
+    print('%d of %d pages got the same language' % (
+        sum(1 for a, b in zip(old, new) if a == b), len(pages)))
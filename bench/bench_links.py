@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+'''
+Link extraction stage on link-heavy pages: normalizing hrefs one at a time
+and splitting them with is_inner_link (the old way) against
+urlnorm.norm_many, which returns the hosts along with the links.
+
+    $ python bench/bench_links.py --pages=200 --links=1000
+'''
+import time
+import random
+from urllib.parse import urlparse
+from itertools import tee, filterfalse
+from tornado.options import define, options, parse_command_line
+
+from torspider import urlnorm
+from torspider.scraper import ALLOW_SCHEMES
+
+define("pages", type=int, default=200, help='Pages count')
+define("links", type=int, default=1000, help='Links per page')
+define("inner", type=float, default=0.7, help='Share of inner links')
+
+
+def make_pages():
+    rnd = random.Random(1)
+    pages = []
+    for i in range(options.pages):
+        base = 'http://site%d.onion/' % i
+        hrefs = []
+        for j in range(options.links):
+            if rnd.random() < options.inner:
+                hrefs.append('/section%d/page-%d.html' % (j % 10, rnd.randrange(10000)))
+            else:
+                hrefs.append('http://host%d.onion/' % rnd.randrange(100000))
+        pages.append((base, hrefs))
+    return pages
+
+
+def old_links(base, hrefs):
+    domain = urlparse(base)[1]
+    links = set()
+    for href in hrefs:
+        try:
+            url = urlnorm.norm(href, domain)
+            if url[0] in ALLOW_SCHEMES:
+                links.add(urlnorm.join_parts(url))
+        except Exception:
+            pass
+    pred = lambda x: urlnorm.get_domain(x) == urlnorm.get_domain(base)
+    t1, t2 = tee(links)
+    return list(filter(pred, t1)), list(filterfalse(pred, t2))
+
+
+def new_links(base, hrefs):
+    domain = urlnorm.get_domain(base)
+    inner, outer = [], []
+    for url, host in dict(urlnorm.norm_many(hrefs, base, ALLOW_SCHEMES)).items():
+        (inner if host == domain else outer).append(url)
+    return inner, outer
+
+
+def run(name, func, pages):
+    urlnorm.norm.cache_clear()
+    start = time.perf_counter()
+    results = [func(base, hrefs) for base, hrefs in pages]
+    elapsed = time.perf_counter() - start
+    print('%-4s %8.3f sec, %8.1f pages/sec' % (name, elapsed, len(pages) / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    pages = make_pages()
+    print('%d pages, %d links per page' % (len(pages), options.links))
+    old = run('old', old_links, pages)
+    new = run('new', new_links, pages)
+    same = sum(1 for (a1, a2), (b1, b2) in zip(old, new)
+               if set(a1) == set(b1) and set(a2) == set(b2))
+    print('%d of %d pages partitioned the same way' % (same, len(pages)))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+'''
+Compare Page implementations: BeautifulSoup tree (soup) and lxml.html tree
+(lxml). For every accessor, measure time per page, starting from a fresh
+page object, so that the parse is included.
+
+Reads saved HTML pages (*.html) from the corpus directory, or uses
+a generated page if no corpus is given.
+
+    $ python bench/bench_page_parsers.py --corpus=~/pages --repeat=5
+'''
+import io
+import os
+import glob
+import time
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.options import define, options, parse_command_line
+
+from torspider.scraper import get_page_class
+
+define("corpus", type=str, default=None, help='Directory with saved HTML pages')
+define("repeat", type=int, default=3, help='Repetitions per page')
+
+URL = 'http://bench.onion/page.html'
+SAMPLE = ('<html><head><title>Sample</title><meta name="description" content="Bench">'
+          '<style>p {color: red}</style></head><body>%s</body></html>') % ''.join(
+    '<div class="c%d"><h2>Section %d</h2><p>Some   text . with <a href="/p%d">a link</a>\n'
+    'and <a href="http://h%d.onion/">outer</a>.</p><!-- comment -->'
+    '<script>var x = %d;</script></div>\n' % (i, i, i, i, i) for i in range(300))
+ACCESSORS = ('title', 'meta', 'base', 'links', 'text')
+PARSERS = ('soup', 'lxml')
+
+
+def load_corpus():
+    if not options.corpus:
+        return [SAMPLE.encode('utf-8')]
+    pattern = os.path.join(os.path.expanduser(options.corpus), '*.html')
+    pages = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def make_responses(bodies):
+    return [HTTPResponse(HTTPRequest(URL), 200, buffer=io.BytesIO(body), effective_url=URL)
+            for body in bodies]
+
+
+def measure(page_class, responses, accessors):
+    start = time.perf_counter()
+    for _ in range(options.repeat):
+        for res in responses:
+            page = page_class(URL, res)
+            for name in accessors:
+                getattr(page, name)
+    return (time.perf_counter() - start) * 1000 / (options.repeat * len(responses))
+
+
+def compare(responses):
+    """Count pages, where the parsers disagree."""
+    soup_class, lxml_class = (get_page_class(name) for name in PARSERS)
+    diff = dict.fromkeys(ACCESSORS, 0)
+    for res in responses:
+        a, b = soup_class(URL, res), lxml_class(URL, res)
+        for name in ACCESSORS:
+            if getattr(a, name) != getattr(b, name):
+                diff[name] += 1
+    return diff
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    responses = make_responses(load_corpus())
+    print('%d pages, ms per page' % len(responses))
+    print('%-8s' % 'parser' + ''.join('%10s' % name for name in ACCESSORS + ('all',)))
+    for parser in PARSERS:
+        page_class = get_page_class(parser)
+        row = [measure(page_class, responses, (name,)) for name in ACCESSORS]
+        row.append(measure(page_class, responses, ACCESSORS))
+        print('%-8s' % parser + ''.join('%10.3f' % t for t in row))
+    diff = compare(responses)
+    if any(diff.values()):
+        print('Mismatches: %s' % diff)
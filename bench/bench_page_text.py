@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+'''
+Compare Page.text extraction: the old way, re-parsing the serialized <body>
+and collapsing whitespace with several regular expressions, against the
+single walk over the already parsed tree.
+
+Reads saved HTML pages (*.html) from the corpus directory, or uses
+a generated page if no corpus is given.
+
+    $ python bench/bench_page_text.py --corpus=~/pages --repeat=5
+'''
+import os
+import re
+import glob
+import time
+import tracemalloc
+from tornado.options import define, options, parse_command_line
+from bs4 import BeautifulSoup as Soup, Comment
+
+from torspider.scraper import extract_text, SKIP_TAGS
+
+define("corpus", type=str, default=None, help='Directory with saved HTML pages')
+define("repeat", type=int, default=3, help='Repetitions per page')
+
+SAMPLE = '''<html><head><title>Sample</title><style>p {color: red}</style></head>
+<body>%s</body></html>''' % ''.join(
+    '<div class="c%d"><h2>Section %d</h2><p>Some   text . with <a href="/p%d">a link</a>\n'
+    'and\tmore text.</p><!-- comment --><script>var x = %d;</script>'
+    '<form><input name="q"></form></div>\n' % (i, i, i, i) for i in range(300))
+
+
+def old_text(soup):
+    body = Soup(str(soup.body), 'lxml')
+    for tag in body.find_all():
+        if tag.name.lower() in SKIP_TAGS:
+            tag.extract()
+    for com in body.find_all(string=lambda text: isinstance(text, Comment)):
+        com.extract()
+    text = body.get_text(' ')
+    text = re.sub(r'\s{2,}', ' ', text)
+    text = re.sub(r'\s*\n\s*', '\n', text)
+    text = re.sub(r'\n{2,}', '\n', text)
+    text = re.sub(r'\s+\.\s+', '. ', text)
+    return text.strip()
+
+
+def new_text(soup):
+    return extract_text(soup.body)
+
+
+def load_corpus():
+    if not options.corpus:
+        return [SAMPLE]
+    pattern = os.path.join(os.path.expanduser(options.corpus), '*.html')
+    pages = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def run(name, func, soups):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(options.repeat):
+        for soup in soups:
+            func(soup)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = options.repeat * len(soups)
+    print('%-5s %8.3f ms/page, peak %10d bytes' % (name, elapsed * 1000 / count, peak))
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    soups = [Soup(html, 'lxml') for html in load_corpus()]
+    print('%d pages' % len(soups))
+    mismatches = sum(1 for soup in soups if old_text(soup) != new_text(soup))
+    if mismatches:
+        print('%d pages differ!' % mismatches)
+    run('old', old_text, soups)
+    run('new', new_text, soups)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+'''
+Compare commands per second of tornadoredis and redis.asyncio backends.
+
+Every cycle registers a task, takes it and registers it as passed, then
+checks the counters: 8 Redis commands in 6 requests.
+
+Requires Redis server on localhost:6379. Test keys are removed afterwards.
+
+    $ python bench/bench_redis_backends.py --cycles=10000 --concurrency=10
+'''
+import time
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.options import define, options, parse_command_line
+import redis as pyredis
+
+from torspider import tasks
+
+PREFIX = 'torspider:bench:'
+KEYS = tasks.key_names(PREFIX)
+COMMANDS_PER_CYCLE = 8
+
+define("cycles", type=int, default=10000, help='Cycles count')
+define("concurrency", type=int, default=10, help='Concurrent clients')
+
+
+async def cycle(redis, start, count):
+    for i in range(start, start + count):
+        await redis.put_new_task('http://host%d.onion/page/%d' % (i % 100, i))
+        task = await redis.get_task()
+        await redis.register_success(task)
+        await redis.passed_count()
+        await redis.pending_count()
+    await redis.close()
+
+
+async def run_clients(redis_class):
+    per_client = options.cycles // options.concurrency
+    await gen.multi([
+        cycle(redis_class(), i * per_client, per_client)
+        for i in range(options.concurrency)
+    ])
+
+
+def clear(sync_redis):
+    for key in sync_redis.scan_iter(PREFIX + '*'):
+        sync_redis.delete(key)
+
+
+def run(name):
+    sync_redis = pyredis.StrictRedis()
+    clear(sync_redis)
+    redis_class = tasks.get_backend(name)
+    redis_class.setup(**KEYS)
+    start = time.perf_counter()
+    IOLoop.current().run_sync(lambda: run_clients(redis_class))
+    elapsed = time.perf_counter() - start
+    commands = options.cycles * COMMANDS_PER_CYCLE
+    print('%-14s %8.3f sec, %10.1f commands/sec' % (name, elapsed, commands / elapsed))
+    clear(sync_redis)
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    run('tornadoredis')
+    run('asyncio')
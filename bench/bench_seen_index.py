@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+'''
+Compare Redis memory used for deduplication by the tasks sets and
+by the seen index (Bloom filter).
+
+Requires Redis server on localhost:6379. Test keys are removed afterwards.
+
+    $ python bench/bench_seen_index.py --tasks=1000000
+'''
+import time
+from tornado.ioloop import IOLoop
+from tornado.options import define, options, parse_command_line
+import redis as pyredis
+
+from torspider import tasks
+
+PREFIX = 'torspider:bench:'
+KEYS = tasks.key_names(PREFIX)
+
+define("tasks", type=int, default=1000000, help='Tasks count')
+define("error_rate", type=float, default=tasks.SEEN_ERROR_RATE,
+       help='Seen index false positives rate')
+
+
+async def fill(redis):
+    """Register all tasks, then pass them, so that they end up in SUCCESS set,
+    or are only counted in seen-index mode.
+    """
+    batch = []
+    for i in range(options.tasks):
+        batch.append('http://host%d.onion/some/path/page-%d.html' % (i % 1000, i))
+        if len(batch) == tasks.SCRIPT_CHUNK:
+            await redis.put_new_tasks(batch)
+            batch = []
+    await redis.put_new_tasks(batch)
+    sync_redis = pyredis.StrictRedis()
+    # emulate passing, avoiding per-task round trips
+    pipe = sync_redis.pipeline()
+    pipe.delete(KEYS['pending_q'])
+    if redis.seen is None:
+        pipe.rename(KEYS['pending_s'], KEYS['success_s'])
+    else:
+        pipe.set(KEYS['success_n'], options.tasks)
+        pipe.delete(KEYS['pending_s'])
+    pipe.execute()
+    return await redis.memory_usage()
+
+
+def clear(sync_redis):
+    for key in sync_redis.scan_iter(PREFIX + '*'):
+        sync_redis.delete(key)
+
+
+def run(name, seen_index):
+    sync_redis = pyredis.StrictRedis()
+    clear(sync_redis)
+    tasks.RedisClient.setup(seen_index=seen_index,
+                            seen_capacity=options.tasks,
+                            seen_error_rate=options.error_rate,
+                            **KEYS)
+    redis = tasks.RedisClient()
+    start = time.perf_counter()
+    usage = IOLoop.current().run_sync(lambda: fill(redis))
+    elapsed = time.perf_counter() - start
+    print('%-10s %8.3f sec, %12d bytes' % (name, elapsed, sum(usage.values())))
+    clear(sync_redis)
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    run('sets', False)
+    run('seen', True)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+'''
+Write throughput of the batching sink against one write per report, with
+local JSON lines and SQLite targets.
+
+    $ python bench/bench_sink.py --reports=20000 --batch-size=100
+'''
+import os
+import time
+import shutil
+import tempfile
+from tornado.ioloop import IOLoop
+from tornado.options import define, options, parse_command_line
+
+from torspider import sink
+
+define("reports", type=int, default=20000, help='Reports count')
+define("batch_size", type=int, default=100, help='Sink batch size')
+
+
+class FakePage:
+    def __init__(self, i):
+        self.i = i
+
+    def as_dict(self):
+        return {
+            'title': 'Page %d' % self.i,
+            'text': 'Some page text. ' * 50,
+            'meta': {'description': 'Page description'},
+            'language': 'en',
+            'links': {'inner': ['http://a.onion/%d' % j for j in range(20)],
+                      'outer': ['http://b%d.onion/' % j for j in range(10)]},
+        }
+
+
+async def fill(s):
+    for i in range(options.reports):
+        await s({'url': 'http://a.onion/%d' % i, 'page': FakePage(i)})
+
+
+def run(name, path, batch_size):
+    s = sink.BatchingSink(sink.make_target(path), batch_size=batch_size, flush_interval=0)
+    start = time.perf_counter()
+    IOLoop.current().run_sync(lambda: fill(s))
+    s.close()
+    elapsed = time.perf_counter() - start
+    print('%-16s batch %5d: %8.3f sec, %10.1f reports/sec' % (
+        name, batch_size, elapsed, options.reports / elapsed))
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    tmp = tempfile.mkdtemp()
+    try:
+        for ext in ('jsonl', 'db'):
+            for batch_size in (1, options.batch_size):
+                path = os.path.join(tmp, 'reports-%d.%s' % (batch_size, ext))
+                run(ext, path, batch_size)
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+'''
+Compare urlnorm.norm with the former implementation (regex path collapsing
+one match at a time, debug formatting, IDNA round trip for every host,
+no cache) over realistic hrefs, checking that both give the same results.
+
+    $ python bench/bench_urlnorm.py --hrefs=2000000
+'''
+import re
+import time
+import random
+import logging
+import pprint
+from urllib.parse import urlparse, urlunparse, unquote
+from tornado.options import define, options, parse_command_line
+
+from torspider import urlnorm
+
+define("hrefs", type=int, default=2000000, help='Hrefs count')
+define("hosts", type=int, default=200, help='Pages hosts count')
+define("unique", type=float, default=0.3, help='Share of hrefs met only once')
+
+_collapse = re.compile(r'([^/]+/\.\./?|/\./|//|/\.$|/\.\.$|^\.)')
+
+
+def legacy_norm(url, domain=None):
+    (scheme, authority, path, parameters, query, fragment) = urlparse(url, scheme='http')
+    logging.debug(pprint.pformat((scheme, authority, path, parameters, query, fragment)))
+    if not authority:
+        authority = domain
+    assert authority, '%s: No authority!' % url
+    userinfo, host, port = urlnorm._server_authority.match(authority).groups()
+    if host[-1] == '.':
+        host = host[:-1]
+    authority = host.lower()
+    if userinfo:
+        authority = "%s@%s" % (userinfo, authority)
+    if port and int(port) != urlnorm._default_port.get(scheme, None):
+        authority = "%s:%s" % (authority, port)
+    if scheme in urlnorm._relative_schemes:
+        last_path = path
+        while 1:
+            path = _collapse.sub('/', path, 1)
+            if last_path == path:
+                break
+            last_path = path
+    path = unquote(path)
+    try:
+        authority = authority.encode('utf8').decode('idna')
+    except Exception as ex:
+        logging.warn(ex)
+    parts = (scheme, authority, path, parameters, query, '')
+    assert not urlunparse(parts).startswith('http://http://'), 'Error parsing <%s>' % url
+    return parts
+
+
+TEMPLATES = (
+    '/', '/index.html', '/about', '/contact/', '/news/?page={n}', '/tag/{w}',
+    '/{w}/{w}/article-{n}.html', '/{w}/../{w}/page-{n}', './{w}/{n}.html',
+    '/{w}/./{w}//item?id={n}#comments', '/static/{w}.css', '/El%20Ni%C3%B1o/{n}',
+    'http://{h}.onion/', 'http://{h}.onion/{w}/{n}', 'https://WWW.{H}.ONION:443/{w}',
+    'http://{h}.onion:8080/{w}/', '//{h}.onion/{w}?q={n}', 'http://xn--h1alffa9f.xn--h1aegh.museum/{n}',
+    'mailto:{w}@{h}.onion',
+)
+WORDS = ('forum', 'market', 'wiki', 'blog', 'search', 'user', 'thread', 'post')
+
+
+def make_hrefs():
+    rnd = random.Random(1)
+    common = [(t, rnd.randrange(1000), rnd.choice(WORDS), 'host%d' % rnd.randrange(options.hosts))
+              for t in TEMPLATES for _ in range(50)]
+    hrefs = []
+    for i in range(options.hrefs):
+        if rnd.random() < options.unique:
+            t, n, w, h = rnd.choice(TEMPLATES), i, rnd.choice(WORDS), 'host%d' % i
+        else:
+            t, n, w, h = rnd.choice(common)
+        domain = 'page%d.onion' % rnd.randrange(options.hosts)
+        hrefs.append((t.format(n=n, w=w, h=h, H=h.upper()), domain))
+    return hrefs
+
+
+def run(name, func, hrefs):
+    results = []
+    start = time.perf_counter()
+    for href, domain in hrefs:
+        try:
+            results.append(func(href, domain))
+        except Exception as ex:
+            results.append(type(ex))
+    elapsed = time.perf_counter() - start
+    print('%-8s %8.3f sec, %10.0f hrefs/sec' % (name, elapsed, len(hrefs) / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    hrefs = make_hrefs()
+    print('%d hrefs' % len(hrefs))
+    old = run('legacy', legacy_norm, hrefs)
+    urlnorm.norm.cache_clear()
+    new = run('norm', urlnorm.norm, hrefs)
+    print('Cache: %s' % (urlnorm.norm.cache_info(),))
+    mismatches = [h for h, a, b in zip(hrefs, old, new) if a != b]
+    print('%d mismatches' % len(mismatches))
+    for href in mismatches[:10]:
+        print(href)
@@ -29,7 +29,19 @@ setup(name='torspider',
           'console_scripts': [
                'torspider = torspider.main:run_main',
           ], # see: http://amir.rachum.com/blog/2017/07/28/python-entry-points/
-          'torspider_init': [], # initialization stage
-          'torspider_consume': [], # called when page is aquired or error is detected
+          'torspider_init': [ # initialization stage
+              'sink = torspider.sink:init',
+              'archive = torspider.archive:init',
+          ],
+          'torspider_consume': [ # called when page is aquired or error is detected
+              'sink = torspider.sink:consume',
+              'archive = torspider.archive:consume',
+          ],
+          'torspider_done': [ # the crawl is over
+              'sink = torspider.sink:done',
+              'archive = torspider.archive:done',
+          ],
+          'torspider_score': [], # priority of a new task, lower is better
+          'torspider_lang': [], # language detector of page text
         }
 )
@@ -0,0 +1,134 @@
+import sys
+import logging
+import unittest
+from tornado import testing
+
+from torspider.admission import AdmissionController, TokenBucket
+from torspider.stats import CrawlStats
+
+
+class FakeRedis:
+    """Keeps the tasks and the spill queue in memory."""
+    connection_errors = (ConnectionError,)
+
+    def __init__(self, pending=0):
+        self.tasks = set()
+        self.pending = pending
+        self.spilled = []
+
+    async def counts(self):
+        return 0, self.pending
+
+    async def put_tasks(self, tasks, source=None):
+        new = set(tasks) - self.tasks
+        self.tasks.update(new)
+        self.pending += len(new)
+        return len(new)
+
+    async def spill(self, tasks, source=None):
+        self.spilled.insert(0, (list(tasks), source))
+
+    async def unspill(self, count):
+        items = self.spilled[-count:]
+        del self.spilled[-count:]
+        return list(reversed(items))
+
+
+class TokenBucketCase(unittest.TestCase):
+
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        self.assertTrue(bucket.take(10 ** 6))
+        self.assertTrue(bucket.available)
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=10, burst=10)
+        self.assertTrue(bucket.take(15))
+        self.assertFalse(bucket.available)
+        self.assertFalse(bucket.take(1))
+        bucket.updated -= 1.0
+        self.assertTrue(bucket.take(1))
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=10, burst=20)
+        bucket.updated -= 100
+        self.assertTrue(bucket.available)
+        self.assertEqual(20, bucket.tokens)
+
+
+class AdmissionCase(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(AdmissionCase, self).setUp()
+        self.redis = FakeRedis()
+        self.stats = CrawlStats(self.redis, max_age=0)
+        self.admission = AdmissionController(self.redis, self.stats, high_water=4)
+
+    def links(self, page, count=2):
+        return ['http://a.onion/%d/%d' % (page, i) for i in range(count)]
+
+    @testing.gen_test
+    def test_admit(self):
+        count = yield self.admission.admit(self.redis, self.links(1), 'http://a.onion/')
+        self.assertEqual(2, count)
+        self.assertEqual(2, self.stats.pending)
+        self.assertEqual([], self.redis.spilled)
+
+    @testing.gen_test
+    def test_spill(self):
+        for page in range(3):
+            yield self.admission.admit(self.redis, self.links(page), 'http://a.onion/')
+        self.assertEqual(4, self.stats.pending)
+        self.assertEqual([(self.links(2), 'http://a.onion/')], self.redis.spilled)
+        self.assertEqual(2, self.admission.spilled)
+
+    @testing.gen_test
+    def test_drain(self):
+        for page in range(4):
+            yield self.admission.admit(self.redis, self.links(page), 'http://a.onion/')
+        # the frontier is full
+        count = yield self.admission.drain()
+        self.assertEqual(0, count)
+        # the frontier is below the low-water mark: all deferred links are admitted
+        self.redis.pending = 1
+        count = yield self.admission.drain()
+        self.assertEqual(4, count)
+        self.assertEqual([], self.redis.spilled)
+        self.assertEqual(8, len(self.redis.tasks))
+
+    @testing.gen_test
+    def test_drain_stops_at_low_water(self):
+        # pages are popped in batches, the mark is checked between them
+        self.admission.low_water = 3
+        for page in range(15):
+            yield self.redis.spill(self.links(page), None)
+        count = yield self.admission.drain()
+        self.assertEqual(20, count)
+        self.assertEqual(5, len(self.redis.spilled))
+        self.assertEqual([(self.links(14), None)], self.redis.spilled[:1])
+
+    @testing.gen_test
+    def test_rate(self):
+        self.admission.high_water = 0
+        self.admission.bucket = TokenBucket(rate=1, burst=1)
+        count = yield self.admission.admit(self.redis, self.links(1), None)
+        self.assertEqual(2, count)
+        count = yield self.admission.admit(self.redis, self.links(2), None)
+        self.assertIsNone(count)
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(TokenBucketCase))
+    test_suite.addTest(unittest.makeSuite(AdmissionCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        #level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    unittest.main(verbosity=4)
@@ -0,0 +1,121 @@
+import io
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+from tornado import testing
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
+
+from torspider import archive
+from torspider.scraper import Page
+from torspider.lxmlpage import LxmlPage
+
+HTML = '<html><head><title>Page %d</title></head><body><p>Text %d</p></body></html>'
+
+
+def make_response(i):
+    url = 'http://a.onion/%d' % i
+    headers = HTTPHeaders({'Content-Type': 'text/html; charset=utf-8',
+                           'Server': 'test', 'Set-Cookie': 'secret'})
+    body = (HTML % (i, i)).encode('utf-8')
+    return url, HTTPResponse(HTTPRequest(url), 200, reason='OK', headers=headers,
+                             buffer=io.BytesIO(body), effective_url=url + '/')
+
+
+class ArchiveCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def fill(self, count, **kwargs):
+        writer = archive.ArchiveWriter(self.tmp, **kwargs)
+        for i in range(count):
+            writer.write(*make_response(i))
+        writer.close()
+
+    def test_stream(self):
+        self.fill(5)
+        records = list(archive.ArchiveReader(self.tmp))
+        self.assertEqual(5, len(records))
+        url, res = records[3]
+        self.assertEqual('http://a.onion/3', url)
+        self.assertEqual('http://a.onion/3/', res.effective_url)
+        self.assertEqual(200, res.code)
+        self.assertEqual((HTML % (3, 3)).encode('utf-8'), res.body)
+
+    def test_saved_headers(self):
+        self.fill(1)
+        _, res = next(iter(archive.ArchiveReader(self.tmp)))
+        self.assertEqual('test', res.headers['Server'])
+        self.assertNotIn('Set-Cookie', res.headers)
+
+    def test_rotation(self):
+        self.fill(10, segment_size=200)
+        reader = archive.ArchiveReader(self.tmp)
+        self.assertGreater(len(reader.segments), 1)
+        self.assertEqual(10, len(list(reader)))
+
+    def test_index(self):
+        self.fill(10, segment_size=200)
+        reader = archive.ArchiveReader(self.tmp)
+        res = reader.get('http://a.onion/7')
+        self.assertEqual((HTML % (7, 7)).encode('utf-8'), res.body)
+        self.assertIsNone(reader.get('http://a.onion/70'))
+
+    def test_append(self):
+        self.fill(2)
+        self.fill(2)
+        self.assertEqual(4, len(list(archive.ArchiveReader(self.tmp))))
+
+    def test_pages(self):
+        self.fill(3)
+        titles = [p.title for p in archive.ArchiveReader(self.tmp).iter_pages(LxmlPage)]
+        self.assertEqual(['Page 0', 'Page 1', 'Page 2'], titles)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            archive.ArchiveWriter(self.tmp, compression='lzma')
+
+
+class ArchiveConsumerCase(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ArchiveConsumerCase, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        super(ArchiveConsumerCase, self).tearDown()
+
+    @testing.gen_test
+    def test_consume(self):
+        consumer = archive.ArchiveConsumer(archive.ArchiveWriter(self.tmp))
+        url, res = make_response(1)
+        yield consumer({'url': url, 'page': Page(url, res)})
+        yield consumer({'url': 'http://a.onion/error', 'error': 'HTTP 404'})
+        consumer.close()
+        pages = list(archive.ArchiveReader(self.tmp).iter_pages())
+        self.assertEqual(1, len(pages))
+        self.assertEqual('Page 1', pages[0].title)
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(ArchiveCase))
+    test_suite.addTest(unittest.makeSuite(ArchiveConsumerCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    testing.main(verbosity=3)
@@ -0,0 +1,61 @@
+import sys
+import logging
+import random
+import unittest
+
+from torspider.bloom import BloomFilter
+
+
+class BloomFilterCase(unittest.TestCase):
+    """Test Bloom filter geometry."""
+
+    def test_size(self):
+        bf = BloomFilter(1000000, 0.01)
+        self.assertEqual(9585059, bf.bits)
+        self.assertEqual(7, bf.hashes)
+
+    def test_offsets_count(self):
+        bf = BloomFilter(1000, 0.001)
+        self.assertEqual(bf.hashes, len(bf.offsets('http://example.com/')))
+
+    def test_offsets_range(self):
+        bf = BloomFilter(1000, 0.001)
+        for i in range(100):
+            for n in bf.offsets('http://example.com/%d' % i):
+                self.assertTrue(0 <= n < bf.bits)
+
+    def test_offsets_stable(self):
+        bf = BloomFilter(1000, 0.001)
+        self.assertEqual(bf.offsets('http://example.com/'), bf.offsets('http://example.com/'))
+
+    def test_error_rate(self):
+        bf = BloomFilter(10000, 0.01)
+        bits = set()
+        for i in range(bf.capacity):
+            bits.update(bf.offsets('http://example.com/%d' % i))
+        rnd = random.Random(1)
+        trials = 10000
+        positives = sum(
+            1 for _ in range(trials)
+            if bits.issuperset(bf.offsets('http://example.org/%f' % rnd.random()))
+        )
+        self.assertLess(positives / trials, 0.02)
+
+    def test_too_large(self):
+        with self.assertRaises(AssertionError):
+            BloomFilter(10 ** 10, 0.001)
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(BloomFilterCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    unittest.main(verbosity=4)
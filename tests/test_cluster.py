@@ -0,0 +1,88 @@
+import sys
+import logging
+import unittest
+from tornado import gen, testing
+
+from torspider.cluster import ClusterNode
+
+
+class FakeRedis:
+    connection_errors = (ConnectionError,)
+    node_timeout = 1.0
+
+    def __init__(self, node_id, coordinator=None, dead_tasks=()):
+        self.node_id = node_id
+        self.holder = coordinator or node_id
+        self.dead_tasks = list(dead_tasks)
+        self.beats = 0
+        self.registered = False
+        self.closed = False
+
+    async def heartbeat(self):
+        self.beats += 1
+        self.registered = True
+        return self.holder
+
+    async def requeue_dead_nodes(self):
+        requeued, self.dead_tasks = self.dead_tasks, []
+        return requeued
+
+    async def unregister_node(self):
+        self.registered = False
+
+    async def close(self):
+        self.closed = True
+
+
+class ClusterNodeCase(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_register(self):
+        node = ClusterNode(FakeRedis('node-a'), interval=0.01)
+        yield node.register()
+        self.assertTrue(node.is_coordinator)
+        yield gen.sleep(0.05)
+        self.assertGreater(node.redis.beats, 1)
+        yield node.unregister()
+        self.assertFalse(node.redis.registered)
+        self.assertTrue(node.redis.closed)
+        beats = node.redis.beats
+        yield gen.sleep(0.03)
+        self.assertEqual(beats, node.redis.beats)
+
+    @testing.gen_test
+    def test_not_coordinator(self):
+        node = ClusterNode(FakeRedis('node-a', coordinator='node-b'), interval=0.01)
+        yield node.register()
+        self.assertFalse(node.is_coordinator)
+        self.assertEqual('node-b', node.coordinator)
+        yield node.unregister()
+
+    @testing.gen_test
+    def test_requeue_dead(self):
+        redis = FakeRedis('node-a', dead_tasks=['http://a.onion/', 'http://b.onion/'])
+        node = ClusterNode(redis, interval=0.01)
+        yield node.register()
+        yield gen.sleep(0.05)
+        yield node.unregister()
+        self.assertEqual(2, node.requeued)
+
+    def test_interval(self):
+        with self.assertRaises(AssertionError):
+            ClusterNode(FakeRedis('node-a'), interval=5.0)
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(ClusterNodeCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        #level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    unittest.main(verbosity=4)
@@ -0,0 +1,163 @@
+import sys
+import time
+import logging
+import unittest
+import pycurl
+from tornado import gen, testing, httpclient
+from tornado.curl_httpclient import CurlAsyncHTTPClient, CurlError
+from tornado.simple_httpclient import HTTPTimeoutError
+
+from torspider.concurrency import AdaptiveConcurrency, is_timeout
+
+
+class LimitCase(testing.AsyncTestCase):
+    """Workers wait for a free slot."""
+
+    @testing.gen_test
+    def test_acquire(self):
+        c = AdaptiveConcurrency(min_workers=2, max_workers=4)
+        yield c.acquire()
+        yield c.acquire()
+        third = gen.convert_yielded(c.acquire())
+        yield gen.sleep(0.01)
+        self.assertFalse(third.done())
+        self.assertEqual(1, c.waiting)
+        c.release()
+        yield third
+        self.assertEqual(2, c.active)
+        self.assertEqual(0, c.waiting)
+
+    @testing.gen_test
+    def test_raise_limit(self):
+        c = AdaptiveConcurrency(min_workers=1, max_workers=4)
+        yield c.acquire()
+        waiting = [gen.convert_yielded(c.acquire()) for _ in range(2)]
+        yield gen.sleep(0.01)
+        c.set_limit(3)
+        yield waiting
+        self.assertEqual(3, c.active)
+
+
+class AdjustCase(unittest.TestCase):
+    """AIMD decisions."""
+
+    def setUp(self):
+        self.c = AdaptiveConcurrency(min_workers=2, max_workers=16)
+
+    def feed(self, count=10, elapsed=1.0, timeouts=0, blocked=True):
+        for i in range(count):
+            self.c.record(elapsed, timeout=i < timeouts)
+        self.c.blocked = blocked
+        self.c.started = time.monotonic() - 1.0 # one second window
+
+    def test_slow_start(self):
+        self.feed()
+        self.assertEqual('increase', self.c.adjust())
+        self.assertEqual(4, self.c.limit)
+        self.feed()
+        self.c.adjust()
+        self.assertEqual(8, self.c.limit)
+
+    def test_few_samples(self):
+        self.feed(count=2)
+        self.assertEqual('hold', self.c.adjust())
+        self.assertEqual(2, self.c.limit)
+
+    def test_no_demand(self):
+        self.feed(blocked=False)
+        self.assertEqual('hold', self.c.adjust())
+
+    def test_timeouts(self):
+        self.c.set_limit(8)
+        self.feed(timeouts=5)
+        self.assertEqual('decrease', self.c.adjust())
+        self.assertEqual(4, self.c.limit)
+        self.assertFalse(self.c.slow_start)
+        # additive increase after the first congestion
+        self.feed()
+        self.c.adjust()
+        self.assertEqual(5, self.c.limit)
+
+    def test_latency(self):
+        self.c.set_limit(8)
+        self.feed(elapsed=1.0, blocked=False)
+        self.c.adjust()
+        self.feed(elapsed=5.0)
+        self.assertEqual('decrease', self.c.adjust())
+        self.assertEqual(4, self.c.limit)
+
+    def test_bounds(self):
+        self.c.set_limit(2)
+        self.feed(timeouts=10)
+        self.c.adjust()
+        self.assertEqual(2, self.c.limit)
+        self.c.set_limit(16)
+        self.feed()
+        self.assertEqual('hold', self.c.adjust())
+        self.assertEqual(16, self.c.limit)
+
+    def test_throughput_drop(self):
+        self.c.slow_start = False
+        self.feed(count=100)
+        self.c.started -= 9 # 10 pages/sec
+        self.c.adjust()
+        self.assertEqual(3, self.c.limit)
+        self.feed(count=50)
+        self.c.started -= 9 # 5 pages/sec
+        self.assertEqual('decrease', self.c.adjust())
+        self.assertEqual(2, self.c.limit)
+
+
+class TimeoutCase(unittest.TestCase):
+
+    def test_is_timeout(self):
+        self.assertTrue(is_timeout(CurlError(pycurl.E_OPERATION_TIMEDOUT,
+            'Operation timed out after 1006 milliseconds with 0 bytes received')))
+        self.assertTrue(is_timeout(CurlError(pycurl.E_OPERATION_TIMEDOUT,
+            'Connection timed out after 1001 milliseconds')))
+        self.assertTrue(is_timeout(HTTPTimeoutError('Timeout during request')))
+        self.assertFalse(is_timeout(CurlError(pycurl.E_COULDNT_CONNECT, 'Connection refused')))
+        self.assertFalse(is_timeout(httpclient.HTTPClientError(404)))
+        self.assertFalse(is_timeout(None))
+
+
+class CurlTimeoutCase(testing.AsyncTestCase):
+    """A server accepting connections, but never responding."""
+
+    def setUp(self):
+        super(CurlTimeoutCase, self).setUp()
+        self.sock, self.port = testing.bind_unused_port()
+        self.sock.listen(8)
+
+    def tearDown(self):
+        self.sock.close()
+        super(CurlTimeoutCase, self).tearDown()
+
+    @testing.gen_test
+    def test_request_timeout(self):
+        client = CurlAsyncHTTPClient(force_instance=True)
+        try:
+            with self.assertRaises(httpclient.HTTPError) as ctx:
+                yield client.fetch('http://127.0.0.1:%d/' % self.port, request_timeout=0.5)
+        finally:
+            client.close()
+        self.assertTrue(is_timeout(ctx.exception))
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(LimitCase))
+    test_suite.addTest(unittest.makeSuite(AdjustCase))
+    test_suite.addTest(unittest.makeSuite(TimeoutCase))
+    test_suite.addTest(unittest.makeSuite(CurlTimeoutCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        #level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    unittest.main(verbosity=4)
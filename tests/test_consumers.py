@@ -0,0 +1,95 @@
+import sys
+import logging
+import unittest
+from tornado import gen, testing
+
+from torspider.consumers import ConsumerPipeline
+
+
+class Recorder:
+    """Consumer function, which takes `delay` seconds per report."""
+    def __init__(self, delay=0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.reports = []
+
+    async def __call__(self, report):
+        if self.delay:
+            await gen.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('Test')
+        self.reports.append(report)
+
+
+class ConsumerPipelineCase(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_all_consumers(self):
+        a, b = Recorder(), Recorder()
+        pipeline = ConsumerPipeline({'a': a, 'b': b})
+        for i in range(5):
+            yield pipeline.put({'url': i})
+        yield pipeline.close()
+        self.assertEqual(5, len(a.reports))
+        self.assertEqual(5, len(b.reports))
+
+    @testing.gen_test
+    def test_slow_consumer(self):
+        slow = Recorder(delay=0.1)
+        pipeline = ConsumerPipeline({'slow': slow}, queue_size=10)
+        yield gen.with_timeout(self.io_loop.time() + 0.05, pipeline.put({'url': 1}))
+        self.assertEqual([], slow.reports)
+        yield pipeline.close()
+        self.assertEqual(1, len(slow.reports))
+
+    @testing.gen_test
+    def test_backpressure(self):
+        slow = Recorder(delay=0.02)
+        pipeline = ConsumerPipeline({'slow': slow}, queue_size=1)
+        for i in range(5):
+            yield pipeline.put({'url': i})
+        self.assertGreater(pipeline.stats()['slow']['blocked'], 0)
+        self.assertLessEqual(pipeline.stats()['slow']['queued'], 1)
+        yield pipeline.close()
+        self.assertEqual(5, len(slow.reports))
+
+    @testing.gen_test
+    def test_errors(self):
+        pipeline = ConsumerPipeline({'bad': Recorder(fail=True)})
+        yield pipeline.put({'url': 1})
+        yield pipeline.close()
+        stats = pipeline.stats()['bad']
+        self.assertEqual(1, stats['errors'])
+        self.assertEqual(1, stats['processed'])
+
+    @testing.gen_test
+    def test_inline(self):
+        rec = Recorder()
+        pipeline = ConsumerPipeline({'rec': rec}, concurrency=0)
+        yield pipeline.put({'url': 1})
+        self.assertEqual(1, len(rec.reports))
+
+    @testing.gen_test
+    def test_close_timeout(self):
+        slow = Recorder(delay=10)
+        pipeline = ConsumerPipeline({'slow': slow}, queue_size=5)
+        yield pipeline.put({'url': 1})
+        yield pipeline.put({'url': 2})
+        yield pipeline.close(timeout=0.05)
+        self.assertEqual([], slow.reports)
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(ConsumerPipelineCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    testing.main(verbosity=3)
@@ -0,0 +1,123 @@
+import sys
+import asyncio
+import logging
+import unittest
+from tornado import gen, testing
+
+from torspider.controller import CrawlController
+from torspider.stats import CrawlStats
+
+
+class FakeRedis:
+    def __init__(self, passed=0):
+        self.passed = passed
+        self.reaped = 0
+
+    async def requeue_expired(self):
+        self.reaped += 1
+        return []
+
+    async def counts(self):
+        return self.passed, 0
+
+    def pool_stats(self):
+        return {}
+
+
+class FakeWorker:
+    """Waits for tasks forever or, if busy, works for `duration` seconds."""
+    def __init__(self, busy=False, duration=0.05):
+        self.busy = busy
+        self.duration = duration
+        self.controller = None
+        self.completed = False
+        self.cancelled = False
+
+    async def __call__(self):
+        try:
+            if self.busy:
+                await gen.sleep(self.duration)
+                self.completed = True
+                self.busy = False
+            while not self.controller.stopping:
+                await gen.sleep(1000)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class CrawlControllerCase(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(CrawlControllerCase, self).setUp()
+        self.redis = FakeRedis()
+        self.stats = CrawlStats(self.redis, max_age=0)
+        self.controller = CrawlController(self.stats, interval=0.01, drain_timeout=1.0)
+
+    @testing.gen_test
+    def test_finish(self):
+        self.controller.start(FakeWorker())
+        self.io_loop.call_later(0.05, self.controller.finish, 'Test')
+        yield self.controller.supervise()
+        self.assertEqual('Test', self.controller.reason)
+
+    @testing.gen_test
+    def test_pages_limit(self):
+        self.controller.start(FakeWorker())
+        self.redis.passed = 10
+        yield self.controller.supervise(max_pages=10)
+        self.assertTrue(self.controller.stopping)
+        self.assertGreater(self.controller.wakeups, 0)
+
+    @testing.gen_test
+    def test_requeue_expired(self):
+        self.controller.redis = self.redis
+        self.controller.start(FakeWorker())
+        self.io_loop.call_later(0.05, self.controller.finish, 'Test')
+        yield self.controller.supervise()
+        self.assertGreater(self.redis.reaped, 0)
+
+    @testing.gen_test
+    def test_idle_cancelled(self):
+        worker = FakeWorker()
+        self.controller.start(worker)
+        yield gen.sleep(0.01)
+        self.controller.finish('Test')
+        yield self.controller.shutdown()
+        self.assertTrue(worker.cancelled)
+
+    @testing.gen_test
+    def test_busy_drained(self):
+        worker = FakeWorker(busy=True)
+        self.controller.start(worker)
+        yield gen.sleep(0.01)
+        self.controller.finish('Test')
+        yield self.controller.shutdown()
+        self.assertTrue(worker.completed)
+
+    @testing.gen_test
+    def test_drain_timeout(self):
+        self.controller.drain_timeout = 0.01
+        worker = FakeWorker(busy=True, duration=10)
+        self.controller.start(worker)
+        yield gen.sleep(0.01)
+        self.controller.finish('Test')
+        yield self.controller.shutdown()
+        self.assertFalse(worker.completed)
+        self.assertTrue(worker.cancelled)
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(CrawlControllerCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    testing.main(verbosity=3)
@@ -0,0 +1,123 @@
+import io
+import sys
+import logging
+import unittest
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
+
+from torspider import langs
+from torspider.scraper import Page
+
+ENGLISH = ('The quick brown fox jumps over the lazy dog. '
+           'This sentence is written in plain English for the test. ') * 5
+RUSSIAN = ('Съешь же ещё этих мягких французских булок, да выпей чаю. '
+           'Это предложение написано на русском языке. ') * 5
+
+
+def make_page(url, html, headers=None):
+    res = HTTPResponse(HTTPRequest(url), 200, headers=HTTPHeaders(headers or {}),
+                       buffer=io.BytesIO(html.encode('utf-8')), effective_url=url)
+    return Page(url, res)
+
+
+class CountingDetector:
+    def __init__(self, lang='en'):
+        self.lang = lang
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return self.lang
+
+
+class NormalizeCase(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual('ru', langs.normalize('ru-RU, en;q=0.7'))
+        self.assertEqual('en', langs.normalize('EN_us'))
+        self.assertIsNone(langs.normalize('*'))
+        self.assertIsNone(langs.normalize(''))
+
+    def test_sample(self):
+        text = 'x' * 10000
+        self.assertEqual(langs.SAMPLE_SIZE + langs.SAMPLE_PARTS - 1,
+                         len(langs.sample(text)))
+        self.assertEqual('short', langs.sample('short'))
+
+
+class LangDetectCase(unittest.TestCase):
+
+    def test_detect(self):
+        detect = langs.LangDetect()
+        self.assertEqual('en', detect(ENGLISH))
+        self.assertEqual('ru', detect(RUSSIAN))
+
+    def test_deterministic(self):
+        text = 'Hello mundo bonjour'
+        results = {langs.LangDetect()(text) for _ in range(5)}
+        self.assertEqual(1, len(results))
+
+    def test_no_features(self):
+        self.assertIsNone(langs.LangDetect()('12345'))
+
+
+class LanguageDetectorCase(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = CountingDetector()
+        self.langs = langs.LanguageDetector(self.detector, agreement=2)
+
+    def test_header(self):
+        page = make_page('http://a.onion/', '<p>%s</p>' % ENGLISH,
+                         {'Content-Language': 'ru-RU'})
+        self.assertEqual('ru', self.langs.detect(page))
+        self.assertEqual(0, self.detector.calls)
+
+    def test_html_lang(self):
+        page = make_page('http://a.onion/', '<html lang="de"><p>%s</p></html>' % ENGLISH)
+        self.assertEqual('de', self.langs.detect(page))
+        self.assertEqual(0, self.detector.calls)
+
+    def test_meta(self):
+        page = make_page('http://a.onion/',
+                         '<head><meta name="language" content="fr"></head><p>x</p>')
+        self.assertEqual('fr', self.langs.detect(page))
+
+    def test_domain_cache(self):
+        for i in range(4):
+            page = make_page('http://a.onion/%d' % i, '<p>%s</p>' % ENGLISH)
+            self.assertEqual('en', self.langs.detect(page))
+        self.assertEqual(2, self.detector.calls)
+
+    def test_empty(self):
+        page = make_page('http://a.onion/', '<p></p>')
+        self.assertEqual(langs.UNKNOWN, self.langs.detect(page))
+
+    def test_failing_detector(self):
+        def fail(text):
+            raise RuntimeError('Test')
+        detector = langs.LanguageDetector(fail)
+        page = make_page('http://a.onion/', '<p>%s</p>' % ENGLISH)
+        self.assertEqual(langs.UNKNOWN, detector.detect(page))
+
+    def test_unknown_detector(self):
+        with self.assertRaises(ValueError):
+            langs.get_detector('no-such-detector')
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(NormalizeCase))
+    test_suite.addTest(unittest.makeSuite(LangDetectCase))
+    test_suite.addTest(unittest.makeSuite(LanguageDetectorCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    unittest.main(verbosity=3)
@@ -0,0 +1,112 @@
+import io
+import os
+import sys
+import signal
+import logging
+import unittest
+from tornado import testing
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
+
+from torspider import scraper
+from torspider.parsing import PageParser, ParsedPage, ParseError, parse_page
+
+URL = 'http://a.onion/'
+HTML = b"""<html><head><title>Title</title><meta name="description" content="Test"></head>
+<body><p>This is a simple page written in English, with a couple of links:
+<a href="/inner.html">inner</a> and <a href="http://b.onion/">outer</a>.</p></body></html>"""
+
+
+def make_response(body=HTML):
+    headers = HTTPHeaders({'Content-Type': 'text/html; charset=utf-8'})
+    return HTTPResponse(HTTPRequest(URL), 200, headers=headers,
+                        buffer=io.BytesIO(body), effective_url=URL)
+
+
+def without_language(report):
+    return {k: v for k, v in report.items() if k != 'language'}
+
+
+class ParsePageCase(unittest.TestCase):
+
+    def test_report(self):
+        res = make_response()
+        report = parse_page(URL, res.body, URL, list(res.headers.get_all()))
+        expected = scraper.Page(URL, res).as_dict()
+        self.assertEqual(without_language(expected), without_language(report))
+
+    def test_parsed_page(self):
+        res = make_response()
+        page = ParsedPage(URL, scraper.Page(URL, res).as_dict())
+        self.assertEqual('Title', page.title)
+        self.assertEqual((['http://a.onion/inner.html'], ['http://b.onion/']),
+                         page.partition_links())
+        self.assertEqual({'http://a.onion/inner.html', 'http://b.onion/'}, page.links)
+
+
+class PageParserCase(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_inline(self):
+        parser = PageParser(0, 'lxml')
+        page = yield parser.parse(URL, make_response())
+        self.assertIsInstance(page, scraper.get_page_class('lxml'))
+        parser.close()
+
+    @testing.gen_test(timeout=30)
+    def test_pool(self):
+        parser = PageParser(1)
+        try:
+            page = yield parser.parse(URL, make_response())
+        finally:
+            parser.close()
+        self.assertIsInstance(page, ParsedPage)
+        self.assertEqual('Title', page.title)
+        self.assertEqual({'description': 'Test'}, page.meta)
+        self.assertEqual('en', page.language)
+
+    @testing.gen_test(timeout=30)
+    def test_pool_error(self):
+        parser = PageParser(1)
+        try:
+            with self.assertRaises(ParseError) as ctx:
+                yield parser.parse(URL, make_response(b''))
+            self.assertIsNotNone(ctx.exception.response)
+            # the pool survives
+            page = yield parser.parse(URL, make_response())
+            self.assertEqual('Title', page.title)
+        finally:
+            parser.close()
+
+    @testing.gen_test(timeout=30)
+    def test_broken_pool(self):
+        parser = PageParser(1)
+        try:
+            yield parser.parse(URL, make_response()) # children start on demand
+            broken = parser.executor
+            for pid in list(broken._processes):
+                os.kill(pid, signal.SIGKILL)
+            with self.assertRaises(ParseError):
+                yield parser.parse(URL, make_response())
+            self.assertIsNot(broken, parser.executor)
+            page = yield parser.parse(URL, make_response())
+            self.assertEqual('Title', page.title)
+        finally:
+            parser.close()
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(ParsePageCase))
+    test_suite.addTest(unittest.makeSuite(PageParserCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    testing.main(verbosity=3)
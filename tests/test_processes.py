@@ -0,0 +1,111 @@
+import sys
+import time
+import signal
+import logging
+import unittest
+import multiprocessing
+from tornado import testing
+
+from torspider.processes import ProcessSupervisor
+from torspider.stats import CrawlStats
+
+
+def sleeper(duration, index):
+    time.sleep(duration)
+
+
+def crasher(duration, index):
+    if index == 0:
+        sys.exit(3)
+    time.sleep(duration)
+
+
+def stubborn(duration, ready, index):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    ready.release()
+    time.sleep(duration)
+
+
+class FakeRedis:
+    def __init__(self, passed=0):
+        self.passed = passed
+
+    async def counts(self):
+        return self.passed, 0
+
+
+class ProcessSupervisorCase(testing.AsyncTestCase):
+
+    def make(self, target, *args, **kwargs):
+        self.supervisor = ProcessSupervisor(2, target, args, interval=0.05,
+                                            drain_timeout=1.0, **kwargs)
+        self.supervisor.start()
+        return self.supervisor
+
+    def tearDown(self):
+        for p in self.supervisor.alive:
+            p.kill()
+        super(ProcessSupervisorCase, self).tearDown()
+
+    @testing.gen_test(timeout=30)
+    def test_children_exit(self):
+        supervisor = self.make(sleeper, 0.1)
+        yield supervisor.supervise()
+        self.assertEqual('No running processes', supervisor.reason)
+        yield supervisor.shutdown()
+        self.assertEqual([0, 0], [p.exitcode for p in supervisor.children])
+
+    @testing.gen_test(timeout=30)
+    def test_finish(self):
+        supervisor = self.make(sleeper, 100)
+        self.io_loop.call_later(0.1, supervisor.finish, 'Test')
+        yield supervisor.supervise()
+        yield supervisor.shutdown()
+        self.assertEqual('Test', supervisor.reason)
+        self.assertEqual([-signal.SIGTERM] * 2, [p.exitcode for p in supervisor.children])
+
+    @testing.gen_test(timeout=30)
+    def test_kill(self):
+        ready = multiprocessing.get_context('spawn').Semaphore(0)
+        supervisor = self.make(stubborn, 100, ready)
+        for _ in supervisor.children:
+            self.assertTrue(ready.acquire(timeout=10))
+        supervisor.finish('Test')
+        start = time.monotonic()
+        yield supervisor.shutdown()
+        self.assertGreaterEqual(time.monotonic() - start, supervisor.drain_timeout)
+        self.assertEqual([-signal.SIGKILL] * 2, [p.exitcode for p in supervisor.children])
+
+    @testing.gen_test(timeout=30)
+    def test_exit_logged_once(self):
+        supervisor = self.make(crasher, 100)
+        self.io_loop.call_later(1.0, supervisor.finish, 'Test')
+        with self.assertLogs(level='ERROR') as logs:
+            yield supervisor.supervise()
+        yield supervisor.shutdown()
+        self.assertEqual(1, sum('exited with code 3' in x for x in logs.output))
+
+    @testing.gen_test(timeout=30)
+    def test_max_pages(self):
+        stats = CrawlStats(FakeRedis(passed=10), max_age=0)
+        supervisor = self.make(sleeper, 100, stats=stats)
+        yield supervisor.supervise(max_pages=10)
+        yield supervisor.shutdown()
+        self.assertEqual('Pages limit (10) exceeded', supervisor.reason)
+        self.assertFalse(supervisor.alive)
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(ProcessSupervisorCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        #level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    unittest.main(verbosity=4)
@@ -0,0 +1,81 @@
+import sys
+import logging
+import unittest
+
+from torspider import scoring
+
+
+class PathDepthCase(unittest.TestCase):
+
+    def test_root(self):
+        self.assertEqual(0, scoring.path_depth('http://example.com/'))
+
+    def test_deep(self):
+        self.assertEqual(3, scoring.path_depth('http://example.com/a/b//c/'))
+
+
+class SeedNeighboursCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scorer = scoring.SeedNeighbours(['http://example.com/'], bonus=1)
+
+    def test_seed(self):
+        self.assertEqual(-2, self.scorer('http://example.com/'))
+
+    def test_neighbour(self):
+        self.assertEqual(-1, self.scorer('http://example.org/', 'http://example.com/'))
+
+    def test_other(self):
+        self.assertEqual(0, self.scorer('http://example.org/a', 'http://example.org/'))
+
+    def test_normalized(self):
+        scorer = scoring.SeedNeighbours(['http://Example.onion', 'http://x.onion:80/a/../b'],
+                                        bonus=1)
+        self.assertEqual(-1, scorer('http://y.onion/', 'http://example.onion'))
+        self.assertEqual(-1, scorer('http://y.onion/', 'http://x.onion/b'))
+
+
+class DomainNoveltyCase(unittest.TestCase):
+
+    def test_novelty(self):
+        scorer = scoring.DomainNovelty(bonus=1)
+        self.assertEqual(-1, scorer('http://example.com/a'))
+        self.assertEqual(0, scorer('http://example.com/b'))
+        self.assertEqual(-1, scorer('http://example.org/'))
+
+    def test_max_hosts(self):
+        scorer = scoring.DomainNovelty(bonus=1, max_hosts=1)
+        scorer('http://example.com/')
+        scorer('http://example.org/')
+        self.assertEqual(-1, scorer('http://example.com/'))
+
+
+class ScorerCase(unittest.TestCase):
+
+    def test_sum(self):
+        scorer = scoring.Scorer([scoring.path_depth, lambda url, source: 10])
+        self.assertEqual(12, scorer('http://example.com/a/b'))
+
+    def test_failure(self):
+        def failing(url, source):
+            raise ValueError(url)
+        scorer = scoring.Scorer([scoring.path_depth, failing])
+        self.assertEqual(2, scorer('http://example.com/a/b'))
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(PathDepthCase))
+    test_suite.addTest(unittest.makeSuite(SeedNeighboursCase))
+    test_suite.addTest(unittest.makeSuite(DomainNoveltyCase))
+    test_suite.addTest(unittest.makeSuite(ScorerCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    unittest.main(verbosity=4)
@@ -1,12 +1,14 @@
+import io
 import logging
 import unittest
 
-from tornado import testing
-from  tornado.httpclient import HTTPError
+from tornado import testing, web
+from  tornado.httpclient import HTTPError, HTTPRequest, HTTPResponse
 from tornado.options import define
 
 # import application packages
 from torspider import scraper
+from torspider.lxmlpage import LxmlPage
 
 define("proxy", type=str, default=None)
 define("connect_timeout", type=float, default=10.0, help='Connect timeout')
@@ -99,10 +101,215 @@ class PageCase(testing.AsyncTestCase):
         self.assertEqual(9, len(inner))
 
 
+def make_page(url, body, page_class=scraper.Page):
+    res = HTTPResponse(HTTPRequest(url), 200, buffer=io.BytesIO(body),
+                       effective_url=url)
+    return page_class(url, res)
+
+
+class TextCase(unittest.TestCase):
+    """Text extraction from saved HTML."""
+    page_class = scraper.Page
+    html = b"""<html><head><title>T</title><style>p {}</style></head><body>
+<h1>Header</h1>
+<p>First   paragraph . Second\tsentence</p><!-- comment -->
+<script>var x = 1;</script><form>Search <input name="q"></form>
+<div>Last</div>
+</body></html>"""
+
+    def setUp(self):
+        self.page = make_page('http://a.onion/', self.html, self.page_class)
+
+    def test_text(self):
+        self.assertEqual('Header First paragraph. Second\tsentence Last',
+                         self.page.text)
+
+    def test_tree_intact(self):
+        self.page.text
+        self.assertIsNotNone(self.page.soup.script)
+        self.assertIsNotNone(self.page.soup.form)
+
+    def test_no_body(self):
+        page = make_page('http://a.onion/', b'<html><head></head></html>', self.page_class)
+        self.assertEqual('', page.text)
+
+    def test_collapse_spaces(self):
+        self.assertEqual('a b\nc. d', scraper.collapse_spaces(' a \n b\nc \n. d\n'))
+
+
+class LxmlTextCase(TextCase):
+    page_class = LxmlPage
+
+
+class LxmlPageCase(unittest.TestCase):
+    """LxmlPage gives the same results as Page."""
+    html = b"""<html><head><base href="http://b.onion/x/"><title> Title </title>
+<meta name="description" content="Test"><meta property="og:title" content="OG">
+<meta name="empty"></head><body><h1>Header</h1>
+<p>Text <a href="page.html">inner</a> <a href="http://c.onion/">outer</a>
+<a href="mailto:a@b.c">mail</a></p></body></html>"""
+
+    def setUp(self):
+        self.soup_page = make_page('http://a.onion/', self.html)
+        self.lxml_page = make_page('http://a.onion/', self.html, LxmlPage)
+
+    def test_as_dict(self):
+        self.assertEqual(self.soup_page.as_dict(), self.lxml_page.as_dict())
+
+    def test_base(self):
+        self.assertEqual('http://b.onion/x/', self.lxml_page.base)
+
+    def test_links(self):
+        self.assertEqual({'http://b.onion/page.html', 'http://c.onion/'},
+                         self.lxml_page.links)
+
+    def test_partition_links(self):
+        inner, outer = self.lxml_page.partition_links()
+        self.assertEqual(['http://b.onion/page.html'], inner)
+        self.assertEqual(['http://c.onion/'], outer)
+        self.assertEqual(self.soup_page.partition_links(), (inner, outer))
+
+    def test_heading_title(self):
+        page = make_page('http://a.onion/', b'<body><h2>Header</h2></body>', LxmlPage)
+        self.assertEqual('Header', page.title)
+
+    def test_page_class(self):
+        self.assertIs(LxmlPage, scraper.get_page_class('lxml'))
+        self.assertIs(scraper.Page, scraper.get_page_class('soup'))
+        with self.assertRaises(ValueError):
+            scraper.get_page_class('html5')
+
+
+class ImageHandler(web.RequestHandler):
+    def get(self):
+        self.set_header('Content-Type', 'image/jpeg')
+        self.write(b'\xff' * 1024 * 1024)
+
+
+class HugeHandler(web.RequestHandler):
+    async def get(self):
+        self.set_header('Content-Type', 'text/html')
+        for _ in range(scraper.MAX_CONTENT_SIZE // 64 + 8):
+            self.write(b' ' * 64 * 1024)
+            await self.flush()
+
+
+class SmallHandler(web.RequestHandler):
+    def get(self):
+        self.set_header('Content-Type', 'text/html; charset=utf-8')
+        self.write(b'<html><body><p>Hello</p></body></html>')
+
+
+class StreamingCase(testing.AsyncHTTPTestCase):
+    """Streamed transfers are aborted as soon as they are known to be illegal."""
+    def get_app(self):
+        return web.Application([
+            (r'/image', ImageHandler),
+            (r'/huge', HugeHandler),
+            (r'/small', SmallHandler),
+        ])
+
+    def setUp(self):
+        super(StreamingCase, self).setUp()
+        self.client = scraper.HTTPClient(streaming=True)
+        self.aborted = []
+        self.client.on_abort = lambda url, reason, saved: self.aborted.append(saved)
+
+    @testing.gen_test
+    def test_small(self):
+        res = yield self.client.visit(self.get_url('/small'))
+        self.assertEqual(b'<html><body><p>Hello</p></body></html>', res.body)
+        self.assertEqual([], self.aborted)
+
+    @testing.gen_test
+    def test_content_type(self):
+        with self.assertRaises(AssertionError):
+            yield self.client.visit(self.get_url('/image'))
+
+    @testing.gen_test
+    def test_size(self):
+        with self.assertRaises(AssertionError):
+            yield self.client.visit(self.get_url('/huge'))
+        self.assertEqual(1, len(self.aborted))
+
+
+class RecordingTuning(scraper.CurlTuning):
+    """Counts the prepared curl handles."""
+    def __init__(self, *args, **kwargs):
+        super(RecordingTuning, self).__init__(*args, **kwargs)
+        self.prepared = 0
+
+    def __call__(self, curl):
+        super(RecordingTuning, self).__call__(curl)
+        self.prepared += 1
+
+
+class CurlTuningCase(testing.AsyncHTTPTestCase):
+    """Curl options are set on every request, timing is reported."""
+    def get_app(self):
+        return web.Application([(r'/small', SmallHandler)])
+
+    @testing.gen_test
+    def test_plain(self):
+        tuning = RecordingTuning()
+        client = scraper.HTTPClient(curl_tuning=tuning)
+        for _ in range(2):
+            res = yield client.visit(self.get_url('/small'))
+        self.assertEqual(2, tuning.prepared)
+        timing = scraper.get_timing(res)
+        self.assertEqual(set(scraper.TIMING_KEYS), set(timing))
+        self.assertLessEqual(timing['connect'], timing['total'])
+
+    @testing.gen_test
+    def test_streaming(self):
+        tuning = RecordingTuning(reuse_connections=False, tcp_keepalive=False,
+                                 http2=True)
+        client = scraper.HTTPClient(streaming=True, curl_tuning=tuning)
+        res = yield client.visit(self.get_url('/small'))
+        self.assertEqual(1, tuning.prepared)
+        self.assertEqual(b'<html><body><p>Hello</p></body></html>', res.body)
+        self.assertIn('starttransfer', scraper.get_timing(res))
+
+    def test_no_timing(self):
+        self.assertEqual({}, scraper.get_timing(None))
+
+
+class StreamingFetchCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fetch = scraper.StreamingFetch(scraper.HTTPClient(streaming=True)._validate_headers,
+                                            max_size=1024)
+
+    def feed(self, *lines):
+        for line in lines:
+            self.fetch.on_header(line + '\r\n')
+
+    def test_redirect(self):
+        self.feed('HTTP/1.1 302 Found', 'Content-Type: image/png', '',
+                  'HTTP/1.1 200 OK', 'Content-Type: text/html', '')
+        self.assertIsNone(self.fetch.error)
+
+    def test_language(self):
+        self.feed('HTTP/1.1 200 OK', 'Content-Language: de', '')
+        self.assertIn('Content-Language', self.fetch.error)
+
+    def test_progress(self):
+        self.feed('HTTP/1.1 200 OK', 'Content-Length: 4096', '')
+        self.assertEqual(0, self.fetch.on_progress(4096, 512, 0, 0))
+        self.assertEqual(1, self.fetch.on_progress(4096, 2048, 0, 0))
+        self.assertEqual(2048, self.fetch.saved)
+
+
 def all():
     test_suite = unittest.TestSuite()
     test_suite.addTest(unittest.makeSuite(HTTPClientCase))
     test_suite.addTest(unittest.makeSuite(PageCase))
+    test_suite.addTest(unittest.makeSuite(TextCase))
+    test_suite.addTest(unittest.makeSuite(LxmlTextCase))
+    test_suite.addTest(unittest.makeSuite(LxmlPageCase))
+    test_suite.addTest(unittest.makeSuite(StreamingCase))
+    test_suite.addTest(unittest.makeSuite(StreamingFetchCase))
+    test_suite.addTest(unittest.makeSuite(CurlTuningCase))
     return test_suite
 
 
@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import logging
+import tempfile
+import time
+import unittest
+from tornado import gen, testing
+
+from torspider import sink
+
+
+class FakePage:
+    def __init__(self, title):
+        self.title = title
+
+    def as_dict(self):
+        return {'title': self.title}
+
+
+class FailingTarget:
+    def __init__(self):
+        self.fail = True
+        self.records = []
+
+    def write(self, records):
+        if self.fail:
+            raise IOError('Test')
+        self.records.extend(records)
+
+    def close(self):
+        pass
+
+
+class SlowTarget(FailingTarget):
+    """The first write fails after a while."""
+    def write(self, records):
+        time.sleep(0.1)
+        try:
+            super(SlowTarget, self).write(records)
+        finally:
+            self.fail = False
+
+
+def make_report(i):
+    return {'url': 'http://a.onion/%d' % i, 'page': FakePage('Page %d' % i)}
+
+
+class SinkCase(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(SinkCase, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        super(SinkCase, self).tearDown()
+
+    def read_jsonl(self, path):
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    @testing.gen_test
+    def test_flush_by_count(self):
+        path = os.path.join(self.tmp, 'reports.jsonl')
+        s = sink.BatchingSink(sink.make_target(path), batch_size=3, flush_interval=0)
+        for i in range(4):
+            yield s(make_report(i))
+        records = self.read_jsonl(path)
+        self.assertEqual(3, len(records))
+        self.assertEqual('Page 0', records[0]['title'])
+        self.assertEqual(1, len(s.buffer))
+        s.close()
+        self.assertEqual(4, len(self.read_jsonl(path)))
+
+    @testing.gen_test
+    def test_flush_by_time(self):
+        path = os.path.join(self.tmp, 'reports.jsonl')
+        s = sink.BatchingSink(sink.make_target(path), batch_size=100, flush_interval=0.05)
+        yield s(make_report(1))
+        yield gen.sleep(0.2)
+        self.assertEqual(1, len(self.read_jsonl(path)))
+        s.close()
+
+    @testing.gen_test
+    def test_sqlite(self):
+        path = os.path.join(self.tmp, 'reports.db')
+        s = sink.BatchingSink(sink.make_target(path), batch_size=2, flush_interval=0)
+        for i in range(5):
+            yield s(make_report(i))
+        yield s({'url': 'http://a.onion/error', 'error': 'HTTP 404'})
+        s.close()
+        db = sqlite3.connect(path)
+        rows = db.execute('SELECT url, report FROM reports ORDER BY id').fetchall()
+        db.close()
+        self.assertEqual(6, len(rows))
+        self.assertEqual('HTTP 404', json.loads(rows[-1][1])['error'])
+
+    @testing.gen_test
+    def test_at_least_once(self):
+        target = FailingTarget()
+        s = sink.BatchingSink(target, batch_size=2, flush_interval=0)
+        for i in range(3):
+            yield s(make_report(i))
+        self.assertEqual(3, len(s.buffer))
+        target.fail = False
+        s.close()
+        self.assertEqual(3, len(target.records))
+
+    @testing.gen_test
+    def test_interrupted_write(self):
+        target = SlowTarget()
+        s = sink.BatchingSink(target, batch_size=2, flush_interval=0)
+        yield s(make_report(0))
+        writing = gen.convert_yielded(s(make_report(1)))
+        yield gen.sleep(0.01)
+        # the sink is closed before the failure of the write is handled
+        s.close()
+        self.assertFalse(writing.done())
+        urls = {r['url'] for r in target.records}
+        self.assertEqual({'http://a.onion/0', 'http://a.onion/1'}, urls)
+
+    def test_plugin(self):
+        path = os.path.join(self.tmp, 'reports.jsonl')
+        sink.init(path=path, batch_size=10)
+        self.io_loop.run_sync(lambda: sink.consume(make_report(1)))
+        sink.done()
+        self.assertEqual(1, len(self.read_jsonl(path)))
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(SinkCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    testing.main(verbosity=3)
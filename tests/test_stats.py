@@ -0,0 +1,84 @@
+import sys
+import logging
+import unittest
+from tornado import gen, testing
+
+from torspider.stats import CrawlStats
+
+
+class FakeRedis:
+    """Counts requests instead of sending them to Redis."""
+    def __init__(self, passed=10, pending=20):
+        self.passed = passed
+        self.pending = pending
+        self.requests = 0
+
+    async def counts(self):
+        self.requests += 1
+        await gen.sleep(0.01)
+        return self.passed, self.pending
+
+
+class CrawlStatsCase(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(CrawlStatsCase, self).setUp()
+        self.redis = FakeRedis()
+        self.stats = CrawlStats(self.redis, max_age=10.0)
+
+    @testing.gen_test
+    def test_refresh(self):
+        yield self.stats.ensure_fresh()
+        self.assertEqual(10, self.stats.passed)
+        self.assertEqual(20, self.stats.pending)
+
+    @testing.gen_test
+    def test_cached(self):
+        yield self.stats.ensure_fresh()
+        self.redis.passed = 15
+        yield self.stats.ensure_fresh()
+        self.assertEqual(10, self.stats.passed)
+        self.assertEqual(1, self.redis.requests)
+
+    @testing.gen_test
+    def test_stale(self):
+        self.stats.max_age = 0
+        yield self.stats.ensure_fresh()
+        self.redis.passed = 15
+        yield gen.sleep(0.01)
+        yield self.stats.ensure_fresh()
+        self.assertEqual(15, self.stats.passed)
+
+    @testing.gen_test
+    def test_concurrent(self):
+        yield [self.stats.ensure_fresh() for _ in range(10)]
+        self.assertEqual(1, self.redis.requests)
+
+    @testing.gen_test
+    def test_add_passed(self):
+        yield self.stats.ensure_fresh()
+        self.stats.add_passed()
+        self.assertEqual(11, self.stats.passed)
+
+    @testing.gen_test
+    def test_limit(self):
+        yield self.stats.ensure_fresh()
+        self.assertTrue(self.stats.limit_reached(10))
+        self.assertFalse(self.stats.limit_reached(11))
+        self.assertFalse(self.stats.limit_reached(0))
+
+
+def all():
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(unittest.makeSuite(CrawlStatsCase))
+    return test_suite
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.DEBUG,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        format='%(asctime)s - %(levelname)-8s - %(message)s',
+        stream=sys.stderr
+    )
+    testing.main(verbosity=3)
@@ -2,40 +2,105 @@ import sys
 import logging
 from functools import partial
 import unittest
-from tornado import testing
+from tornado import gen, testing
 import redis as pyredis
-from torspider import tasks
+from torspider import tasks, scoring
+from torspider.aiotasks import AioRedisClient
 
 PENDING_Q = 'torspider:test:pending_lst'
 PENDING_S = 'torspider:test:pending_set'
 WORKING_S = 'torspider:test:working_set'
 SUCCESS_S = 'torspider:test:success_set'
 FAILURE_S = 'torspider:test:failure_set'
+SEEN_BF = 'torspider:test:seen_bloom'
+SUCCESS_N = 'torspider:test:success_cnt'
+FAILURE_N = 'torspider:test:failure_cnt'
+HOSTS_Z = 'torspider:test:hosts_zset'
+HOSTS_ACTIVE_H = 'torspider:test:hosts_active_hash'
+HOST_Q_PREFIX = 'torspider:test:host_lst:'
+PENDING_Z = 'torspider:test:pending_zset'
+LEASES_Z = 'torspider:test:leases_zset'
+NODES_S = 'torspider:test:nodes_set'
+TASK_NODES_H = 'torspider:test:task_nodes_hash'
+HEARTBEAT_PREFIX = 'torspider:test:node_heartbeat:'
+COORDINATOR_K = 'torspider:test:coordinator'
+SPILL_Q = 'torspider:test:spill_lst'
 
 
 class TaskCase(testing.AsyncTestCase):
     sync_redis = pyredis.StrictRedis()
 
+    client_class = tasks.RedisClient
+    seen_index = False
+    frontier = tasks.FIFO_FRONTIER
+    host_delay = tasks.HOST_DELAY
+    host_concurrency = tasks.HOST_CONCURRENCY
+    scorer = None
+    lease_time = tasks.LEASE_TIME
+    node_id = None
+    coordinator = False
+    node_timeout = tasks.NODE_TIMEOUT
+
     def setUp(self):
         logging.debug('setUp')
         super(TaskCase, self).setUp()
-        tasks.RedisClient.setup(
+        self.client_class.setup(
             pending_q=PENDING_Q,
             pending_s=PENDING_S,
             working_s=WORKING_S,
             success_s=SUCCESS_S,
             failure_s=FAILURE_S,
+            seen_index=self.seen_index,
+            seen_bf=SEEN_BF,
+            seen_capacity=10000,
+            success_n=SUCCESS_N,
+            failure_n=FAILURE_N,
+            frontier=self.frontier,
+            hosts_z=HOSTS_Z,
+            hosts_active_h=HOSTS_ACTIVE_H,
+            host_q_prefix=HOST_Q_PREFIX,
+            host_delay=self.host_delay,
+            host_concurrency=self.host_concurrency,
+            pending_z=PENDING_Z,
+            leases_z=LEASES_Z,
+            lease_time=self.lease_time,
+            node_id=self.node_id,
+            coordinator=self.coordinator,
+            nodes_s=NODES_S,
+            task_nodes_h=TASK_NODES_H,
+            heartbeat_prefix=HEARTBEAT_PREFIX,
+            coordinator_k=COORDINATOR_K,
+            node_timeout=self.node_timeout,
+            spill_q=SPILL_Q,
+            scorer=self.scorer,
+            poll_interval=0.01,
             io_loop=self.io_loop)
-        self.client = tasks.RedisClient()
+        self.client = self.client_class()
 
     def tearDown(self):
         logging.debug('tearDown')
+        self.io_loop.run_sync(self.client.close)
         super(TaskCase, self).tearDown()
         self.sync_redis.delete(PENDING_Q)
         self.sync_redis.delete(PENDING_S)
         self.sync_redis.delete(WORKING_S)
         self.sync_redis.delete(SUCCESS_S)
         self.sync_redis.delete(FAILURE_S)
+        self.sync_redis.delete(SEEN_BF)
+        self.sync_redis.delete(SUCCESS_N)
+        self.sync_redis.delete(FAILURE_N)
+        self.sync_redis.delete(HOSTS_Z)
+        self.sync_redis.delete(HOSTS_ACTIVE_H)
+        self.sync_redis.delete(PENDING_Z)
+        self.sync_redis.delete(LEASES_Z)
+        self.sync_redis.delete(NODES_S)
+        self.sync_redis.delete(TASK_NODES_H)
+        self.sync_redis.delete(COORDINATOR_K)
+        self.sync_redis.delete(SPILL_Q)
+        for k in self.sync_redis.keys(HEARTBEAT_PREFIX + '*'):
+            self.sync_redis.delete(k)
+        for k in self.sync_redis.keys(HOST_Q_PREFIX + '*'):
+            self.sync_redis.delete(k)
 
 
 class PutTaskCase(TaskCase):
@@ -181,6 +246,19 @@ class PendingCountCase(TaskCase):
 
 
 
+class CountsCase(TaskCase):
+    def setUp(self):
+        self.sync_redis.sadd(SUCCESS_S, 'http://example.com/a/1')
+        self.sync_redis.sadd(FAILURE_S, 'http://example.com/b/2')
+        super(CountsCase, self).setUp()
+        self.io_loop.run_sync(partial(self.client.put_task, 'http://tornadoweb.org/'))
+
+    @testing.gen_test
+    def test_counts(self):
+        passed, pending = yield self.client.counts()
+        self.assertEqual(2, passed)
+        self.assertEqual(1, pending)
+
 class KnownTaskCase(TaskCase):
     """Make sure the a registered task is 'known' in any state."""
     def setUp(self):
@@ -229,6 +307,505 @@ class UnknownTaskCase(TaskCase):
         self.assertFalse(b)
 
 
+class PutNewTasksCase(TaskCase):
+    """Make sure only unknown tasks are registered."""
+    def setUp(self):
+        super(PutNewTasksCase, self).setUp()
+        self.task = 'http://tornadoweb.org/'
+        self.io_loop.run_sync(partial(self.client.put_task, self.task))
+
+    @testing.gen_test
+    def test_known(self):
+        b = yield self.client.put_new_task(self.task)
+        self.assertFalse(b)
+        self.assertEqual(1, self.sync_redis.llen(PENDING_Q))
+
+    @testing.gen_test
+    def test_unknown(self):
+        b = yield self.client.put_new_task('http://tornadoweb.org/foo')
+        self.assertTrue(b)
+        self.assertEqual(2, self.sync_redis.llen(PENDING_Q))
+
+    @testing.gen_test
+    def test_batch(self):
+        added = yield self.client.put_new_tasks([
+            self.task,
+            'http://tornadoweb.org/foo',
+            'http://tornadoweb.org/bar',
+            'http://tornadoweb.org/foo',
+        ])
+        self.assertEqual(['http://tornadoweb.org/foo', 'http://tornadoweb.org/bar'], added)
+        self.assertEqual(3, self.sync_redis.scard(PENDING_S))
+
+    @testing.gen_test
+    def test_finished(self):
+        yield self.client.get_task()
+        yield self.client.register_success(self.task)
+        added = yield self.client.put_new_tasks([self.task])
+        self.assertEqual([], added)
+
+
+class PutTasksCase(TaskCase):
+    """Bulk registration of tasks."""
+    def setUp(self):
+        super(PutTasksCase, self).setUp()
+        self.task = 'http://tornadoweb.org/'
+        self.io_loop.run_sync(partial(self.client.put_task, self.task))
+
+    @testing.gen_test
+    def test_count(self):
+        count = yield self.client.put_tasks([
+            self.task,
+            'http://tornadoweb.org/foo',
+            'http://tornadoweb.org/foo',
+        ])
+        self.assertEqual(1, count)
+        self.assertEqual(2, self.sync_redis.llen(PENDING_Q))
+
+    @testing.gen_test
+    def test_empty(self):
+        count = yield self.client.put_tasks([])
+        self.assertEqual(0, count)
+
+    @testing.gen_test
+    def test_large(self):
+        links = ['http://tornadoweb.org/%d' % i for i in range(2500)]
+        count = yield self.client.put_tasks(links)
+        self.assertEqual(2500, count)
+        self.assertEqual(2501, self.sync_redis.scard(PENDING_S))
+
+
+class SeenIndexCase(TaskCase):
+    """Deduplication by Bloom filter."""
+    seen_index = True
+
+    def setUp(self):
+        super(SeenIndexCase, self).setUp()
+        self.task = 'http://tornadoweb.org/'
+        self.io_loop.run_sync(partial(self.client.put_new_tasks, [self.task]))
+
+    @testing.gen_test
+    def test_known(self):
+        b = yield self.client.is_known_task(self.task)
+        self.assertTrue(b)
+
+    @testing.gen_test
+    def test_unknown(self):
+        b = yield self.client.is_known_task('http://tornadoweb.org/foo')
+        self.assertFalse(b)
+
+    @testing.gen_test
+    def test_put(self):
+        added = yield self.client.put_new_tasks([
+            self.task,
+            'http://tornadoweb.org/foo',
+            'http://tornadoweb.org/foo',
+        ])
+        self.assertEqual(['http://tornadoweb.org/foo'], added)
+        self.assertEqual(2, self.sync_redis.llen(PENDING_Q))
+
+    @testing.gen_test
+    def test_finished(self):
+        task = yield self.client.get_task()
+        yield self.client.register_success(task)
+        added = yield self.client.put_new_tasks([self.task])
+        self.assertEqual([], added)
+        self.assertFalse(self.sync_redis.exists(SUCCESS_S))
+
+    @testing.gen_test
+    def test_passed_count(self):
+        task = yield self.client.get_task()
+        yield self.client.register_failure(task)
+        count = yield self.client.passed_count()
+        self.assertEqual(1, count)
+
+    @testing.gen_test
+    def test_memory_usage(self):
+        res = yield self.client.memory_usage()
+        self.assertGreaterEqual(res[SEEN_BF], self.client.seen.size)
+
+
+class ConnectionPoolCase(TaskCase):
+    """Make sure connections are reused."""
+    def setUp(self):
+        super(ConnectionPoolCase, self).setUp()
+        self.task = 'http://tornadoweb.org/'
+
+    @testing.gen_test
+    def test_reuse(self):
+        yield self.client.put_task(self.task)
+        yield self.client.pending_count()
+        yield self.client.is_known_task(self.task)
+        stats = self.client.pool_stats()
+        self.assertEqual(1, stats['created'])
+        self.assertEqual(1, stats['in_use'])
+
+    @testing.gen_test
+    def test_blocking(self):
+        yield self.client.put_task(self.task)
+        yield self.client.get_task()
+        stats = self.client.pool_stats()
+        self.assertEqual(2, stats['created'])
+
+    @testing.gen_test
+    def test_close(self):
+        yield self.client.ping()
+        yield self.client.close()
+        stats = self.client.pool_stats()
+        self.assertEqual(0, stats['in_use'])
+        self.assertEqual(1, stats['available'])
+
+
+class HostFrontierCase(TaskCase):
+    """Politeness limits of the host frontier."""
+    frontier = tasks.HOST_FRONTIER
+    host_delay = 10.0
+    host_concurrency = 2
+
+    def setUp(self):
+        super(HostFrontierCase, self).setUp()
+        self.io_loop.run_sync(partial(self.client.put_new_tasks, [
+            'http://a.onion/1',
+            'http://a.onion/2',
+            'http://a.onion/3',
+            'http://b.onion/1',
+        ]))
+
+    @testing.gen_test
+    def test_host_queues(self):
+        self.assertEqual(3, self.sync_redis.llen(HOST_Q_PREFIX + 'a.onion'))
+        self.assertEqual(1, self.sync_redis.llen(HOST_Q_PREFIX + 'b.onion'))
+        self.assertEqual(0, self.sync_redis.llen(PENDING_Q))
+
+    @testing.gen_test
+    def test_round_robin(self):
+        first = yield self.client.get_task()
+        second = yield self.client.get_task()
+        self.assertEqual('http://a.onion/1', first)
+        self.assertEqual('http://b.onion/1', second)
+        self.assertTrue(self.sync_redis.sismember(WORKING_S, first))
+
+    @testing.gen_test
+    def test_delay(self):
+        yield self.client.get_task()
+        yield self.client.get_task()
+        task = yield self.client._pop_host_task()
+        self.assertIsNone(task)
+
+    @testing.gen_test
+    def test_concurrency(self):
+        self.client.host_delay = 0
+        yield self.client.get_task()
+        yield self.client.get_task()
+        yield self.client.get_task()
+        task = yield self.client._pop_host_task()
+        self.assertIsNone(task)
+
+    @testing.gen_test
+    def test_release(self):
+        self.client.host_delay = 0
+        for _ in range(3):
+            yield self.client.get_task()
+        yield self.client.register_success('http://a.onion/1')
+        task = yield self.client._pop_host_task()
+        self.assertEqual('http://a.onion/3', task)
+
+    @testing.gen_test
+    def test_clear(self):
+        yield self.client.clear_all()
+        self.assertFalse(self.sync_redis.exists(HOSTS_Z))
+        self.assertFalse(self.sync_redis.exists(HOST_Q_PREFIX + 'a.onion'))
+
+
+class PriorityFrontierCase(TaskCase):
+    """Tasks with lower score go first."""
+    frontier = tasks.PRIORITY_FRONTIER
+    scorer = staticmethod(scoring.path_depth)
+
+    def setUp(self):
+        super(PriorityFrontierCase, self).setUp()
+        self.io_loop.run_sync(partial(self.client.put_new_tasks, [
+            'http://a.onion/1/2/3',
+            'http://a.onion/1',
+            'http://a.onion/1/2',
+        ]))
+
+    @testing.gen_test
+    def test_order(self):
+        first = yield self.client.get_task()
+        second = yield self.client.get_task()
+        self.assertEqual('http://a.onion/1', first)
+        self.assertEqual('http://a.onion/1/2', second)
+        self.assertTrue(self.sync_redis.sismember(WORKING_S, first))
+        self.assertFalse(self.sync_redis.sismember(PENDING_S, first))
+
+    @testing.gen_test
+    def test_fanin(self):
+        for source in ('http://b.onion/', 'http://c.onion/', 'http://d.onion/'):
+            yield self.client.put_new_tasks(['http://a.onion/1/2/3'], source=source)
+        first = yield self.client.get_task()
+        self.assertEqual('http://a.onion/1/2/3', first)
+
+    @testing.gen_test
+    def test_empty(self):
+        for _ in range(3):
+            yield self.client.get_task()
+        task = yield self.client._pop_priority_task()
+        self.assertIsNone(task)
+
+
+class LeaseCase(TaskCase):
+    """Unfinished tasks are requeued after their leases expire."""
+    lease_time = 0.05
+
+    def setUp(self):
+        super(LeaseCase, self).setUp()
+        self.io_loop.run_sync(partial(self.client.put_new_task, 'http://a.onion/'))
+
+    @testing.gen_test
+    def test_lease(self):
+        task = yield self.client.get_task()
+        self.assertIsNotNone(self.sync_redis.zscore(LEASES_Z, task))
+
+    @testing.gen_test
+    def test_requeue_expired(self):
+        task = yield self.client.get_task()
+        requeued = yield self.client.requeue_expired()
+        self.assertEqual([], requeued)
+        yield gen.sleep(self.lease_time * 2)
+        requeued = yield self.client.requeue_expired()
+        self.assertEqual([task], requeued)
+        self.assertFalse(self.sync_redis.sismember(WORKING_S, task))
+        self.assertTrue(self.sync_redis.sismember(PENDING_S, task))
+        again = yield self.client.get_task()
+        self.assertEqual(task, again)
+
+    @testing.gen_test
+    def test_finished(self):
+        task = yield self.client.get_task()
+        yield self.client.register_success(task)
+        self.assertIsNone(self.sync_redis.zscore(LEASES_Z, task))
+        yield gen.sleep(self.lease_time * 2)
+        requeued = yield self.client.requeue_expired()
+        self.assertEqual([], requeued)
+
+    @testing.gen_test
+    def test_recover(self):
+        task = yield self.client.get_task()
+        self.sync_redis.delete(LEASES_Z)
+        requeued = yield self.client.recover()
+        self.assertEqual([task], requeued)
+        self.assertTrue(self.sync_redis.sismember(PENDING_S, task))
+
+    @testing.gen_test
+    def test_recover_force(self):
+        task = yield self.client.get_task()
+        requeued = yield self.client.recover()
+        self.assertEqual([], requeued)
+        requeued = yield self.client.recover(force=True)
+        self.assertEqual([task], requeued)
+
+    @testing.gen_test
+    def test_register_after_requeue(self):
+        task = yield self.client.get_task()
+        yield gen.sleep(self.lease_time * 2)
+        yield self.client.requeue_expired()
+        res = yield self.client.register_success(task)
+        self.assertEqual((0, 0), res)
+        self.assertTrue(self.sync_redis.sismember(PENDING_S, task))
+        self.assertFalse(self.sync_redis.sismember(SUCCESS_S, task))
+        passed = yield self.client.passed_count()
+        self.assertEqual(0, passed)
+
+    @testing.gen_test
+    def test_register_after_retake(self):
+        task = yield self.client.get_task()
+        yield gen.sleep(self.lease_time * 2)
+        yield self.client.requeue_expired()
+        other = self.client_class()
+        try:
+            again = yield other.get_task()
+            self.assertEqual(task, again)
+            res = yield self.client.register_failure(task)
+            self.assertEqual((0, 0), res)
+            # the lease of the other worker is intact
+            self.assertTrue(self.sync_redis.sismember(WORKING_S, task))
+            self.assertIsNotNone(self.sync_redis.zscore(LEASES_Z, task))
+            res = yield other.register_success(task)
+            self.assertEqual((1, 1), res)
+        finally:
+            yield other.close()
+        self.assertTrue(self.sync_redis.sismember(SUCCESS_S, task))
+        self.assertFalse(self.sync_redis.sismember(FAILURE_S, task))
+
+
+class HostLeaseCase(LeaseCase):
+    frontier = tasks.HOST_FRONTIER
+    host_delay = 0
+
+
+class PriorityLeaseCase(LeaseCase):
+    frontier = tasks.PRIORITY_FRONTIER
+
+
+class ClusterCase(TaskCase):
+    """Working tasks are tagged with the node, tasks of dead nodes
+    are requeued."""
+    node_id = 'node-a'
+    coordinator = True
+    node_timeout = 0.05
+
+    def setUp(self):
+        super(ClusterCase, self).setUp()
+        self.io_loop.run_sync(partial(self.client.put_new_task, 'http://a.onion/'))
+
+    @testing.gen_test
+    def test_tagged(self):
+        task = yield self.client.get_task()
+        self.assertEqual(b'node-a', self.sync_redis.hget(TASK_NODES_H, task))
+        yield self.client.register_success(task)
+        self.assertIsNone(self.sync_redis.hget(TASK_NODES_H, task))
+
+    @testing.gen_test
+    def test_heartbeat(self):
+        coordinator = yield self.client.heartbeat()
+        self.assertEqual('node-a', coordinator)
+        self.assertTrue(self.sync_redis.sismember(NODES_S, 'node-a'))
+        self.assertTrue(self.sync_redis.exists(HEARTBEAT_PREFIX + 'node-a'))
+        yield self.client.unregister_node()
+        self.assertFalse(self.sync_redis.sismember(NODES_S, 'node-a'))
+        self.assertFalse(self.sync_redis.exists(COORDINATOR_K))
+
+    @testing.gen_test
+    def test_coordinator_taken(self):
+        self.sync_redis.set(COORDINATOR_K, 'node-b', px=1000)
+        coordinator = yield self.client.heartbeat()
+        self.assertEqual('node-b', coordinator)
+
+    @testing.gen_test
+    def test_live_node(self):
+        yield self.client.heartbeat()
+        yield self.client.get_task()
+        requeued = yield self.client.requeue_dead_nodes()
+        self.assertEqual([], requeued)
+
+    @testing.gen_test
+    def test_dead_node(self):
+        yield self.client.heartbeat()
+        task = yield self.client.get_task()
+        yield gen.sleep(self.node_timeout * 2)
+        requeued = yield self.client.requeue_dead_nodes()
+        self.assertEqual([task], requeued)
+        self.assertTrue(self.sync_redis.sismember(PENDING_S, task))
+        self.assertFalse(self.sync_redis.sismember(NODES_S, 'node-a'))
+        self.assertIsNone(self.sync_redis.hget(TASK_NODES_H, task))
+
+    @testing.gen_test
+    def test_retaken(self):
+        # a task of a dead node, already held by another node, stays with it
+        yield self.client.heartbeat()
+        task = yield self.client.get_task()
+        yield gen.sleep(self.node_timeout * 2)
+        self.sync_redis.hset(TASK_NODES_H, task, 'node-b')
+        requeued = yield self.client.requeue(
+            [task], force=True, owners={task: 'node-a'})
+        self.assertEqual([], requeued)
+        self.assertTrue(self.sync_redis.sismember(WORKING_S, task))
+
+
+class SpillCase(TaskCase):
+    """Deferred tasks are kept in the spill queue."""
+
+    @testing.gen_test
+    def test_unspill(self):
+        yield self.client.spill(['http://a.onion/1', 'http://a.onion/2'], 'http://a.onion/')
+        yield self.client.spill(['http://b.onion/'])
+        self.assertEqual(2, self.sync_redis.llen(SPILL_Q))
+        entries = yield self.client.unspill(10)
+        self.assertEqual([
+            (['http://a.onion/1', 'http://a.onion/2'], 'http://a.onion/'),
+            (['http://b.onion/'], None),
+        ], entries)
+        self.assertEqual(0, self.sync_redis.llen(SPILL_Q))
+
+    @testing.gen_test
+    def test_oldest_first(self):
+        for i in range(3):
+            yield self.client.spill(['http://a.onion/%d' % i])
+        entries = yield self.client.unspill(2)
+        self.assertEqual([(['http://a.onion/0'], None), (['http://a.onion/1'], None)], entries)
+        entries = yield self.client.unspill(2)
+        self.assertEqual([(['http://a.onion/2'], None)], entries)
+        entries = yield self.client.unspill(2)
+        self.assertEqual([], entries)
+
+    @testing.gen_test
+    def test_clear(self):
+        yield self.client.spill(['http://a.onion/'])
+        yield self.client.clear_all()
+        self.assertEqual(0, self.sync_redis.llen(SPILL_Q))
+
+
+class HostClusterCase(ClusterCase):
+    frontier = tasks.HOST_FRONTIER
+    host_delay = 0
+
+
+class PriorityClusterCase(ClusterCase):
+    frontier = tasks.PRIORITY_FRONTIER
+
+
+# The same cases with asyncio backend
+class AioGetTaskCase(GetTaskCase):
+    client_class = AioRedisClient
+
+
+class AioRegisterSuccessCase(RegisterSuccessCase):
+    client_class = AioRedisClient
+
+
+class AioRegisterFailureCase(RegisterFailureCase):
+    client_class = AioRedisClient
+
+
+class AioPassedCountCase(PassedCountCase):
+    client_class = AioRedisClient
+
+
+class AioKnownTaskCase(KnownTaskCase):
+    client_class = AioRedisClient
+
+
+class AioPutTasksCase(PutTasksCase):
+    client_class = AioRedisClient
+
+
+class AioSeenIndexCase(SeenIndexCase):
+    client_class = AioRedisClient
+
+
+
+class AioHostFrontierCase(HostFrontierCase):
+    client_class = AioRedisClient
+
+
+
+class AioPriorityFrontierCase(PriorityFrontierCase):
+    client_class = AioRedisClient
+
+
+class AioLeaseCase(LeaseCase):
+    client_class = AioRedisClient
+
+
+class AioClusterCase(ClusterCase):
+    client_class = AioRedisClient
+
+
+class AioSpillCase(SpillCase):
+    client_class = AioRedisClient
+
+
 def all():
     test_suite = unittest.TestSuite()
     test_suite.addTest(unittest.makeSuite(PutTaskCase))
@@ -237,8 +814,34 @@ def all():
     test_suite.addTest(unittest.makeSuite(RegisterFailureCase))
     test_suite.addTest(unittest.makeSuite(PassedCountCase))
     test_suite.addTest(unittest.makeSuite(PendingCountCase))
+    test_suite.addTest(unittest.makeSuite(CountsCase))
     test_suite.addTest(unittest.makeSuite(KnownTaskCase))
     test_suite.addTest(unittest.makeSuite(UnknownTaskCase))
+    test_suite.addTest(unittest.makeSuite(PutNewTasksCase))
+    test_suite.addTest(unittest.makeSuite(PutTasksCase))
+    test_suite.addTest(unittest.makeSuite(SeenIndexCase))
+    test_suite.addTest(unittest.makeSuite(ConnectionPoolCase))
+    test_suite.addTest(unittest.makeSuite(AioGetTaskCase))
+    test_suite.addTest(unittest.makeSuite(AioRegisterSuccessCase))
+    test_suite.addTest(unittest.makeSuite(AioRegisterFailureCase))
+    test_suite.addTest(unittest.makeSuite(AioPassedCountCase))
+    test_suite.addTest(unittest.makeSuite(AioKnownTaskCase))
+    test_suite.addTest(unittest.makeSuite(AioPutTasksCase))
+    test_suite.addTest(unittest.makeSuite(AioSeenIndexCase))
+    test_suite.addTest(unittest.makeSuite(HostFrontierCase))
+    test_suite.addTest(unittest.makeSuite(AioHostFrontierCase))
+    test_suite.addTest(unittest.makeSuite(PriorityFrontierCase))
+    test_suite.addTest(unittest.makeSuite(AioPriorityFrontierCase))
+    test_suite.addTest(unittest.makeSuite(LeaseCase))
+    test_suite.addTest(unittest.makeSuite(HostLeaseCase))
+    test_suite.addTest(unittest.makeSuite(PriorityLeaseCase))
+    test_suite.addTest(unittest.makeSuite(AioLeaseCase))
+    test_suite.addTest(unittest.makeSuite(ClusterCase))
+    test_suite.addTest(unittest.makeSuite(HostClusterCase))
+    test_suite.addTest(unittest.makeSuite(PriorityClusterCase))
+    test_suite.addTest(unittest.makeSuite(AioClusterCase))
+    test_suite.addTest(unittest.makeSuite(SpillCase))
+    test_suite.addTest(unittest.makeSuite(AioSpillCase))
     return test_suite
 
 
@@ -26,6 +26,22 @@ class UrlNormTestCase(unittest.TestCase):
         res = urlnorm.norm('http://httpbin.org/encoding//./utf8')
         self.assertEqual( ('http', 'httpbin.org', '/encoding/utf8', '', '', ''), res)
 
+    def test_collapse_dots(self):
+        res = urlnorm.norm('http://httpbin.org/a/./b/../c/')
+        self.assertEqual( ('http', 'httpbin.org', '/a/c/', '', '', ''), res)
+
+    def test_collapse_path(self):
+        self.assertEqual('/a/', urlnorm.collapse_path('/a/b/..'))
+        self.assertEqual('/a/b/', urlnorm.collapse_path('/a/b/.'))
+        self.assertEqual('/', urlnorm.collapse_path('/..'))
+        self.assertEqual('/a', urlnorm.collapse_path('/../../a'))
+        self.assertEqual('/a/...', urlnorm.collapse_path('/a//...'))
+        self.assertEqual('/a', urlnorm.collapse_path('./a'))
+
+    def test_cached(self):
+        res = urlnorm.norm('/page.html', 'httpbin.org')
+        self.assertIs(res, urlnorm.norm('/page.html', 'httpbin.org'))
+
     def test_remove_fragments(self):
         res = urlnorm.norm('http://httpbin.org/encoding/utf8#frag')
         self.assertEqual( ('http', 'httpbin.org', '/encoding/utf8', '', '', ''), res)
@@ -47,6 +63,27 @@ class UrlNormTestCase(unittest.TestCase):
         self.assertEqual('http://httpbin.org/encoding/utf8', res)
 
 
+class NormManyCase(unittest.TestCase):
+    """Test urlnorm.norm_many function."""
+
+    def test_norm_many(self):
+        res = urlnorm.norm_many(['/a', 'http://B.org/b#x', '/a'], 'http://httpbin.org/page')
+        self.assertEqual([
+            ('http://httpbin.org/a', 'httpbin.org'),
+            ('http://b.org/b', 'b.org'),
+            ('http://httpbin.org/a', 'httpbin.org'),
+        ], res)
+
+    def test_schemes(self):
+        res = urlnorm.norm_many(['mailto:a@b.org', 'https://b.org/'], 'http://httpbin.org/',
+                                schemes=('http', 'https'))
+        self.assertEqual([('https://b.org/', 'b.org')], res)
+
+    def test_skip_errors(self):
+        res = urlnorm.norm_many(['/a', 'http://[broken/'], '')
+        self.assertEqual([], res)
+
+
 class DomainExtractCase(unittest.TestCase):
     """Test misc utilities from urlnorm module."""
 
@@ -74,6 +111,7 @@ class DomainExtractCase(unittest.TestCase):
 def all():
     test_suite = unittest.TestSuite()
     test_suite.addTest(unittest.makeSuite(UrlNormTestCase))
+    test_suite.addTest(unittest.makeSuite(NormManyCase))
     test_suite.addTest(unittest.makeSuite(DomainExtractCase))
     return test_suite
 
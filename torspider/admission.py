@@ -0,0 +1,144 @@
+'''
+Admission control: links found on pages enter the frontier only while it
+is below the high-water mark, at most at the given rate. Other links are
+deferred to the spill queue and admitted later, when the frontier shrinks.
+'''
+import logging
+import time
+from tornado.ioloop import PeriodicCallback
+
+HIGH_WATER = 100000 # pending tasks
+DRAIN_INTERVAL = 1.0 # seconds
+DRAIN_PAGES = 100 # spilled pages admitted per drain
+
+
+class TokenBucket:
+    """Admission rate limit: `rate` tokens per second, at most `burst`
+    accumulated. Taking tokens is allowed while the bucket is not empty,
+    the balance may become negative. Rate 0 means no limit.
+    """
+    def __init__(self, rate=0, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def available(self):
+        if not self.rate:
+            return True
+        self._refill()
+        return self.tokens > 0
+
+    def take(self, count):
+        """Take count tokens. Return False if the bucket is empty."""
+        if not self.available:
+            return False
+        if self.rate:
+            self.tokens -= count
+        return True
+
+
+class AdmissionController:
+    """Decides whether links of a page are registered as tasks at once or
+    deferred. Deferred links are kept in the spill queue in Redis, shared by
+    all crawlers, and registered by `drain` as soon as the frontier falls
+    below the low-water mark.
+
+    The pending tasks count is taken from the shared stats, so admission
+    costs no extra Redis requests.
+
+    Arguments:
+        redis : tasks.RedisClient instance, used for draining
+        stats : stats.CrawlStats instance
+        high_water : pending tasks count, starting from which links are
+                     deferred; 0 -- no limit
+        low_water : pending tasks count, below which deferred links are
+                    admitted; half of high_water by default
+        rate, burst : token bucket of this process, links per second
+        interval : drain interval, seconds
+    """
+    def __init__(self, redis, stats, high_water=HIGH_WATER, low_water=None,
+                 rate=0, burst=None, interval=DRAIN_INTERVAL):
+        self.redis = redis
+        self.stats = stats
+        self.high_water = high_water
+        self.low_water = low_water if low_water is not None else high_water // 2
+        self.bucket = TokenBucket(rate, burst)
+        self.interval = interval
+        self.admitted = 0 # new tasks
+        self.spilled = 0 # links
+        self.unspilled = 0 # links
+        self._timer = None
+
+    @property
+    def full(self):
+        return self.high_water > 0 and self.stats.pending >= self.high_water
+
+    async def admit(self, redis, tasks, source=None):
+        """Register the normalized tasks found on the source page, or defer
+        them. Return count of the new tasks, None if the tasks are deferred.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return 0
+        if self.full or not self.bucket.take(len(tasks)):
+            await redis.spill(tasks, source)
+            self.spilled += len(tasks)
+            return None
+        return await self._register(redis, tasks, source)
+
+    async def _register(self, redis, tasks, source):
+        count = await redis.put_tasks(tasks, source=source)
+        self.stats.add_pending(count)
+        self.admitted += count
+        return count
+
+    async def drain(self, pages=DRAIN_PAGES):
+        """Admit deferred tasks while the frontier is below the low-water
+        mark. Return count of the new tasks.
+        """
+        await self.stats.ensure_fresh()
+        count = 0
+        while pages > 0 and self.bucket.available and \
+                (self.high_water == 0 or self.stats.pending < self.low_water):
+            entries = await self.redis.unspill(min(pages, 10))
+            if not entries:
+                break
+            pages -= len(entries)
+            for i, (tasks, source) in enumerate(entries):
+                try:
+                    count += await self._register(self.redis, tasks, source)
+                except self.redis.connection_errors:
+                    # put back the popped entries, which are not registered
+                    for tasks, source in entries[i:]:
+                        await self.redis.spill(tasks, source)
+                    raise
+                self.bucket.take(len(tasks))
+                self.unspilled += len(tasks)
+        if count:
+            logging.info('Admitted %d deferred tasks.', count)
+        return count
+
+    async def _on_timer(self):
+        try:
+            await self.drain()
+        except self.redis.connection_errors as ex:
+            logging.error('Draining deferred tasks failed: %s', ex)
+
+    def start(self):
+        if self._timer is None:
+            self._timer = PeriodicCallback(self._on_timer, self.interval * 1000)
+            self._timer.start()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        logging.info('Admission: %d new tasks, %d links deferred, %d readmitted.',
+                     self.admitted, self.spilled, self.unspilled)
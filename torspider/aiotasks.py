@@ -0,0 +1,204 @@
+'''
+RedisClient backend based on redis.asyncio client.
+'''
+import json
+import logging
+import time
+from redis import asyncio as aioredis
+from redis.exceptions import ConnectionError, NoScriptError
+
+from .tasks import RedisClient, with_redis_pool, script_sha
+
+
+class AioRedisClient(RedisClient):
+    """RedisClient with the same public methods and data structures,
+    using native asyncio Redis client instead of tornadoredis.
+    """
+    connection_errors = (ConnectionError,)
+
+    @classmethod
+    def _make_pool(cls, max_connections, **conn_args):
+        conn_args.pop('io_loop', None) # tornadoredis specific
+        return aioredis.BlockingConnectionPool(max_connections=max_connections,
+                                               timeout=None,
+                                               decode_responses=True,
+                                               **conn_args)
+
+    @classmethod
+    def pool_stats(cls):
+        """Connection pool statistics, see RedisClient.pool_stats."""
+        pool = cls.pool
+        in_use = len(pool._in_use_connections)
+        available = len(pool._available_connections)
+        waiters = getattr(pool._condition, '_waiters', None) or ()
+        return {
+            'max': pool.max_connections,
+            'created': in_use + available,
+            'in_use': in_use,
+            'available': available,
+            'waiting': len(waiters),
+        }
+
+    @property
+    def redis_client(self):
+        """Long-lived client for regular commands."""
+        if self._redis_client is None:
+            self._redis_client = aioredis.Redis(connection_pool=self.pool,
+                                                single_connection_client=True)
+        return self._redis_client
+
+    @property
+    def blocking_client(self):
+        """Long-lived client for blocking commands."""
+        if self._blocking_client is None:
+            self._blocking_client = aioredis.Redis(connection_pool=self.pool,
+                                                   single_connection_client=True)
+        return self._blocking_client
+
+    async def _release(self, client):
+        try:
+            await client.aclose()
+        except Exception as ex:
+            logging.warning('Error releasing Redis connection: %s', ex)
+
+    @with_redis_pool
+    async def ping(self, client=None):
+        """Health check. Return True if the server responds."""
+        return await client.ping()
+
+    @with_redis_pool
+    async def _move_task(self, task, from_set=None, to_set=None, deadline=None, client=None):
+        pipe = client.pipeline(transaction=False)
+        pipe.srem(from_set, task)
+        pipe.sadd(to_set, task)
+        if deadline:
+            pipe.zadd(self.leases_z, {task: deadline})
+            if self.node_id:
+                pipe.hset(self.task_nodes_h, task, self.node_id)
+        else:
+            pipe.zrem(self.leases_z, task)
+            if self.node_id:
+                pipe.hdel(self.task_nodes_h, task)
+        rem_res, add_res = (await pipe.execute())[:2]
+        if rem_res != 1:
+            logging.error('Task %s not found in %s set', task, from_set)
+        if add_res != 1:
+            logging.error('Task %s not found in %s set', task, to_set)
+        return rem_res, add_res
+
+    @with_redis_pool
+    async def _is_seen(self, task, client=None):
+        pipe = client.pipeline(transaction=False)
+        for offset in self.seen.offsets(task):
+            pipe.getbit(self.seen_bf, offset)
+        res = await pipe.execute()
+        return all(res)
+
+    @with_redis_pool
+    async def _is_member(self, task, set_name=None, client=None):
+        return await client.sismember(set_name, task)
+
+    async def _eval_script(self, script, keys, args, client=None):
+        sha = script_sha(script)
+        try:
+            return await client.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            logging.debug('Loading script %s...', sha)
+            return await client.eval(script, len(keys), *keys, *args)
+
+    @with_redis_pool
+    async def put_task(self, task, client=None):
+        """Register pending task."""
+        logging.debug('Registering <%s> as penging...', task)
+        pipe = client.pipeline(transaction=False)
+        pipe.sadd(self.pending_s, task)
+        pipe.lpush(self.pending_q, task)
+        return await pipe.execute()
+
+    @with_redis_pool
+    async def spill(self, tasks, source=None, client=None):
+        """Save the tasks to the spill queue."""
+        return await client.lpush(self.spill_q, json.dumps([source, list(tasks)]))
+
+    @with_redis_pool
+    async def pending_count(self, client=None):
+        """Pending tasks count."""
+        return await client.scard(self.pending_s)
+
+    async def _pop_queued_task(self):
+        try:
+            _, task = await self.blocking_client.brpop(self.pending_q)
+        except self.connection_errors:
+            await self._release(self._blocking_client)
+            self._blocking_client = None
+            raise
+        deadline = time.time() + self.lease_time
+        await self._move_task(task, self.pending_s, self.working_s, deadline=deadline)
+        self.leases[task] = deadline
+        return task
+
+    @with_redis_pool
+    async def expired_tasks(self, client=None):
+        """List of the tasks with expired leases."""
+        return await client.zrangebyscore(self.leases_z, '-inf', time.time())
+
+    @with_redis_pool
+    async def working_tasks(self, client=None):
+        """List of the tasks in WORKING set."""
+        return list(await client.smembers(self.working_s))
+
+    @with_redis_pool
+    async def passed_count(self, client=None):
+        """Return sum of items in SUCCESS and FAILURE set."""
+        pipe = client.pipeline(transaction=False)
+        if self.seen is None:
+            pipe.scard(self.success_s)
+            pipe.scard(self.failure_s)
+        else:
+            pipe.get(self.success_n)
+            pipe.get(self.failure_n)
+        res = await pipe.execute()
+        return sum(int(x or 0) for x in res)
+
+    @with_redis_pool
+    async def counts(self, client=None):
+        """Return tuple of passed and pending tasks counts."""
+        pipe = client.pipeline(transaction=False)
+        if self.seen is None:
+            pipe.scard(self.success_s)
+            pipe.scard(self.failure_s)
+        else:
+            pipe.get(self.success_n)
+            pipe.get(self.failure_n)
+        pipe.scard(self.pending_s)
+        success, failure, pending = await pipe.execute()
+        return int(success or 0) + int(failure or 0), pending
+
+    @with_redis_pool
+    async def clear_all(self, client=None):
+        """Clear all data structures."""
+        await self._clear_hosts(client=client)
+        return await client.delete(self.pending_q,
+                                   self.pending_z,
+                                   self.leases_z,
+                                   self.task_nodes_h,
+                                   self.spill_q,
+                                   self.pending_s,
+                                   self.working_s,
+                                   self.success_s,
+                                   self.failure_s,
+                                   self.seen_bf,
+                                   self.success_n,
+                                   self.failure_n)
+
+    @with_redis_pool
+    async def memory_usage(self, client=None):
+        """Return dictionary of memory, used by each data structure, in bytes."""
+        keys = (self.pending_q, self.pending_s, self.working_s,
+                self.success_s, self.failure_s, self.seen_bf, self.hosts_z,
+                self.pending_z, self.leases_z, self.task_nodes_h, self.spill_q)
+        pipe = client.pipeline(transaction=False)
+        for k in keys:
+            pipe.memory_usage(k, samples=0)
+        res = await pipe.execute()
+        return {k: v or 0 for k, v in zip(keys, res)}
@@ -0,0 +1,285 @@
+'''
+Pages archive: raw responses saved in WARC-like records, so that pages can
+be parsed again without crawling.
+
+Every record is compressed separately and appended to the current segment
+file; when the segment grows over segment_size, a new one is started.
+Segment names contain the process ID, so that several crawler processes
+(--processes option) may write to the same archive.
+index.tsv file of the archive directory lists the records:
+
+    task URL <TAB> segment file name <TAB> offset <TAB> compressed length
+
+Built-in plugin, enable it in plugins.json:
+
+    "archive": {
+        "enabled": true,
+        "config": {"directory": "archive", "compression": "gzip"}
+    }
+
+zstd compression requires zstandard package.
+'''
+import io
+import os
+import gzip
+import logging
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
+from tornado.ioloop import IOLoop
+
+from .scraper import Page, SAVE_HEADERS
+
+SEGMENT_SIZE = 100 * 1024 * 1024 # bytes
+INDEX_FILE = 'index.tsv'
+SEGMENT_PREFIX = 'pages-'
+
+
+class GzipCodec:
+    extension = '.warc.gz'
+
+    def compress(self, data):
+        return gzip.compress(data)
+
+    def open_stream(self, f):
+        # concatenated gzip members are read as a single stream
+        return gzip.GzipFile(fileobj=f)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+
+class ZstdCodec:
+    extension = '.warc.zst'
+
+    def __init__(self):
+        import zstandard
+        self.zstd = zstandard
+        self.compressor = zstandard.ZstdCompressor()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def open_stream(self, f):
+        return self.zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+
+    def decompress(self, data):
+        return self.zstd.ZstdDecompressor().decompress(data)
+
+
+def get_codec(name):
+    if name == 'gzip':
+        return GzipCodec()
+    if name == 'zstd':
+        return ZstdCodec()
+    raise ValueError('Unknown compression: %s' % name)
+
+
+def codec_of(filename):
+    for name, cls in (('gzip', GzipCodec), ('zstd', ZstdCodec)):
+        if filename.endswith(cls.extension):
+            return get_codec(name)
+    raise ValueError('Unknown segment type: %s' % filename)
+
+
+def make_record(url, response):
+    """WARC-like response record: record headers, HTTP status line and
+    SAVE_HEADERS, body.
+    """
+    http = ['HTTP/1.1 %d %s' % (response.code, response.reason or '')]
+    http.extend('%s: %s' % (k, v) for k, v in response.headers.get_all()
+                if k in SAVE_HEADERS)
+    block = ('\r\n'.join(http) + '\r\n\r\n').encode('latin1', 'replace') + (response.body or b'')
+    date = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    head = (
+        'WARC/1.0\r\n'
+        'WARC-Type: response\r\n'
+        'WARC-Target-URI: %s\r\n'
+        'WARC-Date: %s\r\n'
+        'Torspider-Task-URI: %s\r\n'
+        'Content-Type: application/http; msgtype=response\r\n'
+        'Content-Length: %d\r\n'
+        '\r\n' % (response.effective_url or url, date, url, len(block))
+    )
+    return head.encode('utf-8') + block + b'\r\n\r\n'
+
+
+def _parse_headers(lines):
+    headers = HTTPHeaders()
+    for line in lines:
+        if line:
+            headers.parse_line(line)
+    return headers
+
+
+def read_record(stream):
+    """Read the next record from decompressed stream. Return
+    (task URL, tornado HTTPResponse), or None at the end of the stream.
+    """
+    lines = []
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if lines:
+                break
+            continue # records separator
+        lines.append(line)
+    head = _parse_headers(lines[1:])
+    block = stream.read(int(head['Content-Length']))
+    http, _, body = block.partition(b'\r\n\r\n')
+    http_lines = http.decode('latin1').split('\r\n')
+    _, code, reason = (http_lines[0].split(' ', 2) + [''])[:3]
+    effective_url = head['WARC-Target-URI']
+    url = head.get('Torspider-Task-URI', effective_url)
+    response = HTTPResponse(HTTPRequest(url), int(code), reason=reason,
+                            headers=_parse_headers(http_lines[1:]),
+                            buffer=io.BytesIO(body), effective_url=effective_url)
+    return url, response
+
+
+class ArchiveWriter:
+    """Appends compressed records to rotating segment files of the directory
+    and registers them in the index.
+    """
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, compression='gzip'):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.codec = get_codec(compression)
+        os.makedirs(directory, exist_ok=True)
+        self.index = open(os.path.join(directory, INDEX_FILE), 'a', encoding='utf-8')
+        self.segment = None
+        self.segment_name = None
+        self.records = 0
+
+    def _next_segment_name(self):
+        prefix = '%s%d-' % (SEGMENT_PREFIX, os.getpid())
+        numbers = [int(name[len(prefix):].split('.')[0])
+                   for name in os.listdir(self.directory)
+                   if name.startswith(prefix)]
+        return '%s%05d%s' % (prefix, max(numbers, default=-1) + 1, self.codec.extension)
+
+    def _rotate(self):
+        if self.segment is not None:
+            self.segment.close()
+        self.segment_name = self._next_segment_name()
+        logging.info('Archive segment: %s', self.segment_name)
+        self.segment = open(os.path.join(self.directory, self.segment_name), 'ab')
+
+    def write(self, url, response):
+        """Append the response record. Return (segment, offset, length)."""
+        if self.segment is None or self.segment.tell() >= self.segment_size:
+            self._rotate()
+        data = self.codec.compress(make_record(url, response))
+        offset = self.segment.tell()
+        self.segment.write(data)
+        self.segment.flush()
+        self.index.write('%s\t%s\t%d\t%d\n' % (url, self.segment_name, offset, len(data)))
+        self.index.flush()
+        self.records += 1
+        return self.segment_name, offset, len(data)
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+        self.index.close()
+
+
+class ArchiveReader:
+    """Reads the archive back: all the records sequentially, or a single
+    one by its task URL through the index.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = None
+
+    @property
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith(SEGMENT_PREFIX))
+
+    @property
+    def index(self):
+        """Dictionary: task URL -> (segment, offset, length) of its latest record."""
+        if self._index is None:
+            self._index = {}
+            with open(os.path.join(self.directory, INDEX_FILE), encoding='utf-8') as f:
+                for line in f:
+                    url, segment, offset, length = line.rstrip('\n').rsplit('\t', 3)
+                    self._index[url] = (segment, int(offset), int(length))
+        return self._index
+
+    def __iter__(self):
+        """Yield (task URL, response) for every record."""
+        for name in self.segments:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                stream = io.BufferedReader(codec_of(name).open_stream(f))
+                while True:
+                    record = read_record(stream)
+                    if record is None:
+                        break
+                    yield record
+
+    def get(self, url):
+        """Response of the task URL, None if it is not archived."""
+        item = self.index.get(url)
+        if item is None:
+            return None
+        segment, offset, length = item
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            data = codec_of(segment).decompress(f.read(length))
+        return read_record(io.BytesIO(data))[1]
+
+    def iter_pages(self, page_class=Page):
+        """Yield page objects for offline processing."""
+        for url, response in self:
+            yield page_class(url, response)
+
+
+class ArchiveConsumer:
+    """Consumer saving responses of successfully fetched pages.
+    Records are written one by one in a separate thread.
+    """
+    def __init__(self, writer):
+        self.writer = writer
+        self._executor = ThreadPoolExecutor(1)
+
+    async def __call__(self, report):
+        page = report.get('page')
+        response = getattr(page, 'response', None)
+        if response is None:
+            return
+        await IOLoop.current().run_in_executor(
+            self._executor, self.writer.write, report['url'], response)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.writer.close()
+        logging.info('Archive: %d pages saved.', self.writer.records)
+
+
+# Plugin entry points
+
+_consumer = None
+
+
+def init(directory='archive', segment_size=SEGMENT_SIZE, compression='gzip', **kwargs):
+    global _consumer
+    logging.info('Archiving pages to %s...', directory)
+    _consumer = ArchiveConsumer(ArchiveWriter(directory, segment_size, compression))
+
+
+async def consume(report):
+    await _consumer(report)
+
+
+def done(**kwargs):
+    global _consumer
+    if _consumer is not None:
+        _consumer.close()
+        _consumer = None
@@ -0,0 +1,42 @@
+'''
+bloom.py - Bloom filter parameters and hashing.
+
+The filter bits are stored elsewhere (e.g. in a Redis bitmap), this module
+only calculates their size and positions.
+'''
+import math
+from hashlib import md5
+
+MAX_BITS = 2 ** 32 # Redis string size limit, 512Mb
+
+
+class BloomFilter:
+    """Bloom filter geometry.
+
+    Arguments:
+        capacity : expected number of items
+        error_rate : acceptable false positives rate, 0 < error_rate < 1
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        assert capacity > 0, 'Capacity must be positive'
+        assert 0 < error_rate < 1, 'Error rate must be between 0 and 1'
+        self.capacity = capacity
+        self.error_rate = error_rate
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        assert bits <= MAX_BITS, 'Bloom filter of %d bits is too large' % bits
+        self.bits = bits
+        self.hashes = max(1, round(bits / capacity * math.log(2)))
+
+    @property
+    def size(self):
+        """Memory occupied by the filter bits, in bytes."""
+        return math.ceil(self.bits / 8)
+
+    def offsets(self, item):
+        """Positions of the bits, corresponding to the given string.
+        Uses double hashing over two halves of MD5 digest.
+        """
+        digest = md5(item.encode('utf8')).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
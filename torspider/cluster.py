@@ -0,0 +1,68 @@
+'''
+Cluster mode: crawler nodes on different hosts share the same Redis.
+Every node sends heartbeats, tasks of the nodes which stopped sending
+them are returned to the frontier by the others.
+'''
+import logging
+from tornado.ioloop import PeriodicCallback
+
+HEARTBEAT_INTERVAL = 5.0 # seconds
+
+
+class ClusterNode:
+    """Keeps the node registered while the crawler runs: every `interval`
+    seconds renews its heartbeat and requeues the tasks of dead nodes.
+
+    Arguments:
+        redis : tasks.RedisClient instance, the class set up with node_id;
+                the node should have its own instance, not shared with
+                other coroutines
+        interval : heartbeats interval, seconds; must be shorter than the
+                   node timeout
+    """
+    def __init__(self, redis, interval=HEARTBEAT_INTERVAL):
+        assert interval < redis.node_timeout, \
+            'Heartbeat interval must be shorter than the node timeout'
+        self.redis = redis
+        self.interval = interval
+        self.coordinator = None # ID of the coordinator node
+        self.requeued = 0
+        self._timer = None
+
+    @property
+    def node_id(self):
+        return self.redis.node_id
+
+    @property
+    def is_coordinator(self):
+        return self.coordinator == self.node_id
+
+    async def beat(self):
+        coordinator = await self.redis.heartbeat()
+        if coordinator != self.coordinator:
+            logging.info('Node %s: coordinator is %s.', self.node_id, coordinator)
+        self.coordinator = coordinator
+
+    async def register(self):
+        """Send the first heartbeat and start the periodic ones."""
+        await self.beat()
+        self._timer = PeriodicCallback(self._on_timer, self.interval * 1000)
+        self._timer.start()
+        logging.info('Node %s registered.', self.node_id)
+
+    async def _on_timer(self):
+        try:
+            await self.beat()
+            self.requeued += len(await self.redis.requeue_dead_nodes())
+        except self.redis.connection_errors as ex:
+            logging.error('Node %s heartbeat failed: %s', self.node_id, ex)
+
+    async def unregister(self):
+        """Stop the heartbeats and leave the cluster."""
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        await self.redis.unregister_node()
+        await self.redis.close()
+        logging.info('Node %s unregistered, %d tasks of dead nodes requeued.',
+                     self.node_id, self.requeued)
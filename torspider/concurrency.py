@@ -0,0 +1,172 @@
+'''
+Adaptive concurrency: the number of workers fetching at the same time is
+adjusted to the observed latency, timeouts and throughput (AIMD).
+'''
+import logging
+import time
+import pycurl
+from tornado.curl_httpclient import CurlError
+from tornado.simple_httpclient import HTTPTimeoutError
+from tornado.ioloop import PeriodicCallback
+from tornado.locks import Condition
+
+MIN_WORKERS = 2
+ADAPT_INTERVAL = 10.0 # seconds
+MAX_TIMEOUT_RATE = 0.1 # timed out / completed fetches
+LATENCY_TOLERANCE = 2.0 # latency growth, tolerated above the baseline
+DECREASE_FACTOR = 0.5
+THROUGHPUT_DROP = 0.1 # relative throughput loss after an increase
+BASELINE_DRIFT = 1.05 # baseline latency growth per interval
+MIN_SAMPLES = 5 # fetches per interval needed for a decision
+
+
+def is_timeout(ex):
+    """True if the exception is a connect or request timeout."""
+    if isinstance(ex, CurlError):
+        return ex.errno == pycurl.E_OPERATION_TIMEDOUT
+    return isinstance(ex, HTTPTimeoutError)
+
+
+class AdaptiveConcurrency:
+    """Limits the number of active workers. A worker calls `acquire` before
+    taking a task, `release` after it is done, and reports every fetch by
+    `record`.
+
+    Every `interval` seconds the limit is adjusted:
+      * congestion -- more than max_timeout_rate of the fetches timed out,
+        or the mean latency exceeds latency_tolerance times the baseline
+        (the lowest mean latency observed lately): the limit is multiplied
+        by decrease_factor;
+      * the previous increase has reduced the throughput: the limit is
+        decreased by one;
+      * otherwise, if workers had to wait for a slot, the limit grows:
+        doubles until the first congestion (slow start), then by one.
+
+    Arguments:
+        min_workers, max_workers : limit bounds
+        interval : adjustment interval, seconds
+        max_timeout_rate : tolerated share of timed out fetches
+        latency_tolerance : tolerated ratio of latency to the baseline
+        decrease_factor : limit multiplier on congestion
+    """
+    def __init__(self, min_workers=MIN_WORKERS, max_workers=10, interval=ADAPT_INTERVAL,
+                 max_timeout_rate=MAX_TIMEOUT_RATE, latency_tolerance=LATENCY_TOLERANCE,
+                 decrease_factor=DECREASE_FACTOR):
+        assert 0 < min_workers <= max_workers, 'Invalid workers bounds'
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+        self.max_timeout_rate = max_timeout_rate
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.limit = min_workers
+        self.active = 0
+        self.waiting = 0
+        self.slow_start = True
+        self.baseline = None # seconds
+        self.decisions = 0
+        self._condition = Condition()
+        self._timer = None
+        self._last = None # (action, throughput) of the previous decision
+        self._reset()
+
+    def _reset(self):
+        self.started = time.monotonic()
+        self.completed = 0
+        self.timeouts = 0
+        self.latency = 0.0
+        self.fetched = 0
+        self.blocked = self.waiting > 0
+
+    async def acquire(self):
+        """Wait for a free slot."""
+        if self.active >= self.limit:
+            self.waiting += 1
+            self.blocked = True
+            try:
+                while self.active >= self.limit:
+                    await self._condition.wait()
+            finally:
+                self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._condition.notify()
+
+    def record(self, elapsed, timeout=False):
+        """Register a completed fetch: its time and whether it timed out."""
+        self.completed += 1
+        if timeout:
+            self.timeouts += 1
+        else:
+            self.fetched += 1
+            self.latency += elapsed
+
+    def set_limit(self, limit):
+        limit = max(self.min_workers, min(self.max_workers, limit))
+        if limit > self.limit:
+            self._condition.notify(limit - self.limit)
+        self.limit = limit
+
+    def adjust(self):
+        """Decide on the new limit by the samples collected since the
+        previous call. Return the decision: 'increase', 'decrease', 'hold'.
+        """
+        elapsed = time.monotonic() - self.started
+        throughput = self.completed / elapsed if elapsed > 0 else 0.0
+        if self.completed < MIN_SAMPLES:
+            action, reason = 'hold', '%d fetches' % self.completed
+        else:
+            timeout_rate = self.timeouts / self.completed
+            latency = self.latency / self.fetched if self.fetched else None
+            if latency is not None:
+                if self.baseline is None:
+                    self.baseline = latency
+                else:
+                    self.baseline = min(self.baseline * BASELINE_DRIFT, latency)
+            if timeout_rate > self.max_timeout_rate:
+                action, reason = 'decrease', 'timeouts %.0f%%' % (timeout_rate * 100)
+            elif latency is not None and latency > self.baseline * self.latency_tolerance:
+                action, reason = 'decrease', 'latency %.2fs, baseline %.2fs' % (
+                    latency, self.baseline)
+            elif self._last is not None and self._last[0] == 'increase' \
+                    and throughput < self._last[1] * (1 - THROUGHPUT_DROP):
+                action, reason = 'back', 'throughput %.2f < %.2f pages/sec' % (
+                    throughput, self._last[1])
+            elif self.blocked:
+                action, reason = 'increase', 'workers waiting'
+            else:
+                action, reason = 'hold', 'no demand'
+        old = self.limit
+        if action == 'decrease':
+            self.slow_start = False
+            self.set_limit(int(self.limit * self.decrease_factor))
+        elif action == 'back':
+            self.slow_start = False
+            self.set_limit(self.limit - 1)
+            action = 'decrease'
+        elif action == 'increase':
+            self.set_limit(self.limit * 2 if self.slow_start else self.limit + 1)
+        if self.limit != old:
+            self.decisions += 1
+            logging.info('Concurrency %d -> %d: %s, %.2f pages/sec.',
+                         old, self.limit, reason, throughput)
+        else:
+            action = 'hold'
+            logging.debug('Concurrency %d: %s, %.2f pages/sec.', self.limit, reason, throughput)
+        self._last = (action, throughput)
+        self._reset()
+        return action
+
+    def start(self):
+        if self._timer is None:
+            self._reset()
+            self._timer = PeriodicCallback(self.adjust, self.interval * 1000)
+            self._timer.start()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+            logging.info('Concurrency: %d workers, %d changes.', self.limit, self.decisions)
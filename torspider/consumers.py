@@ -0,0 +1,132 @@
+'''
+Consumers pipeline: delivers reports to the consumer functions, provided
+by plugins through `torspider_consume` entry point, without holding up
+the workers.
+'''
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from tornado import gen
+from tornado.queues import Queue
+
+QUEUE_SIZE = 100 # reports
+CONCURRENCY = 1 # calls per consumer
+
+
+class Consumer:
+    """Consumer function with its own bounded queue of reports and
+    `concurrency` tasks calling the function.
+    """
+    def __init__(self, name, func, queue_size=QUEUE_SIZE, concurrency=CONCURRENCY):
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+        self.queue = Queue(maxsize=queue_size)
+        self.tasks = []
+        # metrics
+        self.processed = 0
+        self.errors = 0
+        self.blocked = 0 # reports, which had to wait for a free slot
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def start(self):
+        self.tasks = [asyncio.ensure_future(self._run()) for _ in range(self.concurrency)]
+
+    async def call(self, report):
+        logging.debug('Calling consumer <%s> function %s...', self.name, self.func)
+        start = time.monotonic()
+        try:
+            await self.func(report)
+        except Exception as ex:
+            self.errors += 1
+            logging.error(ex, exc_info=True)
+        elapsed = time.monotonic() - start
+        self.processed += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    async def put(self, report):
+        if self.concurrency == 0:
+            await self.call(report)
+            return
+        if self.queue.full():
+            self.blocked += 1
+        await self.queue.put(report)
+
+    async def _run(self):
+        while True:
+            report = await self.queue.get()
+            try:
+                await self.call(report)
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'processed': self.processed,
+            'errors': self.errors,
+            'blocked': self.blocked,
+            'avg_time': self.total_time / self.processed if self.processed else 0.0,
+            'max_time': self.max_time,
+        }
+
+
+class ConsumerPipeline:
+    """Workers put reports and continue; each consumer takes them from its
+    own queue. A worker waits only if a queue is full.
+
+    Arguments:
+        consumers : dictionary of consumer functions
+        queue_size : queue size of every consumer, reports
+        concurrency : concurrent calls of every consumer; if 0, consumers
+                      are called one by one by the worker putting a report
+    """
+    def __init__(self, consumers=None, queue_size=QUEUE_SIZE, concurrency=CONCURRENCY):
+        self.consumers = [
+            Consumer(name, func, queue_size, concurrency)
+            for name, func in (consumers or {}).items()
+        ]
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            for c in self.consumers:
+                c.start()
+            self.started = True
+
+    async def put(self, report):
+        """Queue the report for every consumer."""
+        self.start()
+        for c in self.consumers:
+            await c.put(report)
+
+    def stats(self):
+        """Metrics of every consumer, by name."""
+        return {c.name: c.stats() for c in self.consumers}
+
+    async def close(self, timeout=None):
+        """Wait until the queued reports are consumed, at most timeout
+        seconds, then stop the consumer tasks.
+        """
+        pending = [c.queue.join() for c in self.consumers if c.tasks]
+        if pending:
+            waiting = gen.multi(pending)
+            if timeout:
+                waiting = gen.with_timeout(timedelta(seconds=timeout), waiting)
+            try:
+                await waiting
+            except gen.TimeoutError:
+                logging.warning('Consumers did not complete in %.1f sec, %d reports lost.',
+                                timeout, sum(c.queue.qsize() for c in self.consumers))
+        tasks = [t for c in self.consumers for t in c.tasks]
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+        for c in self.consumers:
+            c.tasks = []
+            logging.info('Consumer <%s>: %s', c.name, c.stats())
+        self.started = False
@@ -0,0 +1,114 @@
+'''
+Crawl controller: runs workers, waits for the end of the crawl and
+shuts the workers down.
+'''
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from tornado import gen
+from tornado.locks import Event
+
+SUPERVISOR_INTERVAL = 5.0 # seconds
+DRAIN_TIMEOUT = 30.0 # seconds
+
+
+class CrawlController:
+    """The crawl is over as soon as `finish` is called: by a worker, which
+    has reached the pages limit, by the supervisor or by a signal handler.
+    Then workers waiting for tasks are cancelled, the busy ones are given
+    `drain_timeout` seconds to complete their current tasks.
+
+    Arguments:
+        stats : stats.CrawlStats instance
+        interval : supervisor checks interval, seconds
+        drain_timeout : time given to busy workers on shutdown, seconds
+        redis : optional tasks.RedisClient instance; if given, the supervisor
+                requeues the tasks with expired leases
+        consumers : optional consumers.ConsumerPipeline instance, its metrics
+                    are logged by the supervisor
+    """
+    def __init__(self, stats, interval=SUPERVISOR_INTERVAL, drain_timeout=DRAIN_TIMEOUT,
+                 redis=None, consumers=None):
+        self.stats = stats
+        self.redis = redis
+        self.consumers = consumers
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.done = Event()
+        self.reason = None
+        self.workers = {}
+        self.wakeups = 0
+        self.cpu_time = 0.0
+
+    @property
+    def stopping(self):
+        return self.done.is_set()
+
+    def start(self, worker):
+        """Run a worker under control of this object."""
+        worker.controller = self
+        self.workers[worker] = asyncio.ensure_future(worker())
+
+    def finish(self, reason):
+        """Signal the end of the crawl."""
+        if not self.done.is_set():
+            logging.warning('%s. Stopping...', reason)
+            self.reason = reason
+            self.done.set()
+
+    async def supervise(self, max_pages=0):
+        """Wait for the end of the crawl. Every `interval` seconds check
+        the pages limit, in case it was reached by other crawlers sharing
+        the same Redis, and requeue the tasks abandoned by dead crawlers.
+        """
+        while not self.done.is_set():
+            try:
+                await self.done.wait(timeout=timedelta(seconds=self.interval))
+            except gen.TimeoutError:
+                pass
+            if self.done.is_set():
+                break
+            self.wakeups += 1
+            # process_time counts the whole process: time only the
+            # synchronous checks, other coroutines run during the awaits
+            await self.stats.ensure_fresh()
+            if self.redis is not None:
+                await self.redis.requeue_expired()
+            start = time.process_time()
+            if self.stats.limit_reached(max_pages):
+                self.finish('Pages limit (%d) exceeded' % max_pages)
+            if all(f.done() for f in self.workers.values()):
+                self.finish('No running workers')
+            logging.debug('Redis pool: %s', self.stats.redis.pool_stats())
+            if self.consumers is not None:
+                logging.debug('Consumers: %s', self.consumers.stats())
+            self.cpu_time += time.process_time() - start
+
+    async def shutdown(self):
+        """Cancel idle workers, let busy ones complete their tasks."""
+        busy = []
+        for worker, future in self.workers.items():
+            if future.done():
+                continue
+            if worker.busy:
+                busy.append(future)
+            else:
+                future.cancel()
+        if busy:
+            logging.info('Waiting for %d busy workers...', len(busy))
+            try:
+                await gen.with_timeout(timedelta(seconds=self.drain_timeout),
+                                       asyncio.wait(busy))
+            except gen.TimeoutError:
+                logging.warning('%d workers are still busy, cancelling.',
+                                sum(1 for f in busy if not f.done()))
+                for future in busy:
+                    future.cancel()
+        # let cancelled workers release their resources
+        await asyncio.wait(list(self.workers.values()))
+        logging.info('Supervisor: %d wake-ups, %.3f sec CPU time.',
+                     self.wakeups, self.cpu_time)
+        if self.stats.aborted:
+            logging.info('Aborted %d transfers, %d bytes saved.',
+                         self.stats.aborted, self.stats.bytes_saved)
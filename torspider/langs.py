@@ -0,0 +1,179 @@
+'''
+Language detection of pages.
+
+Languages declared by the page (Content-Language header, <html lang>,
+content-language meta tag) are trusted. Otherwise a sample of the page text
+is passed to a detector: a callable, detector(text), returning language code
+or None. The default one is based on langdetect; plugins may provide
+a faster one through `torspider_lang` entry point.
+'''
+import logging
+from collections import OrderedDict
+
+from .urlnorm import get_domain
+
+UNKNOWN = 'UNKNOWN'
+SAMPLE_SIZE = 2000 # characters
+SAMPLE_PARTS = 4
+DOMAIN_AGREEMENT = 3 # pages
+MAX_DOMAINS = 100000
+SEED = 0
+META_NAMES = ('content-language', 'language', 'dc.language')
+
+
+def normalize(value):
+    """Primary language subtag of the first language in a header value,
+    e.g. 'ru' for 'ru-RU, en'. None if the value is empty or a wildcard.
+    """
+    if not value:
+        return None
+    lang = value.split(',')[0].strip().replace('_', '-').split('-')[0].lower()
+    if not lang.isalpha() or not 2 <= len(lang) <= 3:
+        return None
+    return lang
+
+
+def sample(text, size=SAMPLE_SIZE, parts=SAMPLE_PARTS):
+    """At most size characters of text: several pieces taken evenly
+    from the beginning, middle and end, so that a long navigation menu
+    does not decide the language alone.
+    """
+    if len(text) <= size:
+        return text
+    step = len(text) // parts
+    width = size // parts
+    return ' '.join(text[i * step:i * step + width] for i in range(parts))
+
+
+class LangDetect:
+    """langdetect with profiles loaded once and a fixed seed, so that the
+    same text always gets the same language.
+    """
+    def __init__(self, seed=SEED):
+        self.seed = seed
+        self._factory = None
+
+    @property
+    def factory(self):
+        if self._factory is None:
+            from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+            factory = DetectorFactory()
+            factory.load_profile(PROFILES_DIRECTORY)
+            factory.set_seed(self.seed)
+            self._factory = factory
+        return self._factory
+
+    def __call__(self, text):
+        from langdetect.lang_detect_exception import LangDetectException
+        detector = self.factory.create()
+        detector.append(text)
+        try:
+            return detector.detect()
+        except LangDetectException as ex:
+            logging.debug(ex)
+            return None
+
+
+class LanguageDetector:
+    """Page language: declared, or detected from a text sample. When
+    `agreement` successive pages of a domain get the same detected language,
+    it is used for the next pages of the domain without detection.
+
+    Arguments:
+        detector : callable, detector(text) -> language code or None
+        sample_size : maximal text length passed to the detector, characters
+        agreement : pages of a domain, which must agree to cache the result
+        max_domains : maximal count of the domains remembered
+    """
+    def __init__(self, detector=None, sample_size=SAMPLE_SIZE,
+                 agreement=DOMAIN_AGREEMENT, max_domains=MAX_DOMAINS):
+        self.detector = detector if detector is not None else LangDetect()
+        self.sample_size = sample_size
+        self.agreement = agreement
+        self.max_domains = max_domains
+        self.domains = OrderedDict() # domain -> (language, successive pages)
+
+    def declared(self, page):
+        """Language declared by the page, if any."""
+        lang = normalize(page.response.headers.get('Content-Language'))
+        if lang:
+            return lang
+        lang = normalize(page.html_lang)
+        if lang:
+            return lang
+        for k, v in page.meta.items():
+            if k.lower() in META_NAMES:
+                lang = normalize(v)
+                if lang:
+                    return lang
+        return None
+
+    def _cached(self, domain):
+        item = self.domains.get(domain)
+        if item is not None:
+            self.domains.move_to_end(domain)
+            lang, count = item
+            if count >= self.agreement:
+                return lang
+        return None
+
+    def _remember(self, domain, lang):
+        item = self.domains.get(domain)
+        if item is not None and item[0] == lang:
+            self.domains[domain] = (lang, item[1] + 1)
+        else:
+            self.domains[domain] = (lang, 1)
+        if len(self.domains) > self.max_domains:
+            self.domains.popitem(last=False)
+
+    def detect(self, page):
+        """Page language code or UNKNOWN."""
+        lang = self.declared(page)
+        if lang:
+            return lang
+        domain = get_domain(page.url)
+        lang = self._cached(domain)
+        if lang:
+            return lang
+        text = page.text
+        if not text:
+            return UNKNOWN
+        try:
+            lang = self.detector(sample(text, self.sample_size))
+        except Exception as ex:
+            logging.error('Language detector %s failed on <%s>: %s', self.detector, page.url, ex)
+            lang = None
+        if not lang:
+            return UNKNOWN
+        self._remember(domain, lang)
+        return lang
+
+
+def get_detector(name='langdetect'):
+    """Detector callable by name: 'langdetect' or a name of
+    `torspider_lang` entry point.
+    """
+    if name == 'langdetect':
+        return LangDetect()
+    import pkg_resources
+    for ep in pkg_resources.iter_entry_points('torspider_lang'):
+        if ep.name == name:
+            return ep.load()
+    raise ValueError('Unknown language detector: %s' % name)
+
+
+_detector = None
+
+
+def configure(name='langdetect', sample_size=SAMPLE_SIZE):
+    """Set up the language detector of this process."""
+    global _detector
+    _detector = LanguageDetector(get_detector(name), sample_size=sample_size)
+    return _detector
+
+
+def detect(page):
+    """Language of the page, detected by the detector of this process."""
+    if _detector is None:
+        configure()
+    return _detector.detect(page)
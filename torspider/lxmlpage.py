@@ -0,0 +1,138 @@
+'''
+Page implementation over lxml.html tree: parsed once, queried with XPath.
+'''
+import logging
+from urllib.parse import urlunparse
+
+import lxml.html
+from lxml import etree
+
+from .scraper import Page, SKIP_TAGS, collapse_spaces
+from .urlnorm import norm
+
+
+def _charset(response):
+    content_type = response.headers.get('Content-Type', '')
+    for param in content_type.split(';')[1:]:
+        k, _, v = param.partition('=')
+        if k.strip().lower() == 'charset':
+            return v.strip().strip('"\'')
+    return None
+
+
+def parse_html(body, charset=None):
+    """Parse HTML document bytes. Unless charset is given, try UTF-8,
+    then leave the guess to lxml. Return root element, or None,
+    if the document is empty.
+    """
+    if not charset:
+        try:
+            body.decode('utf-8')
+            charset = 'utf-8'
+        except UnicodeDecodeError:
+            pass
+    try:
+        parser = lxml.html.HTMLParser(encoding=charset)
+    except LookupError:
+        parser = lxml.html.HTMLParser()
+    try:
+        return lxml.html.document_fromstring(body, parser=parser)
+    except etree.ParserError:
+        return None
+
+
+def _iter_strings(root):
+    """Text strings of the tree, except those inside SKIP_TAGS and comments,
+    in document order.
+    """
+    if root.text:
+        yield root.text
+    stack = [(iter(root), None)]
+    while stack:
+        children, tail = stack[-1]
+        for el in children:
+            if isinstance(el.tag, str) and el.tag.lower() not in SKIP_TAGS:
+                if el.text:
+                    yield el.text
+                stack.append((iter(el), el.tail))
+                break
+            if el.tail:
+                yield el.tail
+        else:
+            stack.pop()
+            if tail:
+                yield tail
+
+
+def _first(items):
+    return items[0] if items else None
+
+
+class LxmlPage(Page):
+    """Same as Page, but several times faster. Title, meta, base, links and
+    text are extracted from lxml.html tree. BeautifulSoup tree is still
+    available as `soup` property, it is built on first access.
+    """
+
+    def __init__(self, url, response):
+        super(LxmlPage, self).__init__(url, response)
+        self._tree = None
+        self._parsed = False
+
+    @property
+    def tree(self):
+        """lxml.html root element, or None for empty document."""
+        if not self._parsed:
+            self._tree = parse_html(self.response.body, _charset(self.response))
+            self._parsed = True
+        return self._tree
+
+    def _xpath(self, path):
+        return [] if self.tree is None else self.tree.xpath(path)
+
+    @property
+    def base(self):
+        if self._base is None:
+            self._base = _first(self._xpath('//base/@href'))
+            if not self._base:
+                logging.debug('No <base> header. Using response domain name')
+                parts = norm(self.response.effective_url)
+                self._base = urlunparse((parts[0], parts[1], '/', '', '', ''))
+        return self._base
+
+    @property
+    def title(self):
+        if not self._title:
+            title = _first(self._xpath('//title'))
+            if title is not None and title.text and not len(title):
+                self._title = title.text.strip()
+            if not self._title:
+                logging.debug('Page title not found. Searching headings...')
+                for i in range(5):
+                    h = _first(self._xpath('(//body//h{})[1]'.format(i+1)))
+                    if h is not None:
+                        self._title = h.text if not len(h) else None
+                        break
+        return self._title
+
+    @property
+    def html_lang(self):
+        return None if self.tree is None else self.tree.get('lang')
+
+    def _iter_meta(self):
+        for tag in self._xpath('//meta'):
+            k = tag.get('property', tag.get('name'))
+            if k:
+                v = tag.get('content')
+                if v:
+                    yield k, v
+
+    def _iter_hrefs(self):
+        return iter(self._xpath('//a/@href'))
+
+    @property
+    def text(self):
+        if self._text is None:
+            body = _first(self._xpath('/html/body'))
+            self._text = '' if body is None else collapse_spaces(' '.join(_iter_strings(body)))
+        return self._text
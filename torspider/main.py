@@ -2,13 +2,15 @@
 '''
 Main module, starts and dispatches the entire workflow.
 '''
+import sys
 import logging
-from tornado import gen
+import signal
+from functools import partial
 from tornado.options import define, options, parse_command_line, parse_config_file
 from tornado.log import enable_pretty_logging
 from tornado.ioloop import IOLoop
 import pkg_resources
-from . import tasks, utils
+from . import tasks, utils, scoring, langs
 
 from pkg_resources import Requirement, resource_filename
 DEFAULT_CONF = resource_filename(Requirement.parse('torspider'),"default.conf")
@@ -16,8 +18,17 @@ LOCAL_CONF = resource_filename(Requirement.parse('torspider'),"local.conf")
 SEEDS_CONF = resource_filename(Requirement.parse('torspider'),"seeds.conf")
 PLUGINS_JSON = resource_filename(Requirement.parse('torspider'),"plugins.json")
 
-from .worker import Worker, add_task
+from .worker import Worker, add_tasks
+from .parsing import PageParser
+from .scraper import configure_client, CurlTuning, DNS_CACHE_TIMEOUT
 from .utils import iter_file
+from .stats import CrawlStats, STATS_MAX_AGE
+from .controller import CrawlController, DRAIN_TIMEOUT
+from .consumers import ConsumerPipeline, QUEUE_SIZE, CONCURRENCY
+from .processes import ProcessSupervisor
+from .cluster import ClusterNode, HEARTBEAT_INTERVAL
+from .concurrency import AdaptiveConcurrency, MIN_WORKERS, ADAPT_INTERVAL
+from .admission import AdmissionController, HIGH_WATER
 
 enable_pretty_logging()
 
@@ -28,11 +39,89 @@ define("request_timeout", type=float, default=20.0, help='Request timeout')
 define("validate_cert", type=bool, default=False, help='Validate certificate')
 define("max_pages", type=int, default=100, help='Maximum pages, 0 - no limit')
 define("clear_tasks", type=bool, default=True, help='Clear existing data')
-define("workers", type=int, default=10, help='Workers count')
+define("resume", type=bool, default=False,
+       help='Resume the previous crawl: keep the data, requeue unfinished tasks')
+define("lease_time", type=float, default=tasks.LEASE_TIME,
+       help='Seconds a taken task may stay unfinished before it is requeued')
+define("workers", type=int, default=10, help='Workers count (maximum in adaptive mode)')
+define("adaptive_workers", type=bool, default=False,
+       help='Adjust the number of active workers to the observed latency and timeouts')
+define("min_workers", type=int, default=MIN_WORKERS,
+       help='Minimal number of active workers (adaptive mode)')
+define("adapt_interval", type=float, default=ADAPT_INTERVAL,
+       help='Interval of the active workers adjustments, seconds (adaptive mode)')
+define("processes", type=int, default=1,
+       help='Crawler processes sharing the tasks, each running its own workers')
 define("follow_outer_links", type=bool, default=True, help='Follow outer links')
 define("follow_inner_links", type=bool, default=False, help='Follow inner links')
-define("throttling_ratio", type=float, default=0.9,
-       help='minimal completed / pending tasks ratio, 0 -- no throttling')
+define("high_water", type=int, default=HIGH_WATER,
+       help='Pending tasks count, above which new links are deferred, 0 -- no limit')
+define("low_water", type=int, default=0,
+       help='Pending tasks count, below which deferred links are admitted, '
+            '0 -- half of high-water')
+define("admission_rate", type=float, default=0,
+       help='Links admitted per second by every process, 0 -- no limit')
+define("admission_burst", type=float, default=0,
+       help='Links admitted at once above the rate, 0 -- the rate')
+define("max_clients", type=int, default=0,
+       help='Concurrent curl transfers of every process, 0 -- the workers count')
+define("reuse_connections", type=bool, default=True,
+       help='Reuse connections (to the proxy) between requests')
+define("tcp_keepalive", type=bool, default=True,
+       help='Send TCP keepalive probes on idle connections')
+define("tcp_nodelay", type=bool, default=True, help="Disable Nagle's algorithm")
+define("dns_cache_timeout", type=int, default=DNS_CACHE_TIMEOUT,
+       help='Time resolved host names are cached, seconds')
+define("http2", type=bool, default=False,
+       help='Negotiate HTTP/2 with HTTPS servers, if libcurl supports it')
+define("stream_pages", type=bool, default=False,
+       help='Check headers and size while downloading, abort illegal transfers')
+define("page_parser", type=str, default='soup',
+       help='HTML parser: soup (BeautifulSoup) or lxml (faster)')
+define("parse_processes", type=int, default=0,
+       help='Processes parsing pages, 0 - parse in the main process')
+define("lang_detector", type=str, default='langdetect',
+       help='Language detector: langdetect or name of a torspider_lang plugin')
+define("lang_sample", type=int, default=langs.SAMPLE_SIZE,
+       help='Text sample size for language detection, characters')
+define("consumer_queue", type=int, default=QUEUE_SIZE,
+       help='Reports queue size of every consumer')
+define("consumer_concurrency", type=int, default=CONCURRENCY,
+       help='Concurrent calls of every consumer, 0 - call consumers from workers')
+define("redis_backend", type=str, default='tornadoredis',
+       help='Redis client: tornadoredis or asyncio')
+define("redis_connections", type=int, default=tasks.MAX_CONNECTIONS,
+       help='Maximum Redis connections, at least 2 per worker')
+define("stats_max_age", type=float, default=STATS_MAX_AGE,
+       help='Maximal age of cached crawl counters, seconds')
+define("drain_timeout", type=float, default=DRAIN_TIMEOUT,
+       help='Time given to busy workers to complete their tasks on exit, seconds')
+define("frontier", type=str, default=tasks.FIFO_FRONTIER,
+       help='Tasks order: fifo -- single queue, host -- per-host queues with politeness limits, '
+            'priority -- lower score first')
+define("host_delay", type=float, default=tasks.HOST_DELAY,
+       help='Minimal delay between fetches from the same host, seconds (host frontier)')
+define("host_concurrency", type=int, default=tasks.HOST_CONCURRENCY,
+       help='Maximal concurrent fetches from the same host (host frontier)')
+define("first_level_hosts", type=bool, default=False,
+       help='Treat subdomains as their first level domain (host frontier)')
+define("fanin_bonus", type=float, default=tasks.FANIN_BONUS,
+       help='Score decrease of a pending task found on one more page (priority frontier)')
+define("node_id", type=str, default='',
+       help='Cluster mode: unique ID of this node; empty -- not in a cluster')
+define("coordinator", type=bool, default=False,
+       help='Cluster mode: this node clears and seeds the tasks')
+define("heartbeat_interval", type=float, default=HEARTBEAT_INTERVAL,
+       help='Cluster mode: node heartbeats interval, seconds')
+define("node_timeout", type=float, default=tasks.NODE_TIMEOUT,
+       help='Cluster mode: seconds without heartbeats, after which a node is dead '
+            'and its tasks are requeued')
+define("seen_index", type=bool, default=False,
+       help='Deduplicate tasks with a Bloom filter instead of the tasks sets')
+define("seen_capacity", type=int, default=tasks.SEEN_CAPACITY,
+       help='Expected number of tasks in the seen index')
+define("seen_error_rate", type=float, default=tasks.SEEN_ERROR_RATE,
+       help='Seen index false positives rate')
 
 io_loop = IOLoop.current()
 plugins = {}
@@ -45,49 +134,173 @@ def process_entry_point(point_name):
             f = entry_point.load()
             f(**plugins[name])
 
-async def main():
-    tasks.RedisClient.setup()
-    redis = tasks.RedisClient()
+def make_scorer(seeds):
+    """Default scorers plus those provided by the enabled plugins."""
+    scorers = [
+        scoring.path_depth,
+        scoring.SeedNeighbours(seeds),
+        scoring.DomainNovelty(),
+    ]
+    scorers.extend(
+        ep.load()
+        for ep in pkg_resources.iter_entry_points('torspider_score')
+        if ep.name in plugins
+    )
+    return scoring.Scorer(scorers)
+
+def setup_redis(seeds):
+    """Configure the Redis client class, return it."""
+    redis_class = tasks.get_backend(options.redis_backend)
+    redis_class.setup(
+        max_connections=options.redis_connections,
+        seen_index=options.seen_index,
+        seen_capacity=options.seen_capacity,
+        seen_error_rate=options.seen_error_rate,
+        frontier=options.frontier,
+        host_delay=options.host_delay,
+        host_concurrency=options.host_concurrency,
+        first_level_hosts=options.first_level_hosts,
+        scorer=make_scorer(seeds),
+        fanin_bonus=options.fanin_bonus,
+        lease_time=options.lease_time,
+        node_id=options.node_id or None,
+        coordinator=options.coordinator,
+        node_timeout=options.node_timeout)
+    return redis_class
+
+async def start_node(redis_class):
+    """Register the cluster node, if --node-id is set."""
+    if not options.node_id:
+        return None
+    node = ClusterNode(redis_class(), options.heartbeat_interval)
+    await node.register()
+    if options.coordinator:
+        assert node.is_coordinator, 'Coordinator %s is running already' % node.coordinator
+    return node
+
+async def stop_node(node):
+    if node is not None:
+        await node.unregister()
+
+def may_prepare(node, coordinator=True):
+    """In cluster mode only the coordinator node clears and seeds the tasks."""
+    if node is not None and not node.is_coordinator:
+        logging.info('Node %s: the tasks are prepared by the coordinator.', node.node_id)
+        return False
+    return coordinator
+
+async def prepare(redis, seeds):
+    """Clear or recover the previous crawl data, add the seeds."""
+    if options.resume:
+        # other cluster nodes may be running and holding valid leases
+        count = len(await redis.recover(force=not options.node_id))
+        logging.info('Resuming the crawl, %d unfinished tasks requeued.', count)
+    elif options.clear_tasks:
+        await redis.clear_all()
+
+    count = await add_tasks(redis, seeds)
+    logging.info('Added %d new seeds of %d.', count, len(seeds))
+
+async def main(coordinator=True):
+    """Run the workers. Only the coordinator process prepares the tasks."""
+    # every worker needs two connections, plus one for the supervisor,
+    # one for the admission controller and one for the cluster node
+    required = 2 * options.workers + (3 if options.node_id else 2)
+    if options.redis_connections < required:
+        logging.warning('%d Redis connections is not enough for %d workers, %d required.',
+                        options.redis_connections, options.workers, required)
+    seeds = list(iter_file(SEEDS_CONF))
+    redis_class = setup_redis(seeds)
+    parser = PageParser(options.parse_processes, options.page_parser,
+                        options.lang_detector, options.lang_sample)
+    redis = redis_class()
+    stats = CrawlStats(redis_class(), max_age=options.stats_max_age)
 
     pl_names = plugins.keys()
-    consumers = {
+    consumers = ConsumerPipeline({
         ep.name: ep.load()
         for ep in pkg_resources.iter_entry_points('torspider_consume')
         if ep.name in pl_names
-    }
-
-    if options.clear_tasks:
-        await redis.clear_all()
+    }, queue_size=options.consumer_queue, concurrency=options.consumer_concurrency)
 
-    for seed in iter_file(SEEDS_CONF):
-        await add_task(redis, seed.strip())
-        logging.info('Added seed: %s.', seed)
+    node = await start_node(redis_class)
+    if may_prepare(node, coordinator):
+        await prepare(redis, seeds)
 
+    controller = CrawlController(stats, drain_timeout=options.drain_timeout, redis=redis,
+                                 consumers=consumers)
+    signal.signal(signal.SIGTERM, lambda sig, frame: io_loop.add_callback_from_signal(
+        controller.finish, 'Terminated'))
+    admission = AdmissionController(redis_class(), stats, options.high_water,
+                                    options.low_water or None, options.admission_rate,
+                                    options.admission_burst or None)
+    admission.start()
+    concurrency = None
+    if options.adaptive_workers:
+        concurrency = AdaptiveConcurrency(min(options.min_workers, options.workers),
+                                          options.workers, options.adapt_interval)
+        concurrency.start()
+    configure_client(options.max_clients or options.workers)
+    curl_tuning = CurlTuning(options.reuse_connections, options.tcp_keepalive,
+                             options.tcp_nodelay, options.dns_cache_timeout, options.http2)
     for i in range(options.workers):
-        w = Worker('Worker-%d' % (i+1), consumers=consumers)
-        io_loop.spawn_callback(w)
+        w = Worker('Worker-%d' % (i+1), redis=redis_class(),
+                   consumers=consumers, stats=stats, parser=parser,
+                   concurrency=concurrency, admission=admission,
+                   streaming=options.stream_pages, curl_tuning=curl_tuning)
+        controller.start(w)
 
     logging.info('Waiting...')
-    while True:
-        passed_count = await redis.passed_count()
-        #logging.info('Pages: %d, Tasks: %d', passed_count, tasks_count)
-        if options.max_pages > 0 and passed_count >= options.max_pages:
-            logging.warn('Pages limit (%d) exceeded. Exiting...', options.max_pages)
-            break
-        gen.sleep(5.0)
+    await controller.supervise(options.max_pages)
+    await controller.shutdown()
+    if concurrency is not None:
+        concurrency.stop()
+    admission.stop()
+    await admission.redis.close()
+    await consumers.close(options.drain_timeout)
+    parser.close()
+    await stop_node(node)
+    await stats.redis.close()
+    await redis.close()
 
 
-def run_main():
+async def supervise_processes():
+    """Prepare the tasks, start the crawler processes and wait for the end
+    of the crawl.
+    """
+    seeds = list(iter_file(SEEDS_CONF))
+    redis_class = setup_redis(seeds)
+    redis = redis_class()
+    node = await start_node(redis_class)
+    if may_prepare(node):
+        await prepare(redis, seeds)
+
+    supervisor = ProcessSupervisor(options.processes, run_process, (sys.argv[1:],),
+                                   stats=CrawlStats(redis, max_age=0),
+                                   drain_timeout=options.drain_timeout)
+    for sig, reason in ((signal.SIGTERM, 'Terminated'), (signal.SIGINT, 'Interrupted')):
+        signal.signal(sig, lambda sig, frame, reason=reason: io_loop.add_callback_from_signal(
+            supervisor.finish, reason))
+    supervisor.start()
+    await supervisor.supervise(options.max_pages)
+    await supervisor.shutdown()
+    await stop_node(node)
+    await redis.close()
+
+
+def load_config(args=None):
     parse_config_file(DEFAULT_CONF)
     parse_config_file(LOCAL_CONF)
-    parse_command_line()
+    parse_command_line([sys.argv[0]] + args if args is not None else None)
 
     js = utils.read_json_config(PLUGINS_JSON)
     plugins.update({k: v['config'] for k, v in js.items() if v['enabled']})
 
+
+def run_crawler(coordinator=True):
     process_entry_point('torspider_init')
     try:
-        io_loop.run_sync(main)
+        io_loop.run_sync(partial(main, coordinator))
     except KeyboardInterrupt:
         logging.warning('Interrupted.')
     except Exception as ex:
@@ -96,5 +309,28 @@ def run_main():
         process_entry_point('torspider_done')
 
 
+def run_process(args, index):
+    """Entry point of a crawler process, started by the supervisor."""
+    # Ctrl+C is handled by the supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    load_config(args)
+    if options.node_id:
+        options.node_id = '%s-%d' % (options.node_id, index + 1)
+        options.coordinator = False
+    logging.info('Crawler process %d started.', index + 1)
+    run_crawler(coordinator=False)
+
+
+def run_main():
+    load_config()
+    if options.processes <= 1:
+        run_crawler()
+        return
+    try:
+        io_loop.run_sync(supervise_processes)
+    except Exception as ex:
+        logging.error(ex, exc_info=True)
+
+
 if __name__ == "__main__":
     run_main()
@@ -0,0 +1,122 @@
+'''
+Parse stage: turns fetched responses into page reports, either in the IOLoop
+process, or in a pool of processes, so that the IOLoop only does network I/O.
+'''
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
+from tornado.ioloop import IOLoop
+
+from .scraper import get_page_class
+from . import langs
+
+
+def parse_page(url, body, effective_url, headers, page_parser='soup'):
+    """Parse page in a child process. Arguments are the response parts,
+    headers is a list of (name, value) pairs. Return page.as_dict() report.
+    """
+    res_headers = HTTPHeaders()
+    for k, v in headers:
+        res_headers.add(k, v)
+    res = HTTPResponse(HTTPRequest(url), 200,
+                       headers=res_headers,
+                       buffer=io.BytesIO(body),
+                       effective_url=effective_url)
+    page = get_page_class(page_parser)(url, res)
+    return page.as_dict()
+
+
+class ParseError(Exception):
+    """Page can not be parsed. Keeps the response, if any."""
+    def __init__(self, url, reason, response=None):
+        super(ParseError, self).__init__('%s: parsing failed, %s' % (url, reason))
+        self.response = response
+
+
+class ParsedPage:
+    """Page report received from the parse stage. Has the same attributes
+    as scraper.Page, except for the parsed tree.
+    """
+    def __init__(self, url, report, response=None):
+        self.url = url
+        self.response = response
+        self.report = report
+        self.title = report.get('title')
+        self.text = report.get('text')
+        self.meta = report.get('meta', {})
+        self.language = report.get('language')
+        self.headers = report.get('headers', {})
+        links = report.get('links', {})
+        self.inner = links.get('inner', [])
+        self.outer = links.get('outer', [])
+        self.links = set(self.inner).union(self.outer)
+
+    def partition_links(self):
+        """Return inner and outer links as two separate lists."""
+        return list(self.inner), list(self.outer)
+
+    def as_dict(self):
+        return self.report
+
+
+class PageParser:
+    """Creates pages from responses.
+
+    Arguments:
+        processes : size of the parsing processes pool; if 0, pages are
+                    scraper.Page objects, parsed lazily in the current process
+        page_parser : page implementation name, see scraper.get_page_class
+        lang_detector : language detector name, see langs.get_detector
+        lang_sample : text sample size for language detection, characters
+    """
+    def __init__(self, processes=0, page_parser='soup',
+                 lang_detector='langdetect', lang_sample=langs.SAMPLE_SIZE):
+        self.page_parser = page_parser
+        self.page_class = get_page_class(page_parser)
+        self.processes = processes
+        self.executor = None
+        self.lang_args = (lang_detector, lang_sample)
+        langs.configure(*self.lang_args)
+        if processes > 0:
+            self._start_pool()
+
+    def _start_pool(self):
+        logging.info('Starting %d parsing processes...', self.processes)
+        self.executor = ProcessPoolExecutor(
+            self.processes, mp_context=multiprocessing.get_context('spawn'),
+            initializer=langs.configure, initargs=self.lang_args)
+
+    async def parse(self, url, response):
+        """Return page object for the response. Raise ParseError if the
+        page can not be parsed.
+        """
+        if self.executor is None:
+            try:
+                return self.page_class(url, response)
+            except Exception as ex:
+                raise ParseError(url, repr(ex), response) from ex
+        executor = self.executor
+        try:
+            report = await IOLoop.current().run_in_executor(
+                executor, parse_page,
+                url, response.body, response.effective_url,
+                list(response.headers.get_all()), self.page_parser)
+        except BrokenProcessPool as ex:
+            # a child died; the first worker to notice replaces the pool
+            if self.executor is executor:
+                logging.error('Parsing processes pool is broken, restarting.')
+                executor.shutdown(wait=False)
+                self._start_pool()
+            raise ParseError(url, repr(ex), response) from ex
+        except Exception as ex:
+            raise ParseError(url, repr(ex), response) from ex
+        return ParsedPage(url, report, response)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
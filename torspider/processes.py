@@ -0,0 +1,106 @@
+'''
+Multi-process mode: several crawler processes share the same Redis frontier,
+the parent process supervises them.
+'''
+import logging
+import multiprocessing
+import time
+from datetime import timedelta
+from tornado import gen
+from tornado.locks import Event
+
+from .controller import SUPERVISOR_INTERVAL, DRAIN_TIMEOUT
+
+
+class ProcessSupervisor:
+    """Starts crawler processes and waits for the end of the crawl:
+    the pages limit reached by all of them together, a signal, or the exit
+    of the last child. Then the children still running are terminated
+    (SIGTERM lets them complete the current tasks) and, after
+    `drain_timeout` seconds, killed.
+
+    Arguments:
+        count : number of processes
+        target : function run by a child process, target(*args, index)
+        args : target arguments
+        stats : stats.CrawlStats instance
+        interval : supervisor checks interval, seconds
+        drain_timeout : time given to the children on shutdown, seconds
+    """
+    def __init__(self, count, target, args=(), stats=None,
+                 interval=SUPERVISOR_INTERVAL, drain_timeout=DRAIN_TIMEOUT):
+        self.count = count
+        self.target = target
+        self.args = tuple(args)
+        self.stats = stats
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.context = multiprocessing.get_context('spawn')
+        self.children = []
+        self.exited = set() # names of the reported children
+        self.done = Event()
+        self.reason = None
+
+    @property
+    def alive(self):
+        return [p for p in self.children if p.is_alive()]
+
+    def start(self):
+        for i in range(self.count):
+            p = self.context.Process(target=self.target, args=self.args + (i,),
+                                     name='Crawler-%d' % (i+1))
+            p.start()
+            logging.info('%s started, pid %d.', p.name, p.pid)
+            self.children.append(p)
+
+    def finish(self, reason):
+        """Signal the end of the crawl."""
+        if not self.done.is_set():
+            logging.warning('%s. Stopping...', reason)
+            self.reason = reason
+            self.done.set()
+
+    async def supervise(self, max_pages=0):
+        """Wait for the end of the crawl, logging the total progress every
+        `interval` seconds.
+        """
+        last = (time.monotonic(), None)
+        while not self.done.is_set():
+            try:
+                await self.done.wait(timeout=timedelta(seconds=self.interval))
+            except gen.TimeoutError:
+                pass
+            if self.done.is_set():
+                break
+            for p in self.children:
+                if p.name not in self.exited and not p.is_alive() and p.exitcode:
+                    logging.error('%s exited with code %s.', p.name, p.exitcode)
+                    self.exited.add(p.name)
+            if not self.alive:
+                self.finish('No running processes')
+                break
+            if self.stats is None:
+                continue
+            await self.stats.refresh()
+            now = time.monotonic()
+            if last[1] is not None:
+                rate = (self.stats.passed - last[1]) / (now - last[0])
+                logging.info('%d processes: %d passed, %d pending, %.1f pages/sec.',
+                             len(self.alive), self.stats.passed, self.stats.pending, rate)
+            last = (now, self.stats.passed)
+            if self.stats.limit_reached(max_pages):
+                self.finish('Pages limit (%d) exceeded' % max_pages)
+
+    async def shutdown(self):
+        """Terminate the children, kill those still running after the timeout."""
+        for p in self.alive:
+            p.terminate()
+        deadline = time.monotonic() + self.drain_timeout
+        while self.alive and time.monotonic() < deadline:
+            await gen.sleep(0.1)
+        for p in self.alive:
+            logging.warning('%s is still running, killing.', p.name)
+            p.kill()
+        for p in self.children:
+            p.join()
+        logging.info('All crawler processes stopped.')
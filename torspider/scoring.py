@@ -0,0 +1,78 @@
+'''
+Scoring of pending tasks for the priority frontier.
+
+A scorer is a callable: scorer(url, source), where source is URL of the
+page containing the link, or None for seeds. It returns a number; tasks
+with lower total score are fetched first. Plugins may provide additional
+scorers through `torspider_score` entry point.
+'''
+import logging
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from .urlnorm import get_domain, norm, join_parts
+
+SEED_BONUS = 2.0
+NOVELTY_BONUS = 1.0
+MAX_HOSTS = 100000
+
+
+def path_depth(url, source=None):
+    """Count of non-empty path segments: short paths go first."""
+    return sum(1 for x in urlparse(url).path.split('/') if x)
+
+
+class SeedNeighbours:
+    """Seeds and links found on the seed pages go first. Seeds are
+    normalized, like the tasks, which are passed as source.
+    """
+    def __init__(self, seeds, bonus=SEED_BONUS):
+        self.seeds = set()
+        for seed in seeds:
+            try:
+                self.seeds.add(join_parts(norm(seed)))
+            except Exception as ex:
+                logging.warning(ex)
+        self.bonus = bonus
+
+    def __call__(self, url, source=None):
+        if source is None:
+            return -2 * self.bonus
+        if source in self.seeds:
+            return -self.bonus
+        return 0
+
+
+class DomainNovelty:
+    """Links to hosts, which were not seen by this process yet, go first.
+    At most max_hosts recently seen hosts are remembered.
+    """
+    def __init__(self, bonus=NOVELTY_BONUS, max_hosts=MAX_HOSTS):
+        self.bonus = bonus
+        self.max_hosts = max_hosts
+        self.hosts = OrderedDict()
+
+    def __call__(self, url, source=None):
+        host = get_domain(url)
+        if host in self.hosts:
+            self.hosts.move_to_end(host)
+            return 0
+        self.hosts[host] = True
+        if len(self.hosts) > self.max_hosts:
+            self.hosts.popitem(last=False)
+        return -self.bonus
+
+
+class Scorer:
+    """Sum of the given scorers results. A failing scorer counts as 0."""
+    def __init__(self, scorers):
+        self.scorers = list(scorers)
+
+    def __call__(self, url, source=None):
+        score = 0
+        for f in self.scorers:
+            try:
+                score += f(url, source)
+            except Exception as ex:
+                logging.error('Scorer %s failed on <%s>: %s', f, url, ex)
+        return score
@@ -1,20 +1,19 @@
+import io
 import logging
 import re
-from urllib.parse import urlparse, urlunparse
-from itertools import tee, filterfalse
+from urllib.parse import urlunparse
 
 
+import pycurl
 from dateutil.parser import parse as parse_datetime
-from bs4 import BeautifulSoup as Soup, Comment
-from langdetect import detect
+from bs4 import BeautifulSoup as Soup, Tag, NavigableString, CData
 
 from tornado import httpclient
 from tornado.httputil import HTTPHeaders
 from tornado.options import options
 
-from torspider.urlnorm import norm, join_parts, get_domain
-
-from langdetect.lang_detect_exception import LangDetectException
+from torspider.urlnorm import norm, norm_many, get_domain
+from torspider import langs
 
 ALLOW_SCHEMES = ('http', 'https')
 ALLOWED_TYPES = ('text/html')
@@ -34,14 +33,117 @@ DEFAULT_HEADERS = HTTPHeaders({
     'Accept-Language': 'ru, en;q=0.7',
 })
 
-httpclient.AsyncHTTPClient.configure(
-    "tornado.curl_httpclient.CurlAsyncHTTPClient",
-    defaults=dict(user_agent=DEFAULT_AGENT)
-)
+MAX_CLIENTS = 10 # concurrent transfers
+DNS_CACHE_TIMEOUT = 300 # seconds
+# curl timings reported for every page, seconds from the request start
+TIMING_KEYS = ('namelookup', 'connect', 'starttransfer', 'total')
+
+
+def configure_client(max_clients=MAX_CLIENTS):
+    """Configure the curl client: max_clients transfers at a time, further
+    requests wait in the client queue. Call before the first HTTPClient
+    is created.
+    """
+    httpclient.AsyncHTTPClient.configure(
+        "tornado.curl_httpclient.CurlAsyncHTTPClient",
+        max_clients=max_clients,
+        defaults=dict(user_agent=DEFAULT_AGENT)
+    )
+
+configure_client()
+
+
+def http2_supported():
+    return bool(pycurl.version_info()[4] & pycurl.VERSION_HTTP2)
+
+
+def get_timing(response):
+    """Timing breakdown of the request from curl info, seconds."""
+    info = getattr(response, 'time_info', None) or {}
+    return {k: info[k] for k in TIMING_KEYS if k in info}
+
+
+class CurlTuning:
+    """Options of the curl handles, set before every request (the client
+    resets handles after each one); use as prepare_curl_callback.
+
+    Arguments:
+        reuse_connections : reuse connections (to the proxy, if any) between
+                            requests, as libcurl does by default; if False,
+                            every request opens a new one
+        tcp_keepalive : send TCP keepalive probes on idle connections
+        tcp_nodelay : disable Nagle's algorithm
+        dns_cache_timeout : time resolved names are kept, seconds
+        http2 : negotiate HTTP/2 with HTTPS servers, if libcurl supports it
+    """
+    def __init__(self, reuse_connections=True, tcp_keepalive=True, tcp_nodelay=True,
+                 dns_cache_timeout=DNS_CACHE_TIMEOUT, http2=False):
+        self.options = [
+            (pycurl.TCP_KEEPALIVE, int(tcp_keepalive)),
+            (pycurl.TCP_NODELAY, int(tcp_nodelay)),
+            (pycurl.DNS_CACHE_TIMEOUT, dns_cache_timeout),
+        ]
+        if not reuse_connections:
+            self.options.append((pycurl.FORBID_REUSE, 1))
+            self.options.append((pycurl.FRESH_CONNECT, 1))
+        if http2:
+            if http2_supported():
+                self.options.append((pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS))
+            else:
+                logging.warning('libcurl is built without HTTP/2 support.')
+
+    def __call__(self, curl):
+        for option, value in self.options:
+            curl.setopt(option, value)
 
 
 # remove these tags, complete with contents.
 SKIP_TAGS = ("script", "style", "form", "input")
+# text nodes, comments and other special strings are not included
+TEXT_TYPES = (NavigableString, CData)
+# any whitespace run, or a dot surrounded by whitespace
+SPACES_RE = re.compile(r'\s+\.\s+|\s+')
+
+
+def _iter_strings(root):
+    """Text strings of the tree, except those inside SKIP_TAGS.
+    The tree is neither modified nor copied.
+    """
+    stack = [iter(root.contents)]
+    while stack:
+        for node in stack[-1]:
+            if isinstance(node, Tag):
+                if node.name.lower() not in SKIP_TAGS:
+                    stack.append(iter(node.contents))
+                    break
+            elif type(node) in TEXT_TYPES:
+                yield node
+        else:
+            stack.pop()
+
+
+def _collapse_spaces(match):
+    s = match.group()
+    if len(s) == 1:
+        return s
+    if '.' in s:
+        return '. '
+    return ' '
+
+
+def collapse_spaces(text):
+    """Collapse whitespace in one pass: a run of two or more spaces becomes
+    a single space, a space-surrounded dot becomes '. ', single newlines
+    are kept.
+    """
+    return SPACES_RE.sub(_collapse_spaces, text).strip()
+
+
+def extract_text(root):
+    """Plain text of a parsed tree with collapsed whitespace."""
+    if root is None:
+        return ''
+    return collapse_spaces(' '.join(_iter_strings(root)))
 
 
 def is_inner_link(url, page):
@@ -67,6 +169,7 @@ class Page():
         self._text = None
         self._language = None
         self._links = None
+        self._link_hosts = None
         self._headers = None
 
     @property
@@ -120,70 +223,52 @@ class Page():
             self._meta = {k: v for k, v in self._iter_meta()}
         return self._meta
 
-    def _sanitize(self, soup):
-        # now strip HTML we don't like.
-        for tag in soup.findAll():
-            if tag.name.lower() in SKIP_TAGS:
-                # blacklisted tags are removed in their entirety
-                tag.extract()
-
-        # scripts can be executed from comments in some cases
-        comments = soup.findAll(text=lambda text:isinstance(text, Comment))
-        for com in comments:
-            com.extract()
-
     @property
     def text(self):
         """Page text converted to markup format."""
         if self._text is None:
-            #doc = Document(str(self.soup.body))
-            body = Soup(str(self.soup.body), 'lxml')
-            self._sanitize(body)
-            self._text = body.get_text(' ')
-            self._text = re.sub(r'\s{2,}', ' ', self._text)
-            self._text = re.sub(r'\s*\n\s*', '\n', self._text)
-            self._text = re.sub(r'\n{2,}', '\n', self._text)
-            self._text = re.sub(r'\s+\.\s+', '. ', self._text)
-            self._text = self._text.strip()
-
-            #self._text = html2text(str(self.soup.body))
+            self._text = extract_text(self.soup.body)
         return self._text
 
+    @property
+    def html_lang(self):
+        """lang attribute of <html> element, if any."""
+        if self.soup.html is not None:
+            return self.soup.html.get('lang')
+        return None
+
     @property
     def language(self):
-        """Detected page language."""
+        """Declared or detected page language, see langs module."""
         if self._language is None:
-            try:
-                self._language = detect(self.text)
-            except LangDetectException as ex:
-                logging.error(ex)
-                self._language = 'UNKNOWN'
+            self._language = langs.detect(self)
         return self._language
 
-    def _iter_links(self):
-        domain = urlparse(self.base)[1]
+    def _iter_hrefs(self):
         for a in self.soup.find_all('a', href=True):
-            try:
-                url = norm(a['href'], domain)
-                if not url[0] in ALLOW_SCHEMES:
-                    logging.debug('Skipping scheme <%s>', url[0])
-                else:
-                    yield join_parts(url)
-            except Exception as ex:
-                logging.warn(ex)
+            yield a['href']
+
+    @property
+    def link_hosts(self):
+        """Dictionary of normalized links found on the page and their hosts."""
+        if self._link_hosts is None:
+            self._link_hosts = dict(norm_many(self._iter_hrefs(), self.base, ALLOW_SCHEMES))
+        return self._link_hosts
 
     @property
     def links(self):
         """Set of normalized links found inside the page <body>."""
         if self._links is None:
-            self._links = {url for url in self._iter_links()}
+            self._links = set(self.link_hosts)
         return self._links
 
     def partition_links(self):
         """Return inner and outer links as two separate lists."""
-        t1, t2 = tee(self.links)
-        pred = lambda x: is_inner_link(x, self)
-        return list(filter(pred, t1)), list(filterfalse(pred, t2))
+        domain = get_domain(self.base)
+        inner, outer = [], []
+        for url, host in self.link_hosts.items():
+            (inner if host == domain else outer).append(url)
+        return inner, outer
 
     def _parse_header(self, k, v):
         lk = k.lower()
@@ -227,12 +312,97 @@ class Page():
         return report
 
 
+def get_page_class(name):
+    """Page implementation by name: 'soup' (BeautifulSoup tree, default)
+    or 'lxml' (faster, lxml.html tree).
+    """
+    if name == 'soup':
+        return Page
+    if name == 'lxml':
+        from .lxmlpage import LxmlPage
+        return LxmlPage
+    raise ValueError('Unknown page parser: %s' % name)
+
+
+class StreamingFetch:
+    """State of a streamed transfer. Headers are validated as soon as they
+    arrive, the body size is checked while it is downloaded; when anything
+    is wrong, the transfer is aborted by libcurl progress callback.
+
+    Arguments:
+        validate : function, raising AssertionError on illegal headers
+        max_size : body size limit, bytes
+        prepare : optional prepare_curl_callback of the request
+    """
+    def __init__(self, validate, max_size=MAX_CONTENT_SIZE * 1024, prepare=None):
+        self.validate = validate
+        self.max_size = max_size
+        self.prepare = prepare
+        self.headers = HTTPHeaders()
+        self.code = None
+        self.chunks = []
+        self.received = 0
+        self.error = None
+
+    def on_header(self, line):
+        if line.startswith('HTTP/'):
+            # a new response in the redirects chain
+            self.headers = HTTPHeaders()
+            self.code = int(line.split()[1])
+        elif line.strip():
+            self.headers.parse_line(line)
+        elif self.code is not None and not (100 <= self.code < 200 or 300 <= self.code < 400):
+            try:
+                self.validate(self.headers)
+            except AssertionError as ex:
+                self.error = str(ex)
+
+    def on_chunk(self, chunk):
+        self.chunks.append(chunk)
+
+    def on_progress(self, dltotal, dlnow, ultotal, ulnow):
+        self.received = dlnow
+        if self.error is None and dlnow > self.max_size:
+            self.error = 'Content size exceeds %dKb' % (self.max_size // 1024)
+        return 1 if self.error else 0
+
+    def prepare_curl(self, curl):
+        if self.prepare is not None:
+            self.prepare(curl)
+        curl.setopt(pycurl.NOPROGRESS, 0)
+        curl.setopt(pycurl.XFERINFOFUNCTION, self.on_progress)
+
+    @property
+    def saved(self):
+        """Bytes, which were not downloaded due to the abort, if known."""
+        h = self.headers.get('Content-Length')
+        if h and h.isdigit():
+            return max(int(h) - self.received, 0)
+        return 0
+
+    def response(self, res):
+        """Response with the streamed body."""
+        return httpclient.HTTPResponse(
+            res.request, res.code, reason=res.reason, headers=res.headers,
+            buffer=io.BytesIO(b''.join(self.chunks)),
+            effective_url=res.effective_url,
+            request_time=res.request_time, time_info=res.time_info)
+
+
 class HTTPClient:
     """Asyncroneous HTTP client.
+
+    Arguments:
+        streaming : validate headers and body size while the response is
+                    downloaded, aborting illegal transfers
+        curl_tuning : optional CurlTuning instance
     """
-    def __init__(self):
+    def __init__(self, streaming=False, curl_tuning=None):
         self.client = httpclient.AsyncHTTPClient()
+        self.streaming = streaming
         self.req_options = dict(headers = DEFAULT_HEADERS)
+        if curl_tuning is not None:
+            self.req_options['prepare_curl_callback'] = curl_tuning
         if options.proxy:
             logging.debug('Using proxy: %s', options.proxy)
             h, p = options.proxy.split(':')
@@ -265,6 +435,29 @@ class HTTPClient:
             assert v <= MAX_CONTENT_SIZE, 'Content size %d exceeds %dKb' % (v, MAX_CONTENT_SIZE)
         logging.debug('Headers OK.')
 
+    def on_abort(self, url, reason, saved):
+        """Called when a streamed transfer is aborted; saved is count of
+        bytes, which were not downloaded, if known, otherwise 0.
+        """
+        logging.info('%s: aborted, %s', url, reason)
+
+    async def _fetch_streaming(self, url, req_options):
+        req_options = dict(req_options)
+        fetch = StreamingFetch(self._validate_headers,
+                               prepare=req_options.pop('prepare_curl_callback', None))
+        req = httpclient.HTTPRequest(url,
+                                     header_callback=fetch.on_header,
+                                     streaming_callback=fetch.on_chunk,
+                                     prepare_curl_callback=fetch.prepare_curl,
+                                     **req_options)
+        try:
+            res = await self.client.fetch(req)
+        except httpclient.HTTPError:
+            if fetch.error is None:
+                raise
+            self.on_abort(url, fetch.error, fetch.saved)
+            raise AssertionError(fetch.error)
+        return fetch.response(res)
 
     async def visit(self, url, count=0):
         logging.debug('Fetching %s...', url)
@@ -275,7 +468,10 @@ class HTTPClient:
             if count > 1:
                 return self.visit(url.encode('idna'), count=count+1)
         else:
-            res = await self.client.fetch(req)
+            if self.streaming:
+                res = await self._fetch_streaming(url, self.req_options)
+            else:
+                res = await self.client.fetch(req)
             logging.info('%s: %s - %s', res.effective_url, res.code, res.reason)
             self._validate_headers(res.headers)
             return res
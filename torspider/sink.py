@@ -0,0 +1,194 @@
+'''
+Built-in batching sink plugin: saves page reports in bulk to a local
+JSON lines file or SQLite database.
+
+Enable it in plugins.json:
+
+    "sink": {
+        "enabled": true,
+        "config": {"path": "reports.jsonl", "batch_size": 100, "flush_interval": 5.0}
+    }
+
+Paths ending with .db, .sqlite or .sqlite3 are SQLite databases.
+Reports buffered at the moment of shutdown are written by `torspider_done`
+hook; a batch is dropped from the buffer only after it has been written,
+so every report is saved at least once.
+'''
+import os
+import json
+import time
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.locks import Lock
+
+BATCH_SIZE = 100 # reports
+FLUSH_INTERVAL = 5.0 # seconds
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def serialize(report):
+    """Report as a JSON-compatible dictionary: page is replaced with
+    its as_dict() data.
+    """
+    data = {'url': report['url'], 'time': time.time()}
+    if 'error' in report:
+        data['error'] = report['error']
+    if 'page' in report:
+        data.update(report['page'].as_dict())
+    if report.get('timing'):
+        data['timing'] = report['timing']
+    return data
+
+
+def to_json(data):
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class JsonLinesTarget:
+    """Appends reports to a file, one JSON object per line."""
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, records):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(to_json(r) + '\n' for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        pass
+
+
+class SQLiteTarget:
+    """Inserts reports to `reports` table of SQLite database."""
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS reports '
+            '(id INTEGER PRIMARY KEY, url TEXT, time REAL, report TEXT)')
+        self.db.commit()
+
+    def write(self, records):
+        with self.db:
+            self.db.executemany(
+                'INSERT INTO reports (url, time, report) VALUES (?, ?, ?)',
+                [(r['url'], r['time'], to_json(r)) for r in records])
+
+    def close(self):
+        self.db.close()
+
+
+def make_target(path):
+    if path.endswith(SQLITE_EXTENSIONS):
+        return SQLiteTarget(path)
+    return JsonLinesTarget(path)
+
+
+class BatchingSink:
+    """Consumer accumulating reports and writing them in bulk, as soon as
+    batch_size reports are collected, or the oldest of them has waited
+    flush_interval seconds. Writes are done one by one in a separate thread,
+    not to block the IOLoop. Reports stay in the buffer until they are
+    written, so a write interrupted by shutdown is repeated by `close`.
+
+    Arguments:
+        target : object with write(records) and close() methods
+        batch_size : reports count triggering a write
+        flush_interval : maximal time a report may stay in the buffer, seconds
+    """
+    def __init__(self, target, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.target = target
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.oldest = None
+        self.written = 0
+        self.batches = 0
+        self._timer = None
+        self._executor = ThreadPoolExecutor(1)
+        self._lock = Lock() # one write at a time
+
+    async def __call__(self, report):
+        self.add(serialize(report))
+        if self._timer is None and self.flush_interval > 0:
+            self._timer = PeriodicCallback(self._on_timer, self.flush_interval * 1000 / 2)
+            self._timer.start()
+        if len(self.buffer) >= self.batch_size:
+            await self.flush()
+
+    def add(self, record):
+        if not self.buffer:
+            self.oldest = time.monotonic()
+        self.buffer.append(record)
+
+    @property
+    def expired(self):
+        return bool(self.buffer) and time.monotonic() - self.oldest >= self.flush_interval
+
+    async def _on_timer(self):
+        if self.expired:
+            await self.flush()
+
+    def _written(self, batch):
+        # reports added during the write follow the batch in the buffer
+        del self.buffer[:len(batch)]
+        self.oldest = time.monotonic() if self.buffer else None
+        self.written += len(batch)
+        self.batches += 1
+
+    async def flush(self):
+        """Write the buffered reports."""
+        async with self._lock:
+            batch = list(self.buffer)
+            if not batch:
+                return
+            try:
+                await IOLoop.current().run_in_executor(self._executor, self.target.write, batch)
+            except Exception as ex:
+                logging.error('Failed to write %d reports: %s', len(batch), ex)
+            else:
+                self._written(batch)
+
+    def close(self):
+        """Stop the timer, write the rest of the reports synchronously and
+        close the target.
+        """
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        self._executor.shutdown(wait=True)
+        batch = list(self.buffer)
+        if batch:
+            try:
+                self.target.write(batch)
+            except Exception as ex:
+                logging.error('Failed to write %d reports: %s', len(batch), ex)
+                raise
+            self._written(batch)
+        self.target.close()
+        logging.info('Sink: %d reports written in %d batches.', self.written, self.batches)
+
+
+# Plugin entry points
+
+_sink = None
+
+
+def init(path='reports.jsonl', batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, **kwargs):
+    global _sink
+    logging.info('Saving reports to %s...', path)
+    _sink = BatchingSink(make_target(path), batch_size, flush_interval)
+
+
+async def consume(report):
+    await _sink(report)
+
+
+def done(**kwargs):
+    global _sink
+    if _sink is not None:
+        _sink.close()
+        _sink = None
@@ -0,0 +1,74 @@
+'''
+Crawl statistics, shared by all workers of a process.
+'''
+import logging
+import time
+from tornado import gen
+
+STATS_MAX_AGE = 1.0 # seconds
+
+
+class CrawlStats:
+    """Cached passed and pending tasks counts.
+
+    Workers read the counters as plain attributes. The values are fetched
+    from Redis at most once per `max_age` seconds, whatever the number of
+    workers is; between the refreshes pages passed and tasks registered by
+    this process are counted locally.
+
+    Arguments:
+        redis : tasks.RedisClient instance
+        max_age : staleness bound, seconds
+    """
+    def __init__(self, redis, max_age=STATS_MAX_AGE):
+        self.redis = redis
+        self.max_age = max_age
+        self.passed = 0
+        self.pending = 0
+        self.updated = None
+        self._refreshing = None
+        # streamed transfers aborted by this process
+        self.aborted = 0
+        self.bytes_saved = 0
+
+    @property
+    def is_stale(self):
+        return self.updated is None or time.monotonic() - self.updated > self.max_age
+
+    def add_passed(self, count=1):
+        """Count tasks, passed by this process."""
+        self.passed += count
+
+    def add_pending(self, count=1):
+        """Count tasks, registered by this process."""
+        self.pending += count
+
+    def add_aborted(self, saved=0):
+        """Count aborted transfer and bytes, which were not downloaded."""
+        self.aborted += 1
+        self.bytes_saved += saved
+
+    def limit_reached(self, max_pages):
+        """True if max_pages limit is set and reached."""
+        return max_pages > 0 and self.passed >= max_pages
+
+    async def refresh(self):
+        """Fetch the counters from Redis."""
+        self.passed, self.pending = await self.redis.counts()
+        self.updated = time.monotonic()
+        logging.debug('Passed: %d, pending: %d', self.passed, self.pending)
+
+    async def ensure_fresh(self):
+        """Refresh the counters if they are stale. Concurrent callers share
+        the same request.
+        """
+        if not self.is_stale:
+            return
+        if self._refreshing is None:
+            self._refreshing = gen.convert_yielded(self.refresh())
+            try:
+                await self._refreshing
+            finally:
+                self._refreshing = None
+        else:
+            await self._refreshing
@@ -1,7 +1,14 @@
+import json
 import logging
-from functools import wraps
+import time
+from hashlib import sha1
+from functools import wraps, lru_cache
 from tornado import gen
 from tornadoredis import ConnectionPool, Client
+from tornadoredis.exceptions import ResponseError, ConnectionError
+
+from .bloom import BloomFilter
+from .urlnorm import get_domain, get_first_level_domain
 
 MAX_CONNECTIONS = 200
 
@@ -10,22 +17,435 @@ PENDING_S = 'torspider:pending_set'
 WORKING_S = 'torspider:working_set'
 SUCCESS_S = 'torspider:success_set'
 FAILURE_S = 'torspider:failure_set'
+LEASES_Z = 'torspider:leases_zset'
+LEASE_TIME = 300.0 # seconds
+# Cluster mode structures
+NODES_S = 'torspider:nodes_set'
+TASK_NODES_H = 'torspider:task_nodes_hash'
+HEARTBEAT_PREFIX = 'torspider:node_heartbeat:'
+COORDINATOR_K = 'torspider:coordinator'
+NODE_TIMEOUT = 30.0 # seconds
+# Seen-index mode structures
+SEEN_BF = 'torspider:seen_bloom'
+SUCCESS_N = 'torspider:success_cnt'
+FAILURE_N = 'torspider:failure_cnt'
+SEEN_CAPACITY = 10 ** 7
+SEEN_ERROR_RATE = 0.001
+
+# Host-aware frontier structures
+HOSTS_Z = 'torspider:hosts_zset'
+HOSTS_ACTIVE_H = 'torspider:hosts_active_hash'
+HOST_Q_PREFIX = 'torspider:host_lst:'
+HOST_DELAY = 1.0 # seconds
+HOST_CONCURRENCY = 2
+POLL_INTERVAL = 0.5 # seconds
+
+# Priority frontier structures
+PENDING_Z = 'torspider:pending_zset'
+FANIN_BONUS = 1.0
+
+FIFO_FRONTIER = 'fifo'
+HOST_FRONTIER = 'host'
+PRIORITY_FRONTIER = 'priority'
+FRONTIERS = (FIFO_FRONTIER, HOST_FRONTIER, PRIORITY_FRONTIER)
+
+# Links deferred by the admission controller
+SPILL_Q = 'torspider:spill_lst'
+
+# RedisClient.setup arguments naming the keys, see key_names
+KEY_PREFIX = 'torspider:'
+KEYS = dict(
+    pending_q=PENDING_Q,
+    pending_s=PENDING_S,
+    working_s=WORKING_S,
+    success_s=SUCCESS_S,
+    failure_s=FAILURE_S,
+    leases_z=LEASES_Z,
+    nodes_s=NODES_S,
+    task_nodes_h=TASK_NODES_H,
+    heartbeat_prefix=HEARTBEAT_PREFIX,
+    coordinator_k=COORDINATOR_K,
+    seen_bf=SEEN_BF,
+    success_n=SUCCESS_N,
+    failure_n=FAILURE_N,
+    hosts_z=HOSTS_Z,
+    hosts_active_h=HOSTS_ACTIVE_H,
+    host_q_prefix=HOST_Q_PREFIX,
+    pending_z=PENDING_Z,
+    spill_q=SPILL_Q,
+)
+
+# Maximal number of tasks passed to a script in one call
+SCRIPT_CHUNK = 1000
+
+# KEYS: PENDING queue, PENDING, WORKING, SUCCESS and FAILURE sets,
+#       Bloom filter bitmap, hosts sorted set, PENDING sorted set.
+# ARGV: number of Bloom filter hashes, k (0 in sets mode),
+#       frontier mode, current time, host queues prefix, fan-in bonus,
+#       then every task followed by its host, score and k bit offsets.
+# Every unknown task is registered as pending. In sets mode a task is
+# unknown if it is not a member of any set, in seen-index mode -- if any of
+# its bits is not set.
+# FIFO frontier: all new tasks are pushed to PENDING queue with a single
+# LPUSH. Host frontier: a task is pushed to its host queue, the host is
+# added to the hosts set, scored by time when it is ready for a fetch.
+# Priority frontier: a task is added to PENDING sorted set with its score;
+# score of a known task, which is still pending, is decreased by the
+# fan-in bonus.
+# Returns list of the newly registered tasks.
+PUT_NEW_TASKS_SCRIPT = '''
+local k = tonumber(ARGV[1])
+local mode = ARGV[2]
+local now = ARGV[3]
+local prefix = ARGV[4]
+local fanin = tonumber(ARGV[5])
+local added = {}
+local seen = {}
+for i = 6, #ARGV, k + 3 do
+    local task = ARGV[i]
+    local new = not seen[task]
+    if new and k > 0 then
+        new = false
+        for j = i + 3, i + k + 2 do
+            if redis.call('GETBIT', KEYS[6], ARGV[j]) == 0 then
+                new = true
+                break
+            end
+        end
+        if new then
+            for j = i + 3, i + k + 2 do
+                redis.call('SETBIT', KEYS[6], ARGV[j], 1)
+            end
+        end
+    elseif new then
+        new = redis.call('SISMEMBER', KEYS[2], task) == 0
+            and redis.call('SISMEMBER', KEYS[3], task) == 0
+            and redis.call('SISMEMBER', KEYS[4], task) == 0
+            and redis.call('SISMEMBER', KEYS[5], task) == 0
+    end
+    if new then
+        added[#added + 1] = task
+        if mode == 'host' then
+            local host = ARGV[i + 1]
+            redis.call('LPUSH', prefix .. host, task)
+            redis.call('ZADD', KEYS[7], 'NX', now, host)
+        elseif mode == 'priority' then
+            redis.call('ZADD', KEYS[8], ARGV[i + 2], task)
+        end
+    elseif mode == 'priority' and fanin ~= 0 and not seen[task] then
+        if redis.call('ZSCORE', KEYS[8], task) then
+            redis.call('ZINCRBY', KEYS[8], -fanin, task)
+        end
+    end
+    seen[task] = true
+end
+if #added > 0 then
+    redis.call('SADD', KEYS[2], unpack(added))
+    if mode == 'fifo' then
+        redis.call('LPUSH', KEYS[1], unpack(added))
+    end
+end
+return added
+'''
+
+# KEYS: PENDING sorted set, PENDING and WORKING sets, leases sorted set,
+#       task nodes hash.
+# ARGV: lease deadline, node ID ('' if not in cluster mode).
+# Pop the task with minimal score and move it to WORKING set.
+# Returns the task or nil, if there are no pending tasks.
+GET_PRIORITY_TASK_SCRIPT = '''
+local items = redis.call('ZRANGE', KEYS[1], 0, 0)
+if #items == 0 then
+    return nil
+end
+local task = items[1]
+redis.call('ZREM', KEYS[1], task)
+redis.call('SREM', KEYS[2], task)
+redis.call('SADD', KEYS[3], task)
+redis.call('ZADD', KEYS[4], ARGV[1], task)
+if ARGV[2] ~= '' then
+    redis.call('HSET', KEYS[5], task, ARGV[2])
+end
+return task
+'''
+
+# KEYS: hosts sorted set, hosts active fetches hash, PENDING and WORKING sets,
+#       leases sorted set, task nodes hash.
+# ARGV: current time, host delay, host concurrency, host queues prefix,
+#       lease deadline, node ID ('' if not in cluster mode).
+# Take a task from the queue of the host, which has been ready for a fetch
+# longer than others, and move the task to WORKING set. The host will be
+# ready again after the delay, or, when its concurrency limit is reached,
+# after completion of a fetch.
+# Returns the task or nil, if no host is ready.
+GET_HOST_TASK_SCRIPT = '''
+local now = tonumber(ARGV[1])
+for _ = 1, 16 do
+    local hosts = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, 1)
+    if #hosts == 0 then
+        return nil
+    end
+    local host = hosts[1]
+    local active = tonumber(redis.call('HGET', KEYS[2], host) or 0)
+    if active >= tonumber(ARGV[3]) then
+        redis.call('ZADD', KEYS[1], '+inf', host)
+    else
+        local task = redis.call('RPOP', ARGV[4] .. host)
+        if task then
+            redis.call('HINCRBY', KEYS[2], host, 1)
+            if active + 1 >= tonumber(ARGV[3]) then
+                redis.call('ZADD', KEYS[1], '+inf', host)
+            else
+                redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), host)
+            end
+            redis.call('SREM', KEYS[3], task)
+            redis.call('SADD', KEYS[4], task)
+            redis.call('ZADD', KEYS[5], ARGV[5], task)
+            if ARGV[6] ~= '' then
+                redis.call('HSET', KEYS[6], task, ARGV[6])
+            end
+            return task
+        end
+        redis.call('ZREM', KEYS[1], host)
+    end
+end
+return nil
+'''
+
+# KEYS: hosts sorted set, hosts active fetches hash.
+# ARGV: host, current time, host delay.
+# Register completion of a fetch. If the host was blocked by its
+# concurrency limit, it becomes ready after the delay.
+RELEASE_HOST_SCRIPT = '''
+if redis.call('HINCRBY', KEYS[2], ARGV[1], -1) <= 0 then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score == 'inf' then
+    redis.call('ZADD', KEYS[1], tonumber(ARGV[2]) + tonumber(ARGV[3]), ARGV[1])
+end
+return 1
+'''
+
+# KEYS: leases sorted set, WORKING and PENDING sets, PENDING queue,
+#       hosts sorted set, hosts active fetches hash, PENDING sorted set,
+#       task nodes hash.
+# ARGV: current time, frontier mode, host queues prefix, force flag,
+#       then every task followed by its host and node ('' -- any node).
+# Return to the frontier those of the given tasks, which are in WORKING set,
+# are held by the given node, and whose lease has expired or is missing
+# (or regardless of the lease, if the force flag is '1'). Requeued tasks
+# will be taken first.
+# Returns list of the requeued tasks.
+REQUEUE_TASKS_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local mode = ARGV[2]
+local requeued = {}
+for i = 5, #ARGV, 3 do
+    local task = ARGV[i]
+    local deadline = redis.call('ZSCORE', KEYS[1], task)
+    local working = redis.call('SISMEMBER', KEYS[2], task) == 1
+    local owned = ARGV[i + 2] == '' or redis.call('HGET', KEYS[8], task) == ARGV[i + 2]
+    if working and owned and (ARGV[4] == '1' or not deadline or tonumber(deadline) <= now) then
+        redis.call('ZREM', KEYS[1], task)
+        redis.call('HDEL', KEYS[8], task)
+        redis.call('SREM', KEYS[2], task)
+        redis.call('SADD', KEYS[3], task)
+        if mode == 'fifo' then
+            redis.call('RPUSH', KEYS[4], task)
+        elseif mode == 'host' then
+            local host = ARGV[i + 1]
+            redis.call('RPUSH', ARGV[3] .. host, task)
+            if redis.call('HINCRBY', KEYS[6], host, -1) <= 0 then
+                redis.call('HDEL', KEYS[6], host)
+            end
+            local score = redis.call('ZSCORE', KEYS[5], host)
+            if not score or score == 'inf' then
+                redis.call('ZADD', KEYS[5], now, host)
+            end
+        else
+            redis.call('ZADD', KEYS[7], '-inf', task)
+        end
+        requeued[#requeued + 1] = task
+    elseif not working then
+        redis.call('ZREM', KEYS[1], task)
+        redis.call('HDEL', KEYS[8], task)
+    end
+end
+return requeued
+'''
+
+# KEYS: WORKING set, leases sorted set, target set, target counter,
+#       task nodes hash.
+# ARGV: task, lease deadline ('' -- any), seen-index flag.
+# Register a finished task, unless it has left WORKING set or has been
+# leased again since: its lease expired and the task was requeued, perhaps
+# taken by another worker. In seen-index mode the counter is incremented,
+# otherwise the task is added to the target set.
+# Returns 1 if the task is registered, 0 otherwise.
+REGISTER_DONE_SCRIPT = '''
+local task = ARGV[1]
+if redis.call('SISMEMBER', KEYS[1], task) == 0 then
+    return 0
+end
+if ARGV[2] ~= '' then
+    local deadline = redis.call('ZSCORE', KEYS[2], task)
+    if not deadline or tonumber(deadline) ~= tonumber(ARGV[2]) then
+        return 0
+    end
+end
+redis.call('SREM', KEYS[1], task)
+redis.call('ZREM', KEYS[2], task)
+redis.call('HDEL', KEYS[5], task)
+if ARGV[3] == '1' then
+    redis.call('INCR', KEYS[4])
+else
+    redis.call('SADD', KEYS[3], task)
+end
+return 1
+'''
+
+# KEYS: nodes set, node heartbeat key, coordinator key.
+# ARGV: node ID, current time, node timeout in milliseconds, coordinator flag.
+# Register the node and renew its heartbeat key. A node with the coordinator
+# flag becomes the coordinator, unless another node holds the role.
+# Returns ID of the coordinator node or nil.
+HEARTBEAT_SCRIPT = '''
+redis.call('SADD', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], ARGV[2], 'PX', ARGV[3])
+local coordinator = redis.call('GET', KEYS[3])
+if ARGV[4] == '1' and (not coordinator or coordinator == ARGV[1]) then
+    redis.call('SET', KEYS[3], ARGV[1], 'PX', ARGV[3])
+    coordinator = ARGV[1]
+end
+return coordinator
+'''
+
+# KEYS: nodes set, node heartbeat key, coordinator key.
+# ARGV: node ID.
+# Unregister the node, give up the coordinator role.
+UNREGISTER_NODE_SCRIPT = '''
+redis.call('SREM', KEYS[1], ARGV[1])
+redis.call('DEL', KEYS[2])
+if redis.call('GET', KEYS[3]) == ARGV[1] then
+    redis.call('DEL', KEYS[3])
+end
+return 1
+'''
+
+# KEYS: nodes set, task nodes hash.
+# ARGV: heartbeat keys prefix.
+# Find working tasks of the nodes, whose heartbeat keys have expired,
+# unregister such nodes.
+# Returns flat list of the tasks, every one followed by its node.
+DEAD_NODES_SCRIPT = '''
+local alive = {}
+local tasks = {}
+local items = redis.call('HGETALL', KEYS[2])
+for i = 1, #items, 2 do
+    local node = items[i + 1]
+    if alive[node] == nil then
+        alive[node] = redis.call('EXISTS', ARGV[1] .. node) == 1
+    end
+    if not alive[node] then
+        tasks[#tasks + 1] = items[i]
+        tasks[#tasks + 1] = node
+    end
+end
+for _, node in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if redis.call('EXISTS', ARGV[1] .. node) == 0 then
+        redis.call('SREM', KEYS[1], node)
+    end
+end
+return tasks
+'''
+
+# KEYS: spill queue.
+# ARGV: maximal number of entries.
+# Pop the oldest entries of the spill queue.
+# Returns list of the entries, the oldest last.
+POP_SPILLED_SCRIPT = '''
+local items = redis.call('LRANGE', KEYS[1], -tonumber(ARGV[1]), -1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], 0, -#items - 1)
+end
+return items
+'''
+
+# KEYS: hosts sorted set, hosts active fetches hash.
+# ARGV: host queues prefix.
+# Delete host frontier structures.
+CLEAR_HOSTS_SCRIPT = '''
+for _, host in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    redis.call('DEL', ARGV[1] .. host)
+end
+return redis.call('DEL', KEYS[1], KEYS[2])
+'''
+
+
+@lru_cache()
+def script_sha(script):
+    return sha1(script.encode('utf8')).hexdigest()
+
+
+def iter_chunks(items, size=SCRIPT_CHUNK):
+    """Split a list into chunks of given size."""
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+def get_backend(name):
+    """Return RedisClient class for given backend name:
+    'tornadoredis' (default) or 'asyncio'.
+    """
+    if name == 'asyncio':
+        from .aiotasks import AioRedisClient
+        return AioRedisClient
+    assert name == 'tornadoredis', 'Unknown Redis backend: %s' % name
+    return RedisClient
+
+
+def key_names(prefix):
+    """RedisClient.setup arguments, naming every key with the given prefix
+    instead of the default one, e.g. to keep test data apart.
+    """
+    return {name: prefix + key[len(KEY_PREFIX):] for name, key in KEYS.items()}
+
 
 def with_redis_pool(f):
+    """Pass the long-lived Redis client of the object as `client` argument.
+    If the connection is broken, the client is discarded, so that the next
+    call gets a fresh connection from the pool.
+    """
     @wraps(f)
     async def wrapped(*args, **kw):
         obj = args[0]
-        kw['client'] = Client(connection_pool=obj.pool)
-        res = await f(*args, **kw)
-        await gen.Task(kw['client'].disconnect)
-        return res
+        if kw.get('client') is not None:
+            return await f(*args, **kw)
+        kw['client'] = obj.redis_client
+        try:
+            return await f(*args, **kw)
+        except obj.connection_errors:
+            await obj._release(kw['client'])
+            obj._redis_client = None
+            raise
     return wrapped
 
 
 class RedisClient:
     """Class responsible for requests to Redis.
+
+    Every object holds at most two connections from the pool: one for
+    regular commands and one for blocking pops. Call `close` to return
+    them to the pool.
     """
     pool = None
+    connection_errors = (ConnectionError,)
+    _redis_client = None
+    _blocking_client = None
+
+    def __init__(self):
+        self.leases = {} # task: lease deadline, of the tasks taken by the object
 
     @classmethod
     def setup(cls,
@@ -34,34 +454,271 @@ class RedisClient:
               working_s=WORKING_S,
               success_s=SUCCESS_S,
               failure_s=FAILURE_S,
+              seen_index=False,
+              seen_bf=SEEN_BF,
+              seen_capacity=SEEN_CAPACITY,
+              seen_error_rate=SEEN_ERROR_RATE,
+              success_n=SUCCESS_N,
+              failure_n=FAILURE_N,
+              frontier=FIFO_FRONTIER,
+              hosts_z=HOSTS_Z,
+              hosts_active_h=HOSTS_ACTIVE_H,
+              host_q_prefix=HOST_Q_PREFIX,
+              host_delay=HOST_DELAY,
+              host_concurrency=HOST_CONCURRENCY,
+              first_level_hosts=False,
+              pending_z=PENDING_Z,
+              scorer=None,
+              fanin_bonus=FANIN_BONUS,
+              poll_interval=POLL_INTERVAL,
+              leases_z=LEASES_Z,
+              lease_time=LEASE_TIME,
+              node_id=None,
+              coordinator=False,
+              nodes_s=NODES_S,
+              task_nodes_h=TASK_NODES_H,
+              heartbeat_prefix=HEARTBEAT_PREFIX,
+              coordinator_k=COORDINATOR_K,
+              node_timeout=NODE_TIMEOUT,
+              spill_q=SPILL_Q,
               max_connections=MAX_CONNECTIONS,
               **conn_args):
-        cls.pool = ConnectionPool(max_connections=max_connections, **conn_args)
+        """Configure Redis connections and keys.
+
+        In seen-index mode tasks are deduplicated by a Bloom filter, sized
+        for seen_capacity tasks with seen_error_rate of false positives.
+        Finished tasks are not stored, only counted.
+
+        Frontier is either 'fifo': a single PENDING queue, or 'host': a queue
+        per host. In the latter case fetches from the same host start not
+        more often than once per host_delay seconds, with at most
+        host_concurrency fetches at a time. If first_level_hosts is True,
+        all subdomains share their first level domain queue.
+        Or 'priority': tasks with lower score are taken first. The score is
+        calculated by scorer(url, source) callable, where source is URL of
+        the page containing the link; it is decreased by fanin_bonus each
+        time a pending task is found on another page.
+
+        A task taken for work is leased for lease_time seconds. Unless it is
+        registered as passed before the deadline, `requeue_expired` returns
+        it to the frontier.
+
+        Cluster mode is on if node_id is given: the node registers itself by
+        `heartbeat` calls, which must be repeated more often than once per
+        node_timeout seconds, and its working tasks are tagged with the ID.
+        `requeue_dead_nodes` returns to the frontier tasks of the nodes,
+        which have stopped sending heartbeats. A node started with the
+        coordinator flag takes the coordinator role, unless another live
+        node holds it.
+        """
+        cls.pool = cls._make_pool(max_connections, **conn_args)
 
         cls.pending_q = pending_q
         cls.pending_s = pending_s
         cls.working_s = working_s
         cls.success_s = success_s
         cls.failure_s = failure_s
+        cls.seen_bf = seen_bf
+        cls.success_n = success_n
+        cls.failure_n = failure_n
+        if seen_index:
+            cls.seen = BloomFilter(seen_capacity, seen_error_rate)
+            logging.info('Seen index: %d bits, %d hashes.',
+                         cls.seen.bits, cls.seen.hashes)
+        else:
+            cls.seen = None
+        assert frontier in FRONTIERS, 'Unknown frontier: %s' % frontier
+        cls.frontier = frontier
+        cls.hosts_z = hosts_z
+        cls.hosts_active_h = hosts_active_h
+        cls.host_q_prefix = host_q_prefix
+        cls.host_delay = host_delay
+        cls.host_concurrency = host_concurrency
+        cls.get_host = staticmethod(get_first_level_domain if first_level_hosts else get_domain)
+        cls.pending_z = pending_z
+        cls.scorer = staticmethod(scorer) if scorer else None
+        cls.fanin_bonus = fanin_bonus
+        cls.poll_interval = poll_interval
+        cls.leases_z = leases_z
+        cls.lease_time = lease_time
+        cls.node_id = node_id
+        cls.coordinator = coordinator
+        cls.nodes_s = nodes_s
+        cls.task_nodes_h = task_nodes_h
+        cls.heartbeat_prefix = heartbeat_prefix
+        cls.coordinator_k = coordinator_k
+        cls.node_timeout = node_timeout
+        cls.spill_q = spill_q
 
-        logging.debug('RedisClient ready.')
+        logging.debug('%s ready.', cls.__name__)
+
+    @classmethod
+    def _make_pool(cls, max_connections, **conn_args):
+        return ConnectionPool(max_connections=max_connections,
+                              wait_for_available=True,
+                              **conn_args)
+
+    @classmethod
+    def pool_stats(cls):
+        """Connection pool statistics:
+        max -- connections limit,
+        created -- connections opened so far,
+        in_use -- connections held by clients,
+        available -- idle connections,
+        waiting -- clients waiting for a connection.
+        """
+        pool = cls.pool
+        return {
+            'max': pool.max_connections,
+            'created': pool._created_connections,
+            'in_use': len(pool._in_use_connections),
+            'available': len(pool._available_connections),
+            'waiting': len(pool._waiting_clients),
+        }
+
+    @property
+    def redis_client(self):
+        """Long-lived client for regular commands."""
+        if self._redis_client is None:
+            self._redis_client = Client(connection_pool=self.pool)
+        return self._redis_client
+
+    @property
+    def blocking_client(self):
+        """Long-lived client for blocking commands."""
+        if self._blocking_client is None:
+            self._blocking_client = Client(connection_pool=self.pool)
+        return self._blocking_client
+
+    async def _release(self, client):
+        try:
+            await gen.Task(client.disconnect)
+        except Exception as ex:
+            logging.warning('Error releasing Redis connection: %s', ex)
+
+    async def close(self):
+        """Return connections to the pool."""
+        if self._redis_client is not None:
+            await self._release(self._redis_client)
+            self._redis_client = None
+        if self._blocking_client is not None:
+            await self._release(self._blocking_client)
+            self._blocking_client = None
+
+    @with_redis_pool
+    async def ping(self, client=None):
+        """Health check. Return True if the server responds."""
+        return await gen.Task(client.ping)
 
     @with_redis_pool
-    async def _move_task(self, task, from_set=None, to_set=None, client=None):
+    async def _move_task(self, task, from_set=None, to_set=None, deadline=None, client=None):
+        # Lease the task until the deadline, if any, otherwise drop the lease.
+        # In cluster mode the leased task is tagged with the node ID.
         pipe = client.pipeline()
         pipe.srem(from_set, task)
         pipe.sadd(to_set, task)
-        rem_res, add_res = await gen.Task(pipe.execute)
+        if deadline:
+            pipe.zadd(self.leases_z, deadline, task)
+            if self.node_id:
+                pipe.hset(self.task_nodes_h, task, self.node_id)
+        else:
+            pipe.zrem(self.leases_z, task)
+            if self.node_id:
+                pipe.hdel(self.task_nodes_h, task)
+        rem_res, add_res = (await gen.Task(pipe.execute))[:2]
         if rem_res != 1:
             logging.error('Task %s not found in %s set', task, from_set)
         if add_res != 1:
             logging.error('Task %s not found in %s set', task, to_set)
         return rem_res, add_res
 
+    @with_redis_pool
+    async def _is_seen(self, task, client=None):
+        pipe = client.pipeline()
+        for offset in self.seen.offsets(task):
+            pipe.getbit(self.seen_bf, offset)
+        res = await gen.Task(pipe.execute)
+        return all(res)
+
     @with_redis_pool
     async def _is_member(self, task, set_name=None, client=None):
         return await gen.Task(client.sismember, set_name, task)
 
+    async def _eval_script(self, script, keys, args, client=None):
+        # Scripts are loaded to the server lazily, by the first EVAL
+        # following NOSCRIPT reply; afterwards EVALSHA is enough.
+        sha = script_sha(script)
+        # tornadoredis extends keys list in place, so pass copies
+        res = await gen.Task(client.evalsha, sha, list(keys), list(args))
+        if isinstance(res, ResponseError) and 'NOSCRIPT' in str(res):
+            logging.debug('Loading script %s...', sha)
+            res = await gen.Task(client.eval, script, list(keys), list(args))
+        if isinstance(res, ResponseError):
+            raise res
+        return res
+
+    @with_redis_pool
+    async def put_new_tasks(self, tasks, source=None, client=None):
+        """Register as pending those of the given tasks, which are not
+        known yet. Membership check and registration are made atomically,
+        in a single request. Optional source is URL of the page, where
+        the tasks were found.
+        Return list of the newly registered tasks.
+        """
+        keys = (self.pending_q, self.pending_s, self.working_s,
+                self.success_s, self.failure_s, self.seen_bf, self.hosts_z,
+                self.pending_z)
+        k = 0 if self.seen is None else self.seen.hashes
+        host_frontier = self.frontier == HOST_FRONTIER
+        scored = self.frontier == PRIORITY_FRONTIER and self.scorer is not None
+        added = []
+        for chunk in iter_chunks(list(tasks)):
+            args = [k, self.frontier, time.time(), self.host_q_prefix, self.fanin_bonus]
+            for task in chunk:
+                args.append(task)
+                args.append(self.get_host(task) if host_frontier else '')
+                args.append(self.scorer(task, source) if scored else 0)
+                if k:
+                    args.extend(self.seen.offsets(task))
+            res = await self._eval_script(PUT_NEW_TASKS_SCRIPT, keys, args, client=client)
+            added.extend(res or [])
+        return added
+
+    async def put_tasks(self, tasks, source=None):
+        """Bulk version of put_task: register as pending all unknown tasks
+        from the given sequence. Duplicates are removed locally, before
+        sending the tasks to Redis.
+        Return count of the new tasks.
+        """
+        tasks = list(dict.fromkeys(tasks))
+        if not tasks:
+            return 0
+        added = await self.put_new_tasks(tasks, source=source)
+        return len(added)
+
+    @with_redis_pool
+    async def spill(self, tasks, source=None, client=None):
+        """Defer registration of the tasks found on the source page:
+        save them to the spill queue.
+        """
+        return await gen.Task(client.lpush, self.spill_q, json.dumps([source, list(tasks)]))
+
+    @with_redis_pool
+    async def unspill(self, count, client=None):
+        """Pop at most count pages of the oldest deferred tasks.
+        Return list of (tasks, source) tuples.
+        """
+        items = await self._eval_script(POP_SPILLED_SCRIPT, (self.spill_q,), (count,),
+                                        client=client)
+        return [(tasks, source) for source, tasks in map(json.loads, reversed(items or []))]
+
+    async def put_new_task(self, task):
+        """Register task as pending unless it is already known.
+        Return True if the task is new.
+        """
+        added = await self.put_new_tasks([task])
+        return bool(added)
+
     @with_redis_pool
     async def put_task(self, task, client=None):
         """Register pending task.
@@ -80,48 +737,223 @@ class RedisClient:
         return await gen.Task(client.scard, self.pending_s)
 
 
-    @with_redis_pool
-    async def get_task(self, client=None):
-        """Wait for a new task in PENDING queue. When a task is available,
-        pop it from the queue, then move from PENDING to WORKING set.
+    async def get_task(self):
+        """Wait for a new task in PENDING queue (or in a host queue).
+        When a task is available, pop it from the queue, then move from
+        PENDING to WORKING set.
         Return the task.
         """
-        item = await gen.Task(client.brpop, self.pending_q)
+        if self.frontier == FIFO_FRONTIER:
+            return await self._pop_queued_task()
+        if self.frontier == HOST_FRONTIER:
+            pop = self._pop_host_task
+        else:
+            pop = self._pop_priority_task
+        while True:
+            task = await pop()
+            if task:
+                return task
+            await gen.sleep(self.poll_interval)
+
+    async def _pop_queued_task(self):
+        try:
+            item = await gen.Task(self.blocking_client.brpop, self.pending_q)
+        except self.connection_errors:
+            await self._release(self._blocking_client)
+            self._blocking_client = None
+            raise
         task = item[self.pending_q]
-        await self._move_task(task, self.pending_s, self.working_s)
+        deadline = time.time() + self.lease_time
+        await self._move_task(task, self.pending_s, self.working_s, deadline=deadline)
+        self.leases[task] = deadline
+        return task
+
+    @with_redis_pool
+    async def _pop_host_task(self, client=None):
+        keys = (self.hosts_z, self.hosts_active_h, self.pending_s, self.working_s,
+                self.leases_z, self.task_nodes_h)
+        now = time.time()
+        deadline = now + self.lease_time
+        args = (now, self.host_delay, self.host_concurrency, self.host_q_prefix,
+                deadline, self.node_id or '')
+        task = await self._eval_script(GET_HOST_TASK_SCRIPT, keys, args, client=client)
+        if task:
+            self.leases[task] = deadline
+        return task
+
+    @with_redis_pool
+    async def _pop_priority_task(self, client=None):
+        keys = (self.pending_z, self.pending_s, self.working_s, self.leases_z,
+                self.task_nodes_h)
+        deadline = time.time() + self.lease_time
+        args = (deadline, self.node_id or '')
+        task = await self._eval_script(GET_PRIORITY_TASK_SCRIPT, keys, args, client=client)
+        if task:
+            self.leases[task] = deadline
         return task
 
+    @with_redis_pool
+    async def _release_host(self, task, client=None):
+        keys = (self.hosts_z, self.hosts_active_h)
+        args = (self.get_host(task), time.time(), self.host_delay)
+        return await self._eval_script(RELEASE_HOST_SCRIPT, keys, args, client=client)
+
+    @with_redis_pool
+    async def _register_done(self, task, to_set, counter, client=None):
+        # A task requeued after its lease has expired belongs to the frontier
+        # (or to the worker, which has taken it again): the result is dropped.
+        deadline = self.leases.pop(task, '')
+        keys = (self.working_s, self.leases_z, to_set, counter, self.task_nodes_h)
+        args = (task, deadline, '1' if self.seen is not None else '0')
+        res = await self._eval_script(REGISTER_DONE_SCRIPT, keys, args, client=client)
+        if res != 1:
+            logging.warning('Task %s is not leased any more, result dropped.', task)
+            return res, res
+        # the host slot of a requeued task is released by requeue
+        if self.frontier == HOST_FRONTIER:
+            await self._release_host(task)
+        return res, res
+
+    @with_redis_pool
+    async def requeue(self, tasks, force=False, owners=None, client=None):
+        """Return the tasks from WORKING set to the frontier, if their
+        leases have expired or are missing, or unconditionally, if force
+        is True. If owners dictionary is given, a task is requeued only if
+        it is still held by the node owners[task].
+        Return list of the requeued tasks.
+        """
+        keys = (self.leases_z, self.working_s, self.pending_s, self.pending_q,
+                self.hosts_z, self.hosts_active_h, self.pending_z, self.task_nodes_h)
+        host_frontier = self.frontier == HOST_FRONTIER
+        requeued = []
+        for chunk in iter_chunks(list(tasks)):
+            args = [time.time(), self.frontier, self.host_q_prefix, '1' if force else '0']
+            for task in chunk:
+                args.append(task)
+                args.append(self.get_host(task) if host_frontier else '')
+                args.append(owners.get(task, '') if owners else '')
+            res = await self._eval_script(REQUEUE_TASKS_SCRIPT, keys, args, client=client)
+            requeued.extend(res or [])
+        if requeued:
+            logging.warning('Requeued %d tasks.', len(requeued))
+        return requeued
+
+    @with_redis_pool
+    async def expired_tasks(self, client=None):
+        """List of the tasks with expired leases."""
+        return await gen.Task(client.zrangebyscore, self.leases_z, '-inf', time.time())
+
+    @with_redis_pool
+    async def working_tasks(self, client=None):
+        """List of the tasks in WORKING set."""
+        return list(await gen.Task(client.smembers, self.working_s))
+
+    async def requeue_expired(self):
+        """Requeue the tasks with expired leases."""
+        tasks = await self.expired_tasks()
+        if not tasks:
+            return []
+        return await self.requeue(tasks)
+
+    async def recover(self, force=False):
+        """Requeue the working tasks, which have no valid lease, e.g. after
+        crash of the previous session. Call this when resuming a crawl.
+        With force, valid leases are ignored: use it only when no other
+        crawler is running.
+        """
+        return await self.requeue(await self.working_tasks(), force=force)
+
+    @with_redis_pool
+    async def heartbeat(self, client=None):
+        """Register the node or confirm it is alive; take the coordinator
+        role, if the node is started as the coordinator and the role is free.
+        Return ID of the coordinator node, None if there is no coordinator.
+        """
+        keys = (self.nodes_s, self.heartbeat_prefix + self.node_id, self.coordinator_k)
+        args = (self.node_id, time.time(), int(self.node_timeout * 1000),
+                '1' if self.coordinator else '0')
+        return await self._eval_script(HEARTBEAT_SCRIPT, keys, args, client=client)
+
+    @with_redis_pool
+    async def unregister_node(self, client=None):
+        """Remove the node from the cluster, on a clean shutdown."""
+        keys = (self.nodes_s, self.heartbeat_prefix + self.node_id, self.coordinator_k)
+        return await self._eval_script(UNREGISTER_NODE_SCRIPT, keys, (self.node_id,),
+                                       client=client)
+
+    @with_redis_pool
+    async def _dead_nodes_tasks(self, client=None):
+        keys = (self.nodes_s, self.task_nodes_h)
+        return await self._eval_script(DEAD_NODES_SCRIPT, keys, (self.heartbeat_prefix,),
+                                       client=client)
+
+    async def requeue_dead_nodes(self):
+        """Requeue the working tasks of the nodes, which have stopped
+        sending heartbeats.
+        """
+        items = await self._dead_nodes_tasks()
+        if not items:
+            return []
+        owners = dict(zip(items[::2], items[1::2]))
+        logging.warning('Dead nodes: %s.', ', '.join(sorted(set(owners.values()))))
+        return await self.requeue(list(owners), force=True, owners=owners)
+
     async def register_success(self, task):
         """Move task from WORKING to SUCCESS set.
         Return tuple of (1, 1) if operation was successfull:
         the first number is count of items deleted from the source set,
         the second is count of items adfded to the target set.
+        Return (0, 0) if the task is not leased by this object any more.
         """
-        return await self._move_task(task, self.working_s, self.success_s)
+        return await self._register_done(task, self.success_s, self.success_n)
 
     async def register_failure(self, task):
         """Move task from WORKING to FAILURE set.
         Return tuple of (1, 1) if operation was successfull:
         the first number is count of items deleted from the source set,
         the second is count of items adfded to the target set.
+        Return (0, 0) if the task is not leased by this object any more.
         """
-        return await self._move_task(task, self.working_s, self.failure_s)
+        return await self._register_done(task, self.failure_s, self.failure_n)
 
     @with_redis_pool
     async def passed_count(self, client=None):
         """Return sum of items in SUCCESS and FAILURE set.
         """
         pipe = client.pipeline()
-        pipe.scard(self.success_s)
-        pipe.scard(self.failure_s)
+        if self.seen is None:
+            pipe.scard(self.success_s)
+            pipe.scard(self.failure_s)
+        else:
+            pipe.get(self.success_n)
+            pipe.get(self.failure_n)
         res = await gen.Task(pipe.execute)
-        return sum(res)
+        return sum(int(x or 0) for x in res)
+
+    @with_redis_pool
+    async def counts(self, client=None):
+        """Return tuple of passed and pending tasks counts,
+        fetched in a single request.
+        """
+        pipe = client.pipeline()
+        if self.seen is None:
+            pipe.scard(self.success_s)
+            pipe.scard(self.failure_s)
+        else:
+            pipe.get(self.success_n)
+            pipe.get(self.failure_n)
+        pipe.scard(self.pending_s)
+        success, failure, pending = await gen.Task(pipe.execute)
+        return int(success or 0) + int(failure or 0), pending
 
 
     async def is_known_task(self, task):
         """Return True if given task is member of any set,
         i.e. is registered in the system.
+        In seen-index mode the answer may be a false positive.
         """
+        if self.seen is not None:
+            return await self._is_seen(task)
         if await self._is_member(task, self.pending_s):
             return True
         if await self._is_member(task, self.working_s):
@@ -133,12 +965,40 @@ class RedisClient:
         return False
 
 
+    @with_redis_pool
+    async def _clear_hosts(self, client=None):
+        keys = (self.hosts_z, self.hosts_active_h)
+        return await self._eval_script(CLEAR_HOSTS_SCRIPT, keys, (self.host_q_prefix,),
+                                       client=client)
+
     @with_redis_pool
     async def clear_all(self, client=None):
         """Clear all data structures."""
+        await self._clear_hosts(client=client)
         return await gen.Task(client.delete,
                               self.pending_q,
+                              self.pending_z,
+                              self.leases_z,
+                              self.task_nodes_h,
+                              self.spill_q,
                               self.pending_s,
                               self.working_s,
                               self.success_s,
-                              self.failure_s)
+                              self.failure_s,
+                              self.seen_bf,
+                              self.success_n,
+                              self.failure_n)
+
+    @with_redis_pool
+    async def memory_usage(self, client=None):
+        """Return dictionary of memory, used by each data structure, in bytes.
+        Missing keys are reported as 0.
+        """
+        keys = (self.pending_q, self.pending_s, self.working_s,
+                self.success_s, self.failure_s, self.seen_bf, self.hosts_z,
+                self.pending_z, self.leases_z, self.task_nodes_h, self.spill_q)
+        pipe = client.pipeline()
+        for k in keys:
+            pipe.execute_command('MEMORY', 'USAGE', k, 'SAMPLES', 0)
+        res = await gen.Task(pipe.execute)
+        return {k: v or 0 for k, v in zip(keys, res)}
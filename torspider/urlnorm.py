@@ -3,11 +3,12 @@
 '''
 urlnorm.py - URL utilities.
 '''
-import pprint
+from functools import lru_cache
 from urllib.parse import urlparse, urlunparse, unquote
 import re
 import logging
-from pprint import pformat
+
+NORM_CACHE_SIZE = 100000
 
 _collapse = re.compile('([^/]+/\.\./?|/\./|//|/\.$|/\.\.$|^\.)')
 _server_authority = re.compile('^(?:([^\@]+)\@)?([^\:]+)(?:\:(.+))?$')
@@ -28,6 +29,42 @@ _relative_schemes = [
 _server_authority_schemes = ['http', 'https', 'news', 'snews', 'ftp',]
 
 
+def collapse_path(path):
+    """Collapse (optimize) path: remove empty and '.' segments, resolve
+    '..' segments. Absolute paths are handled in a single pass.
+    """
+    if '.' not in path and '//' not in path:
+        return path
+    if not path.startswith('/'):
+        last_path = path
+        while 1:
+            path = _collapse.sub('/', path, 1)
+            if last_path == path:
+                break
+            last_path = path
+        return path
+    segments = path.split('/')
+    stack = []
+    for seg in segments[1:-1]:
+        if seg == '..':
+            if stack:
+                stack.pop()
+            else:
+                stack.append(seg)
+        elif seg and seg != '.':
+            stack.append(seg)
+    last = segments[-1]
+    if last == '..':
+        if stack:
+            stack.pop()
+        last = ''
+    elif last == '.':
+        last = ''
+    stack.append(last)
+    return '/' + '/'.join(stack)
+
+
+@lru_cache(maxsize=NORM_CACHE_SIZE)
 def norm(url, domain=None):
     """
     Normalize URL.
@@ -51,12 +88,13 @@ def norm(url, domain=None):
 
     Returns:
         a tuple of values compatiable with urllib.parse.urlparse result.
+        Results are cached, by (url, domain) pair.
 
     Fails with AssertionError if a relative URL can not be converted to absolute.
     This happens when neither URL contains netloc, nor domain parameter is provided.
     """
     (scheme, authority, path, parameters, query, fragment) = urlparse(url, scheme='http')
-    logging.debug(pprint.pformat((scheme, authority, path, parameters, query, fragment) ))
+    logging.debug('%s parsed: %r', url, (scheme, authority, path, parameters, query, fragment))
     if not authority:
         authority = domain
     assert authority, '%s: No authority!' % url
@@ -70,23 +108,42 @@ def norm(url, domain=None):
         authority = "%s:%s" % (authority, port)
 
     if scheme in _relative_schemes:
-        last_path = path
-        while 1:
-            path = _collapse.sub('/', path, 1)
-            if last_path == path:
-                break
-            last_path = path
+        path = collapse_path(path)
 
     path = unquote(path)
-    try:
-        authority = authority.encode('utf8').decode('idna')
-    except Exception as ex:
-        logging.warn(ex)
+    if not authority.isascii() or 'xn--' in authority:
+        try:
+            authority = authority.encode('utf8').decode('idna')
+        except Exception as ex:
+            logging.warn(ex)
 
     parts = (scheme, authority, path, parameters, query, '')
-    assert not join_parts(parts).startswith('http://http://'), 'Error parsing <%s> (%s)' % (url, pformat(parts))
+    if authority.startswith('http'):
+        assert not join_parts(parts).startswith('http://http://'), 'Error parsing <%s> (%r)' % (url, parts)
     return parts
 
+def norm_many(hrefs, base, schemes=None):
+    """Normalize hrefs found on a page with the given base URL.
+    The base is parsed once. Hrefs failing normalization are skipped,
+    as well as those with schemes other than listed, if schemes are given.
+
+    Returns:
+        list of (normalized URL, its host) pairs, in the order of hrefs.
+    """
+    domain = get_domain(base)
+    result = []
+    for href in hrefs:
+        try:
+            parts = norm(href, domain)
+        except Exception as ex:
+            logging.warn(ex)
+            continue
+        if schemes is not None and parts[0] not in schemes:
+            logging.debug('Skipping scheme <%s>', parts[0])
+            continue
+        result.append((join_parts(parts), parts[1]))
+    return result
+
 def join_parts(url):
     """Convert norm result to string."""
     return urlunparse(url)
@@ -2,95 +2,178 @@
 '''
 Worker.
 '''
+import asyncio
 import logging
+import time
 from tornado import gen
 from tornado.options import options
 from tornado import httpclient
 
-from .scraper import HTTPClient, Page
+from .scraper import HTTPClient, get_timing
+from .parsing import PageParser, ParseError
+from .consumers import ConsumerPipeline
 from .urlnorm import norm, join_parts
+from .stats import CrawlStats
+from .concurrency import is_timeout
 from . import tasks
 
 
 async def add_task(redis, url):
     task = join_parts(norm(url))
     logging.debug('Adding %s to tasks queue...', task)
-    known = await redis.is_known_task(task)
-    if known:
+    if await redis.put_new_task(task):
+        logging.debug('Registered task <%s>', task)
+    else:
         logging.debug('Skipping known address <%s>', task)
-        return
-    logging.debug('%s is new', task)
-    await redis.put_task(task)
-    logging.debug('Registered task <%s>', task)
 
 
-class Worker(tasks.RedisClient, HTTPClient):
+def _iter_normalized(urls):
+    for url in urls:
+        try:
+            yield join_parts(norm(url))
+        except Exception as ex:
+            logging.warn(ex)
+
+
+async def add_tasks(redis, urls, source=None):
+    """Normalize the URLs and register the unknown ones as pending tasks,
+    all at once. Optional source is URL of the page containing the links.
+    Return count of the new tasks. Use it for raw URLs, such as seeds:
+    links of pages are normalized already.
+    """
+    return await redis.put_tasks(_iter_normalized(urls), source=source)
+
+
+class Worker(HTTPClient):
     """Its main responsibility is to handle tasks, taken from PENDING queue.
 
     As soon as new URL is available, worker tries to get corresponding web page.
     Whatever is the result -- success or failure, it is propagated to available
     consumers and recorded to inner Redis structures. Next, links are extracted
     and appended to the PENDING queue.
+
+    Arguments:
+        name : worker name, used in logs
+        redis : tasks.RedisClient instance (or an instance of its subclass),
+                owned by the worker
+        consumers : consumers.ConsumerPipeline instance, shared by all workers
+        stats : stats.CrawlStats instance, shared by all workers
+        parser : parsing.PageParser instance, shared by all workers
+        concurrency : optional concurrency.AdaptiveConcurrency instance,
+                      shared by all workers
+        admission : optional admission.AdmissionController instance, shared
+                    by all workers; without it links are registered at once
     """
-    def __init__(self, name='Worker', consumers=None, *args, **kwargs):
+    def __init__(self, name='Worker', redis=None, consumers=None, stats=None,
+                 parser=None, concurrency=None, admission=None, *args, **kwargs):
         super(Worker, self).__init__(*args, **kwargs)
         self.name = name
-        self.consumers = consumers
+        self.redis = redis if redis is not None else tasks.RedisClient()
+        self.consumers = consumers if consumers is not None else ConsumerPipeline()
+        self.stats = stats if stats is not None else CrawlStats(self.redis)
+        self.parser = parser if parser is not None else PageParser()
+        self.concurrency = concurrency
+        self.admission = admission
+        self.controller = None # set by controller.CrawlController
+        self.busy = False
 
-    async def consume(self, report, consumers=None):
-        logging.debug('Calling consumers')
-        for name, func in self.consumers.items():
-            logging.debug('Calling consumer <%s> function %s...', name, func)
-            try:
-                await func(report)
-            except Exception as ex:
-                logging.error(ex, exc_info=True)
+    def on_abort(self, url, reason, saved):
+        super(Worker, self).on_abort(url, reason, saved)
+        self.stats.add_aborted(saved)
+
+    @property
+    def stopping(self):
+        return self.controller is not None and self.controller.stopping
+
+    async def consume(self, report):
+        logging.debug('Passing report to consumers')
+        await self.consumers.put(report)
 
     async def __call__(self):
         logging.debug('%s started.', self.name)
-        while True:
+        try:
+            await self._run()
+        finally:
+            await self.redis.close()
+            logging.debug('%s stopped.', self.name)
+
+    async def add_links(self, links, source):
+        """Register the normalized links of a page as new tasks or pass them
+        to the admission controller. Return count of the new tasks, None if
+        they are deferred.
+        """
+        if self.admission is None:
+            return await self.redis.put_tasks(links, source=source)
+        return await self.admission.admit(self.redis, links, source=source)
+
+    def record(self, started, ex=None):
+        if self.concurrency is not None:
+            self.concurrency.record(time.monotonic() - started, timeout=is_timeout(ex))
+
+    async def _run(self):
+        while not self.stopping:
+            if self.concurrency is not None:
+                await self.concurrency.acquire()
+            started = res = None
             try:
-                task = await self.get_task() # the task is now in 'working' set
+                task = await self.redis.get_task() # the task is now in 'working' set
+                self.busy = True
                 logging.debug('Got task: <%s>', task)
+                started = time.monotonic()
                 res = await self.visit(task)
-            except (httpclient.HTTPError, AssertionError, UnicodeError, TypeError) as ex:
+                self.record(started)
+                page = await self.parser.parse(task, res)
+            except asyncio.CancelledError:
+                if self.busy:
+                    # give the unfinished task back instead of waiting for its lease
+                    await self.redis.requeue([task], force=True)
+                raise
+            except (httpclient.HTTPError, ParseError, AssertionError, UnicodeError, TypeError) as ex:
                 logging.error(ex)
-                await self.consume({'url': task, 'error': str(ex)})
-                await self.register_failure(task)
+                if res is None and started is not None:
+                    self.record(started, ex)
+                report = {'url': task, 'error': str(ex)}
+                timing = get_timing(getattr(ex, 'response', None))
+                if timing:
+                    report['timing'] = timing
+                await self.consume(report)
+                registered, _ = await self.redis.register_failure(task)
+                if registered:
+                    self.stats.add_passed()
                 continue
             else:
-                page = Page(task, res)
-                await self.consume({'url': task, 'page': page})
-                await self.register_success(task)
-                passed_count = await self.passed_count()
-                if options.max_pages > 0 and passed_count >= options.max_pages:
+                await self.consume({'url': task, 'page': page, 'timing': get_timing(res)})
+                registered, _ = await self.redis.register_success(task)
+                if not registered:
+                    # the lease is lost, the task is passed by another worker
+                    continue
+                self.stats.add_passed()
+                await self.stats.ensure_fresh()
+                if self.stats.limit_reached(options.max_pages):
                     logging.info('Task <%s> completed.', task)
-                    logging.warn('Pages limit (%d) exceeded. Exiting...', options.max_pages)
+                    if self.controller is not None:
+                        self.controller.finish('Pages limit (%d) exceeded' % options.max_pages)
+                    else:
+                        logging.warn('Pages limit (%d) exceeded. Exiting...', options.max_pages)
                     break
 
-                if options.throttling_ratio > 0:
-                    # throttling ratio
-                    pending_count = await self.pending_count()
-                    if pending_count > 0:
-                        r = passed_count / pending_count
-                        if r < options.throttling_ratio:
-                            logging.info('passed_count / pending_count = %.1f. Waiting...', r)
-                            continue
-
                 # Extract links from the page
                 inner, outer = page.partition_links()
-                i = 0
+                links = []
                 if options.follow_outer_links:
-                    for link in outer:
-                        await add_task(self, link)
-                        i += 1
+                    links.extend(outer)
                 if options.follow_inner_links:
-                    for link in inner:
-                        await add_task(self, link)
-                        i += 1
-                logging.info('Registered %d new tasks from %s', i+1, res.effective_url)
+                    links.extend(inner)
+                count = await self.add_links(links, task)
+                if count is None:
+                    logging.info('Deferred %d links from %s', len(links), res.effective_url)
+                else:
+                    logging.info('Registered %d new tasks from %s', count, res.effective_url)
                 logging.debug('Task <%s> completed.', task)
 
             finally:
+                self.busy = False
+                if self.concurrency is not None:
+                    self.concurrency.release()
                 logging.debug('%s is sleeping...', self.name)
                 await gen.sleep(0.01)